@@ -0,0 +1,140 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Benchmark the Unity facing connector operations against a fake Unity
+server, at several project sizes.
+
+Usage (with the client dependencies importable, e.g. from the Python
+environment the Unity editor uses for ftrack):
+
+    python -m benchmark.bench_connector --scales 1000,10000,100000 --latency 0.0005
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+
+from benchmark import harness
+from benchmark.fake_unity import FakeClientService, FakeProject, FakeUnityServer
+
+harness.setup_paths()
+
+import ftrack_client
+from connector import unity_assets
+from connector.unity_connector import Connector
+
+
+def _asset_object(file_path, index):
+    return harness.AssetObject(
+        assetName='benchmark_{0}'.format(index),
+        assetType='geo',
+        assetVersionId='benchmark-version-{0}'.format(index),
+        componentId='benchmark-component-{0}'.format(index),
+        filePath=file_path
+    )
+
+
+def install(connection):
+    '''Point the client module to the fake server connection'''
+    ftrack_client._connection = connection
+    ftrack_client._service = FakeClientService(connection)
+    ftrack_client.invalidate_handles()
+
+
+def run_scale(scale, latency, repeat, ftrack_ratio, imports):
+    project = FakeProject(scale, ftrack_ratio=ftrack_ratio)
+    results = []
+
+    source_directory = tempfile.mkdtemp(prefix='ftrack_benchmark_')
+    try:
+        source_files = []
+        for index in range(imports):
+            file_path = os.path.join(source_directory, 'import_{0}.fbx'.format(index))
+            with open(file_path, 'w') as f:
+                f.write('benchmark')
+            source_files.append(file_path)
+
+        with FakeUnityServer(project, latency=latency) as server:
+            connection = server.connect()
+            install(connection)
+            counter = harness.RoundTripCounter(connection)
+
+            ftrack_guids = project.ftrack_guids
+            dst_directory = project.full_path('Assets/ftrack/Imported')
+            asset = unity_assets.GenericAsset()
+
+            def import_assets():
+                for index, file_path in enumerate(source_files):
+                    asset._import_ftrack_component(
+                        _asset_object(file_path, index), dst_directory, {})
+
+            # Generation the incremental refresh starts from
+            generations = {}
+
+            def get_assets():
+                Connector.getAssets()
+                generations['before_import'] = Connector.getAssetChanges()['generation']
+
+            operations = [
+                ('getAssets', get_assets),
+                ('getSelectedAssets', Connector.getSelectedAssets),
+                # A miss walks the whole project without touching ftrack
+                ('getAsset (miss)', lambda: Connector.getAsset(
+                    'missing_asset', 'geo', 'missing_task')),
+                ('importAsset x{0} (Unity side)'.format(imports), import_assets),
+                ('getAssetChanges after import', lambda: Connector.getAssetChanges(
+                    generations['before_import'])),
+                ('selectObjects', lambda: Connector.selectObjects(ftrack_guids)),
+            ]
+            for name, operation in operations:
+                results.append(harness.measure(
+                    name, scale, operation, counter=counter, repeat=repeat))
+
+            counter.detach()
+            connection.close()
+    finally:
+        shutil.rmtree(source_directory, ignore_errors=True)
+        project.close()
+
+    return results
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--scales', type=harness.parse_scales,
+        default=harness.DEFAULT_SCALES,
+        help='Comma separated project sizes (number of assets)')
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Per call latency of the fake Unity API, in seconds')
+    parser.add_argument(
+        '--ftrack-ratio', type=float, default=0.5,
+        help='Fraction of the project assets imported from ftrack')
+    parser.add_argument(
+        '--imports', type=int, default=10,
+        help='Number of assets imported by the importAsset operation')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true')
+    namespace = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.DEBUG if namespace.verbose else logging.WARNING)
+
+    results = []
+    for scale in namespace.scales:
+        results.extend(run_scale(
+            scale, namespace.latency, namespace.repeat,
+            namespace.ftrack_ratio, namespace.imports))
+
+    harness.print_report(
+        'Connector operations (latency {0}s per Unity call)'.format(
+            namespace.latency),
+        results)
+
+
+if __name__ == '__main__':
+    main()
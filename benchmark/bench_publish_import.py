@@ -0,0 +1,222 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Benchmark the ftrack facing flows end to end (launch hook, publish, bulk
+import) against the in-process ftrack backend and the fake Unity server.
+
+Usage (with the client dependencies importable, e.g. from the Python
+environment the Unity editor uses for ftrack):
+
+    python -m benchmark.bench_publish_import --imports 100 --ftrack-latency 0.02
+"""
+
+import argparse
+import imp
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from benchmark import harness
+from benchmark.fake_ftrack import FakeFtrackBackend
+from benchmark.fake_unity import FakeProject, FakeUnityServer
+from benchmark.bench_connector import install
+
+harness.setup_paths()
+
+import ftrack
+from connector import unity_assets
+from ftrack_connect_unity import context_data
+from connector.unity_connector import Connector
+from ftrack_connect_unity.publish import publish_asset
+
+HOOK_PATH = os.path.join(
+    harness.ROOT_PATH, 'resource', 'hook', 'discover_integration.py')
+
+
+def _load_hook():
+    return imp.load_source('ftrack_benchmark_discover_integration', HOOK_PATH)
+
+
+def _launch(hook, session, task_id):
+    '''Run the launch hook and apply its environment like Connect does'''
+    event = {'data': {'context': {'selection': [{'entityId': task_id}]}}}
+    result = hook.on_launch_unity_engine_integration(session, event)
+    for key, value in result['integration']['env'].items():
+        if key.endswith('.set'):
+            os.environ[key[:-len('.set')]] = str(value)
+    return result
+
+
+def _publish(task_id, publish_args, options):
+    '''The ftrack side of the publish dialog, for an image sequence'''
+    publish_asset(
+        Connector(), publish_args, task_id, ftrack.Task(task_id).getParent(),
+        'benchmark_render', 'img', status='Pending review',
+        comment='benchmark', options=options)
+
+
+def _write_component(metadata):
+    '''Create the component file described by the Unity *metadata*'''
+    if not os.path.isdir(os.path.dirname(metadata['filePath'])):
+        os.makedirs(os.path.dirname(metadata['filePath']))
+    with open(metadata['filePath'], 'w') as f:
+        f.write('benchmark')
+
+
+def _write_render(image_path, frame_start, frame_end, frame_size=256 * 1024):
+    '''Write the jpg frames the Recorder would have rendered to *image_path*'''
+    if not os.path.isdir(os.path.dirname(image_path)):
+        os.makedirs(os.path.dirname(image_path))
+    body = b'\xff\xd8\xff' + b'\0' * frame_size + b'\xff\xd9'
+    for frame in range(frame_start, frame_end + 1):
+        with open('{0}{1:04d}.jpg'.format(
+                image_path.replace('<Frame>', ''), frame), 'wb') as f:
+            f.write(body)
+
+
+def run(arguments):
+    file_root = tempfile.mkdtemp(prefix='ftrack_benchmark_')
+    backend = FakeFtrackBackend(latency=arguments.ftrack_latency)
+    backend.seed(
+        sequences=arguments.sequences,
+        shots_per_sequence=arguments.shots,
+        file_root=file_root)
+
+    # Import the latest version of as many assets as requested
+    versions = [
+        backend.relation(asset, 'latest_version')
+        for asset in backend.of_type('Asset')
+    ][:arguments.imports]
+    imports = []
+    # assetVersionId -> metadata of the version before it
+    previous_versions = {}
+    for version in versions:
+        metadata = backend.unity_metadata(version)
+        _write_component(metadata)
+        imports.append(metadata)
+
+        previous = [
+            earlier for earlier in backend.relation(
+                backend.get(version.data['asset_id']), 'versions')
+            if earlier.data['version'] < version.data['version']
+        ]
+        if previous:
+            previous_versions[version.id] = backend.unity_metadata(previous[-1])
+            _write_component(previous_versions[version.id])
+
+    # The Unity project already holds the assets used by the scene we publish
+    project = FakeProject(
+        arguments.scale, ftrack_metadata=imports or None)
+    dependencies = [
+        project.assets_by_guid[guid].path for guid in project.ftrack_guids[:20]]
+
+    # Roll every imported asset back to its previous version
+    version_changes = []
+    for guid in project.ftrack_guids:
+        metadata = json.loads(project.assets_by_guid[guid].user_data)
+        if metadata['assetVersionId'] in previous_versions:
+            version_changes.append((guid, harness.AssetObject(
+                **previous_versions.pop(metadata['assetVersionId']))))
+
+    task_id = backend.first('Task').id
+    publish_args = {
+        'success': True,
+        'image_path': os.path.join(file_root, 'render', 'frame_<Frame>'),
+        'image_ext': 'jpg',
+        'movie_path': os.path.join(file_root, 'render', 'movie'),
+        'movie_ext': 'mp4',
+        'package_filepath': os.path.join(file_root, 'render', 'scene.unitypackage'),
+        'package_dependencies': dependencies,
+    }
+    publish_options = {'publishReviewable': True, 'publishPackage': True}
+    # The frame range of the launch context, see FakeFtrackBackend.seed
+    _write_render(publish_args['image_path'], 1001, 1100)
+
+    def import_versions():
+        for metadata in imports:
+            Connector.importAsset(harness.AssetObject(**dict(metadata, options={})))
+
+    results = []
+    hook = _load_hook()
+    try:
+        with backend.installed(), FakeUnityServer(
+                project, latency=arguments.unity_latency) as server:
+            connection = server.connect()
+            install(connection)
+            counter = harness.RoundTripCounter(connection)
+            unity_assets.registerAssetTypes()
+            Connector.getAssets()
+
+            last = imports[-1] if imports else None
+            operations = [
+                ('launch hook', lambda: _launch(hook, backend.session(), task_id)),
+                ('publish dialog context', lambda: context_data.fetch_publish_context(
+                    task_id, True, ['img'])),
+                ('publish (img + package)', lambda: _publish(
+                    task_id, publish_args, publish_options)),
+                ('importAsset x{0}'.format(len(imports)), import_versions),
+                ('getVersionStatus x{0}'.format(len(imports)), lambda: Connector.getVersionStatus(
+                    [metadata['componentId'] for metadata in imports])),
+                ('changeVersions x{0}'.format(len(version_changes)),
+                    lambda: Connector.changeVersions(version_changes)),
+            ]
+            if last:
+                task_of_last = backend.get(last['assetVersionId']).data['task_id']
+                operations.append(('getAsset (hit)', lambda: Connector.getAsset(
+                    last['assetName'], last['assetType'], task_of_last)))
+
+            for name, operation in operations:
+                results.append(harness.measure(
+                    name, arguments.scale, operation, counter=counter,
+                    queries=lambda: backend.request_count))
+
+            counter.detach()
+            connection.close()
+    finally:
+        shutil.rmtree(file_root, ignore_errors=True)
+        project.close()
+
+    if arguments.verbose:
+        for name, count in sorted(backend.requests.items()):
+            logging.info('{0:>6}  {1}'.format(count, name))
+
+    return results
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--scale', type=int, default=1000,
+        help='Number of assets in the Unity project')
+    parser.add_argument(
+        '--sequences', type=int, default=5,
+        help='Number of sequences in the seeded ftrack project')
+    parser.add_argument(
+        '--shots', type=int, default=20,
+        help='Number of shots per sequence in the seeded ftrack project')
+    parser.add_argument(
+        '--imports', type=int, default=50,
+        help='Number of asset versions imported by the bulk import')
+    parser.add_argument(
+        '--ftrack-latency', type=float, default=0.0,
+        help='Latency of every ftrack server request, in seconds')
+    parser.add_argument(
+        '--unity-latency', type=float, default=0.0,
+        help='Per call latency of the fake Unity API, in seconds')
+    parser.add_argument('--verbose', action='store_true')
+    namespace = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.INFO if namespace.verbose else logging.WARNING)
+
+    harness.print_report(
+        'Publish and import flows (ftrack latency {0}s, Unity latency {1}s)'.format(
+            namespace.ftrack_latency, namespace.unity_latency),
+        run(namespace))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1067 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+An in-process stand-in for the ftrack server.
+
+FakeFtrackBackend holds a seeded project hierarchy (sequences, shots, tasks,
+assets, versions and components) and serves it through the two client APIs
+the integration uses:
+
+* the legacy ``ftrack`` API (Task, Shot, AssetVersion, AssetType, User,
+  Review, getTaskStatuses...)
+* ``ftrack_api`` sessions (query, get, commit) with a small query language
+  interpreter covering projections, ``is``, ``is_not``, ``in``, ``any``,
+  ``has``, ``and``, ``or`` and ``order by``.
+
+Every server request, including the lazy attribute loads ftrack_api does
+when an entity attribute was not projected, waits for the configured
+latency and is counted, so the benchmarks can catch query count
+regressions offline.
+"""
+
+import collections
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+import contextlib
+import getpass
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TASK_OBJECT_TYPE_ID = '11c137c0-ee7e-4f9c-91c5-8c77cec22b2c'
+SHOT_OBJECT_TYPE_ID = 'bad911de-3bd6-47b9-8b46-3476e237cb36'
+SEQUENCE_OBJECT_TYPE_ID = '4be63b64-5010-42fb-bf1f-428af9d638f0'
+
+CONTEXT_TYPES = ('Project', 'Sequence', 'Shot', 'Task')
+
+# Polymorphic types and the concrete types they cover
+SUPER_TYPES = {
+    'Context': CONTEXT_TYPES,
+    'TypedContext': ('Sequence', 'Shot', 'Task'),
+}
+
+ASSET_TYPES = [
+    ('img', 'Image Sequence'),
+    ('geo', 'Geometry'),
+    ('anim', 'Animation'),
+    ('rig', 'Rig'),
+    ('cam', 'Camera'),
+    ('scene', 'Scene'),
+    ('upload', 'Upload'),
+]
+
+STATUSES = ['Not started', 'In progress', 'Pending review', 'Approved']
+
+TASK_TYPES = ['Animation', 'Lighting', 'Compositing']
+
+
+class FakeFtrackError(Exception):
+    pass
+
+
+class Record(object):
+    '''A server side entity: its type and raw attribute values'''
+    def __init__(self, entity_type, data):
+        self.entity_type = entity_type
+        self.data = data
+
+    @property
+    def id(self):
+        return self.data['id']
+
+
+class FakeFtrackBackend(object):
+    '''
+    The fake server. Use seed() to populate it and installed() to route the
+    ``ftrack`` and ``ftrack_api`` modules to it.
+    '''
+    def __init__(self, latency=0.0, username=None, seed=0):
+        self.latency = latency
+        self.username = username or getpass.getuser()
+        self.records = {}
+        self.by_type = collections.defaultdict(collections.OrderedDict)
+        self.requests = collections.Counter()
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+
+    # Requests ----------------------------------------------------------------
+
+    def request(self, name):
+        '''Account for one round trip to the server'''
+        with self._lock:
+            self.requests[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def request_count(self):
+        return sum(self.requests.values())
+
+    # Storage -----------------------------------------------------------------
+
+    def new_id(self):
+        return str(uuid.UUID(int=self._random.getrandbits(128)))
+
+    def create(self, entity_type, **data):
+        data.setdefault('id', self.new_id())
+        record = Record(entity_type, data)
+        with self._lock:
+            self.records[record.id] = record
+            self.by_type[entity_type][record.id] = record
+        return record
+
+    def get(self, entity_id, entity_type=None):
+        record = self.records.get(entity_id)
+        if record is None:
+            return None
+        if entity_type and record.entity_type not in SUPER_TYPES.get(
+                entity_type, (entity_type,)):
+            return None
+        return record
+
+    def of_type(self, entity_type):
+        types = SUPER_TYPES.get(entity_type, (entity_type,))
+        for concrete_type in types:
+            for record in list(self.by_type[concrete_type].values()):
+                yield record
+
+    def first(self, entity_type, **filters):
+        for record in self.of_type(entity_type):
+            if all(record.data.get(key) == value for key, value in filters.items()):
+                return record
+        return None
+
+    def filter(self, entity_type, **filters):
+        return [
+            record for record in self.of_type(entity_type)
+            if all(record.data.get(key) == value for key, value in filters.items())
+        ]
+
+    # Relations ---------------------------------------------------------------
+
+    def relation(self, record, name):
+        '''
+        Return the value of the relation or computed attribute *name* of
+        *record*: a Record, a list of Records or a plain value
+        '''
+        data = record.data
+        entity_type = record.entity_type
+
+        if name == 'latest_version' or name + '_id' in data or (
+                name == 'project' and entity_type == 'Project'):
+            if name == 'latest_version':
+                versions = self.filter('AssetVersion', asset_id=data['id'])
+                return max(versions, key=lambda v: v.data['version']) if versions else None
+            if name == 'context':
+                return self.get(data.get('context_id'))
+            if name == 'project' and entity_type == 'Project':
+                return record
+            return self.get(data.get(name + '_id'))
+
+        if name == 'children':
+            return self.filter_any(CONTEXT_TYPES, parent_id=data['id'])
+        if name == 'assets':
+            return self.filter('Asset', context_id=data['id'])
+        if name == 'versions':
+            return sorted(
+                self.filter('AssetVersion', asset_id=data['id']),
+                key=lambda v: v.data['version'])
+        if name == 'components':
+            return self.filter('Component', version_id=data['id'])
+        if name == 'uses_versions':
+            return [self.get(id_) for id_ in data.get('uses_version_ids', [])]
+        if name == 'assignments':
+            return self.filter('Appointment', context_id=data['id'])
+        if name == 'statuses':
+            return [self.get(id_) for id_ in data.get('status_ids', [])]
+        if name == '_overrides':
+            return self.filter('ProjectSchemaOverride', project_schema_id=data['id'])
+        if name == 'link':
+            return self.link(record)
+        if name == 'ancestors':
+            return self.link(record, records=True)[1:-1]
+        if name == 'object_type':
+            return self.first('ObjectType', name=entity_type)
+        if name == 'custom_attributes':
+            return dict(data.get('custom_attributes', {}))
+        if name == 'metadata':
+            return dict(data.get('metadata', {}))
+
+        return data.get(name)
+
+    def filter_any(self, entity_types, **filters):
+        records = []
+        for entity_type in entity_types:
+            records.extend(self.filter(entity_type, **filters))
+        return records
+
+    def link(self, record, records=False):
+        chain = []
+        while record is not None:
+            chain.append(record if records else {
+                'id': record.id,
+                'name': record.data.get('name'),
+                'type': 'Project' if record.entity_type == 'Project' else 'TypedContext'
+            })
+            record = self.get(record.data.get('parent_id'))
+        chain.reverse()
+        return chain
+
+    def resolve(self, record, path):
+        '''
+        Resolve a dotted attribute *path* on *record*. Collections along the
+        path are flattened into a list of values.
+        '''
+        values = [record]
+        for name in path.split('.'):
+            resolved = []
+            for value in values:
+                if not isinstance(value, Record):
+                    continue
+                result = self.relation(value, name)
+                if isinstance(result, list) and name not in ('link',):
+                    resolved.extend(result)
+                else:
+                    resolved.append(result)
+            values = resolved
+        return values
+
+    # Seeding -----------------------------------------------------------------
+
+    def seed(self, sequences=5, shots_per_sequence=20, tasks_per_shot=3,
+             assets_per_shot=2, versions_per_asset=3, file_root='/tmp/ftrack_benchmark'):
+        '''Populate a realistic project hierarchy'''
+        statuses = [self.create('Status', name=name) for name in STATUSES]
+        task_types = [self.create('Type', name=name) for name in TASK_TYPES]
+        for short, name in ASSET_TYPES:
+            self.create('AssetType', short=short, name=name)
+        for name in ('Sequence', 'Shot', 'Task'):
+            self.create('ObjectType', name=name)
+        self.create('User', username=self.username)
+
+        workflow = self.create(
+            'WorkflowSchema', name='Benchmark workflow',
+            status_ids=[status.id for status in statuses])
+        self.create(
+            'ProjectSchema', name='Benchmark schema', _task_workflow_id=workflow.id)
+        project = self.create(
+            'Project', name='benchmark_project', full_name='Benchmark project',
+            parent_id=None, object_typeid=None,
+            project_schema_id=self.first('ProjectSchema').id)
+
+        asset_types = [self.first('AssetType', short=short) for short in ('geo', 'anim', 'rig')]
+        self.file_root = file_root
+
+        for sequence_index in range(sequences):
+            sequence = self.create(
+                'Sequence', name='sq{0:03d}'.format(sequence_index),
+                parent_id=project.id, project_id=project.id,
+                object_typeid=SEQUENCE_OBJECT_TYPE_ID)
+
+            for shot_index in range(shots_per_sequence):
+                shot = self.create(
+                    'Shot', name='sh{0:04d}'.format(shot_index * 10),
+                    parent_id=sequence.id, project_id=project.id,
+                    object_typeid=SHOT_OBJECT_TYPE_ID,
+                    custom_attributes={'fstart': 1001.0, 'fend': 1100.0, 'fps': 24.0})
+
+                tasks = []
+                for task_index in range(tasks_per_shot):
+                    task_type = task_types[task_index % len(task_types)]
+                    task = self.create(
+                        'Task', name=task_type.data['name'].lower(),
+                        parent_id=shot.id, project_id=project.id,
+                        object_typeid=TASK_OBJECT_TYPE_ID,
+                        type_id=task_type.id,
+                        status_id=statuses[task_index % len(statuses)].id)
+                    tasks.append(task)
+                    if task_index == 0:
+                        self.create(
+                            'Appointment', context_id=task.id,
+                            resource_id=self.first('User').id, type='assignment')
+
+                for asset_index in range(assets_per_shot):
+                    asset_type = asset_types[asset_index % len(asset_types)]
+                    asset = self.create(
+                        'Asset', name='{0}_{1}_{2}'.format(
+                            shot.data['name'], asset_type.data['short'], asset_index),
+                        context_id=shot.id, parent_id=shot.id, type_id=asset_type.id)
+                    for version_number in range(1, versions_per_asset + 1):
+                        self.create_version(
+                            asset, version_number, tasks[0].id, comment='')
+
+        return self
+
+    def create_version(self, asset, version_number, task_id, comment=''):
+        version = self.create(
+            'AssetVersion', asset_id=asset.id, task_id=task_id,
+            version=version_number, comment=comment, uses_version_ids=[],
+            is_published=True)
+        self.create(
+            'Component', name='main', version_id=version.id, metadata={},
+            path='{0}/{1}/{2}_v{3:03d}.fbx'.format(
+                getattr(self, 'file_root', '/tmp/ftrack_benchmark'),
+                asset.data['context_id'], asset.data['name'], version_number))
+        return version
+
+    def unity_metadata(self, version_record):
+        '''
+        Return the Unity importer metadata an import of *version_record*
+        writes, so a FakeProject can be seeded with matching assets
+        '''
+        asset = self.get(version_record.data['asset_id'])
+        component = self.filter('Component', version_id=version_record.id)[0]
+        return {
+            'assetName': asset.data['name'],
+            'assetType': self.get(asset.data['type_id']).data['short'],
+            'assetVersion': version_record.data['version'],
+            'assetVersionId': version_record.id,
+            'componentName': component.data['name'],
+            'componentId': component.id,
+            'filePath': component.data['path'],
+            'ftrack_connect_unity_version': 'benchmark'
+        }
+
+    # Installation ------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def installed(self):
+        '''
+        Route the ``ftrack`` and ``ftrack_api`` module entry points the
+        integration uses to this backend for the duration of the block
+        '''
+        import ftrack
+        import ftrack_api
+
+        legacy = LegacyApi(self)
+        patches = [
+            (ftrack, 'setup', legacy.setup),
+            (ftrack, 'Task', legacy.Task),
+            (ftrack, 'Shot', legacy.Shot),
+            (ftrack, 'AssetVersion', legacy.AssetVersion),
+            (ftrack, 'AssetType', legacy.AssetType),
+            (ftrack, 'User', legacy.User),
+            (ftrack, 'Review', legacy.Review),
+            (ftrack, 'getTaskStatuses', legacy.getTaskStatuses),
+            (ftrack_api, 'Session', self.session),
+        ]
+        originals = [(module, name, getattr(module, name, None)) for module, name, _ in patches]
+        for module, name, value in patches:
+            setattr(module, name, value)
+        try:
+            yield self
+        finally:
+            for module, name, value in originals:
+                setattr(module, name, value)
+
+    def session(self, *args, **kwargs):
+        '''Factory standing in for ftrack_api.Session'''
+        return FakeSession(self)
+
+
+# ftrack_api ------------------------------------------------------------------
+
+class FakeEntity(Mapping):
+    '''
+    A session side entity. Attributes which were not loaded by the query
+    that returned the entity are lazily fetched, one request each, like
+    ftrack_api does.
+    '''
+    def __init__(self, session, record):
+        self._session = session
+        self._record = record
+        self._loaded = set(['id'])
+
+    @property
+    def entity_type(self):
+        return self._record.entity_type
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            self._session._backend.request(
+                'lazy load {0}.{1}'.format(self.entity_type, key))
+            self._loaded.add(key)
+        return self._session._wrap(self._session._backend.relation(self._record, key))
+
+    def __setitem__(self, key, value):
+        if isinstance(value, FakeEntity):
+            self._record.data[key + '_id'] = value['id']
+        else:
+            self._record.data[key] = value
+        self._loaded.add(key)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def __iter__(self):
+        return iter(self._record.data)
+
+    def __len__(self):
+        return len(self._record.data)
+
+    def __repr__(self):
+        return '<{0}({1})>'.format(self.entity_type, self._record.id)
+
+
+class FakeQueryResult(object):
+    def __init__(self, session, expression):
+        self._session = session
+        self._expression = expression
+        self._entities = None
+
+    def _fetch(self):
+        if self._entities is None:
+            self._entities = self._session._execute(self._expression)
+        return self._entities
+
+    def all(self):
+        return list(self._fetch())
+
+    def first(self):
+        entities = self._fetch()
+        return entities[0] if entities else None
+
+    def one(self):
+        entities = self._fetch()
+        if len(entities) != 1:
+            raise FakeFtrackError(
+                'Expected exactly one result for {0!r}, got {1}'.format(
+                    self._expression, len(entities)))
+        return entities[0]
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+
+class FakeLocation(object):
+    '''A disk location holding every component at its *path*'''
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return 'benchmark-location'
+        raise KeyError(key)
+
+    def get_filesystem_path(self, component):
+        return self.get_filesystem_paths([component])[0]
+
+    def get_filesystem_paths(self, components):
+        self._backend.request('location get_filesystem_paths')
+        return [component._record.data['path'] for component in components]
+
+
+class FakeEventHub(object):
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def publish(self, *args, **kwargs):
+        pass
+
+
+class FakeSession(object):
+    '''Stands in for ftrack_api.Session'''
+    def __init__(self, backend):
+        self._backend = backend
+        self._entities = {}
+        self._api_user = backend.username
+        self._api_key = 'benchmark-api-key'
+        self.event_hub = FakeEventHub()
+
+    def _wrap(self, value):
+        if isinstance(value, Record):
+            entity = self._entities.get(value.id)
+            if entity is None:
+                entity_class = _entity_class(value.entity_type)
+                entity = entity_class(self, value)
+                self._entities[value.id] = entity
+            return entity
+        if isinstance(value, list):
+            return [self._wrap(item) for item in value]
+        return value
+
+    def get(self, entity_type, entity_id):
+        self._backend.request('get {0}'.format(entity_type))
+        record = self._backend.get(entity_id, entity_type)
+        if record is None:
+            return None
+        entity = self._wrap(record)
+        entity._loaded.update(
+            key for key in record.data if not key.endswith('_id'))
+        return entity
+
+    def query(self, expression):
+        return FakeQueryResult(self, expression)
+
+    def create(self, entity_type, data=None):
+        record = self._backend.create(entity_type, **dict(data or {}))
+        entity = self._wrap(record)
+        entity._loaded.update(record.data)
+        return entity
+
+    def commit(self):
+        self._backend.request('commit')
+
+    def pick_location(self, component=None):
+        return FakeLocation(self._backend)
+
+    def pick_locations(self, components):
+        self._backend.request('pick_locations')
+        location = FakeLocation(self._backend)
+        return [location for _ in components]
+
+    def close(self):
+        pass
+
+    def _execute(self, expression):
+        self._backend.request('query')
+        query = parse_query(expression)
+
+        records = [
+            record for record in self._backend.of_type(query.entity_type)
+            if query.where is None or query.where.evaluate(self._backend, record)
+        ]
+        for path, descending in reversed(query.order_by):
+            records.sort(
+                key=lambda record: self._backend.resolve(record, path),
+                reverse=descending)
+        if query.limit is not None:
+            records = records[:query.limit]
+
+        entities = [self._wrap(record) for record in records]
+        for entity in entities:
+            if query.projections:
+                for projection in query.projections:
+                    self._mark_loaded(entity, projection.split('.'))
+            else:
+                entity._loaded.update(
+                    key for key in entity._record.data if not key.endswith('_id'))
+        return entities
+
+    def _mark_loaded(self, entity, names):
+        '''Mark the projected attribute path *names* as loaded'''
+        if not isinstance(entity, FakeEntity) or not names:
+            return
+        entity._loaded.add(names[0])
+        if len(names) > 1:
+            related = self._wrap(self._backend.relation(entity._record, names[0]))
+            for item in related if isinstance(related, list) else [related]:
+                self._mark_loaded(item, names[1:])
+
+
+class FakeProjectSchema(FakeEntity):
+    def get_statuses(self, schema, type_id=None):
+        '''Return the statuses of *schema* ("Task" only) for *type_id*'''
+        for override in self['_overrides']:
+            if override['type_id'] == type_id:
+                return override['workflow_schema']['statuses']
+        return self['_task_workflow']['statuses']
+
+
+# Entity types with methods of their own
+_ENTITY_BASES = {
+    'ProjectSchema': FakeProjectSchema,
+}
+
+_entity_classes = {}
+
+
+def _entity_class(entity_type):
+    '''Return an entity class named after *entity_type*, like ftrack_api does'''
+    if entity_type not in _entity_classes:
+        _entity_classes[entity_type] = type(
+            str(entity_type), (_ENTITY_BASES.get(entity_type, FakeEntity),), {})
+    return _entity_classes[entity_type]
+
+
+# Query language --------------------------------------------------------------
+
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<string>"[^"]*"|'[^']*')|
+        (?P<number>-?\d+(?:\.\d+)?)|
+        (?P<punctuation>[(),])|
+        (?P<word>[\w.]+)
+    )''', re.VERBOSE)
+
+
+class Query(object):
+    def __init__(self):
+        self.projections = []
+        self.entity_type = None
+        self.where = None
+        self.order_by = []
+        self.limit = None
+
+
+class Condition(object):
+    def __init__(self, path, operator, value):
+        self.path = path
+        self.operator = operator
+        self.value = value
+
+    def evaluate(self, backend, record):
+        values = backend.resolve(record, self.path)
+        if self.operator in ('any', 'has'):
+            return any(
+                isinstance(value, Record) and self.value.evaluate(backend, value)
+                for value in values)
+        if self.operator == 'is':
+            return any(_equal(value, self.value) for value in values) or (
+                self.value is None and not values)
+        if self.operator == 'is_not':
+            return not any(_equal(value, self.value) for value in values)
+        if self.operator == 'in':
+            return any(_equal(value, item) for value in values for item in self.value)
+        if self.operator == 'not_in':
+            return not any(_equal(value, item) for value in values for item in self.value)
+        if self.operator == 'like':
+            pattern = re.compile(
+                '^' + re.escape(self.value).replace('\\%', '.*') + '$', re.IGNORECASE)
+            return any(pattern.match(str(value)) for value in values if value is not None)
+        raise FakeFtrackError('Unsupported operator {0}'.format(self.operator))
+
+
+class Junction(object):
+    def __init__(self, operator, conditions):
+        self.operator = operator
+        self.conditions = conditions
+
+    def evaluate(self, backend, record):
+        results = (condition.evaluate(backend, record) for condition in self.conditions)
+        return all(results) if self.operator == 'and' else any(results)
+
+
+def _equal(value, expected):
+    if isinstance(value, Record):
+        value = value.id
+    if isinstance(value, (int, float)) and not isinstance(expected, (int, float)):
+        try:
+            expected = float(expected)
+        except (TypeError, ValueError):
+            return False
+    return value == expected
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise FakeFtrackError('Cannot parse query {0!r}'.format(expression))
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1]
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+def parse_query(expression):
+    '''Parse an ftrack query *expression* into a Query'''
+    tokens = _tokenize(expression)
+    query = Query()
+    position = [0]
+
+    def peek():
+        return tokens[position[0]] if position[0] < len(tokens) else (None, None)
+
+    def take():
+        token = peek()
+        position[0] += 1
+        return token
+
+    def keyword(word):
+        kind, value = peek()
+        if kind == 'word' and value.lower() == word:
+            position[0] += 1
+            return True
+        return False
+
+    if keyword('select'):
+        while True:
+            query.projections.append(take()[1])
+            if peek() == ('punctuation', ','):
+                take()
+                continue
+            break
+        if not keyword('from'):
+            raise FakeFtrackError('Expected "from" in {0!r}'.format(expression))
+
+    query.entity_type = take()[1]
+
+    def parse_value():
+        kind, value = take()
+        if kind == 'word' and value.lower() in ('none', 'null'):
+            return None
+        if kind == 'word' and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        return value
+
+    def parse_condition():
+        if peek() == ('punctuation', '('):
+            take()
+            expression_ = parse_or()
+            take()
+            return expression_
+
+        path = take()[1]
+        operator = take()[1].lower()
+        if operator == 'not' and keyword('in'):
+            operator = 'not_in'
+
+        if operator in ('any', 'has'):
+            take()
+            value = parse_or()
+            take()
+        elif operator in ('in', 'not_in'):
+            take()
+            value = []
+            while peek() != ('punctuation', ')'):
+                value.append(parse_value())
+                if peek() == ('punctuation', ','):
+                    take()
+            take()
+        else:
+            value = parse_value()
+        return Condition(path, operator, value)
+
+    def parse_and():
+        conditions = [parse_condition()]
+        while keyword('and'):
+            conditions.append(parse_condition())
+        return conditions[0] if len(conditions) == 1 else Junction('and', conditions)
+
+    def parse_or():
+        conditions = [parse_and()]
+        while keyword('or'):
+            conditions.append(parse_and())
+        return conditions[0] if len(conditions) == 1 else Junction('or', conditions)
+
+    if keyword('where'):
+        query.where = parse_or()
+
+    if keyword('order'):
+        keyword('by')
+        while True:
+            path = take()[1]
+            descending = keyword('descending')
+            if not descending:
+                keyword('ascending')
+            query.order_by.append((path, descending))
+            if peek() == ('punctuation', ','):
+                take()
+                continue
+            break
+
+    if keyword('limit'):
+        query.limit = int(take()[1])
+
+    return query
+
+
+# Legacy ftrack API -----------------------------------------------------------
+
+class _LegacyEntity(object):
+    '''Base for the legacy API objects. Construction fetches the entity.'''
+    entity_type = None
+
+    def __init__(self, backend, record):
+        self._backend = backend
+        self._record = record
+
+    def _request(self, name):
+        self._backend.request('legacy {0}.{1}'.format(self.__class__.__name__, name))
+
+    def getId(self):
+        return self._record.id
+
+    def getName(self):
+        return self._record.data.get('name')
+
+    def get(self, key):
+        data = self._record.data
+        legacy_keys = {
+            'typeid': 'type_id',
+            'statusid': 'status_id',
+            'taskid': 'task_id',
+            'parentid': 'parent_id',
+        }
+        if key in legacy_keys:
+            return data.get(legacy_keys[key])
+        if key in data:
+            return data[key]
+        return data.get('custom_attributes', {}).get(key)
+
+    def __eq__(self, other):
+        return isinstance(other, _LegacyEntity) and other.getId() == self.getId()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.getId())
+
+
+class LegacyStatus(_LegacyEntity):
+    pass
+
+
+class LegacyAssetType(_LegacyEntity):
+    def getShort(self):
+        return self._record.data['short']
+
+
+class LegacyComponent(_LegacyEntity):
+    def getFilesystemPath(self):
+        return self._record.data.get('path')
+
+    def setMeta(self, key, value=None):
+        self._request('setMeta')
+        metadata = self._record.data.setdefault('metadata', {})
+        if isinstance(key, dict):
+            metadata.update(key)
+        else:
+            metadata[key] = value
+
+    def getMeta(self, key=None):
+        self._request('getMeta')
+        metadata = self._record.data.get('metadata', {})
+        return metadata if key is None else metadata.get(key)
+
+
+class LegacyAssetVersion(_LegacyEntity):
+    def getVersion(self):
+        return self._record.data['version']
+
+    def getComment(self):
+        return self._record.data.get('comment', '')
+
+    def getAsset(self):
+        self._request('getAsset')
+        return LegacyAsset(self._backend, self._backend.get(self._record.data['asset_id']))
+
+    def getTask(self):
+        self._request('getTask')
+        return LegacyTask(self._backend, self._backend.get(self._record.data['task_id']))
+
+    def getComponents(self):
+        self._request('getComponents')
+        return [
+            LegacyComponent(self._backend, record)
+            for record in self._backend.filter('Component', version_id=self.getId())
+        ]
+
+    def getComponent(self, name='main'):
+        self._request('getComponent')
+        record = self._backend.first('Component', version_id=self.getId(), name=name)
+        if record is None:
+            raise FakeFtrackError('No component {0}'.format(name))
+        return LegacyComponent(self._backend, record)
+
+    def createComponent(self, name='main', path='', location=None, **kwargs):
+        self._request('createComponent')
+        record = self._backend.create(
+            'Component', name=name, version_id=self.getId(), path=path, metadata={})
+        return LegacyComponent(self._backend, record)
+
+    def usesVersions(self):
+        self._request('usesVersions')
+        return [
+            LegacyAssetVersion(self._backend, self._backend.get(version_id))
+            for version_id in self._record.data.get('uses_version_ids', [])
+        ]
+
+    def addUsesVersions(self, versions=None):
+        self._request('addUsesVersions')
+        self._record.data.setdefault('uses_version_ids', []).extend(
+            version.getId() for version in versions or [])
+
+    def publish(self):
+        self._request('publish')
+        self._record.data['is_published'] = True
+
+
+class LegacyAsset(_LegacyEntity):
+    def getType(self):
+        self._request('getType')
+        return LegacyAssetType(self._backend, self._backend.get(self._record.data['type_id']))
+
+    def getVersions(self):
+        self._request('getVersions')
+        return [
+            LegacyAssetVersion(self._backend, record)
+            for record in self._backend.relation(self._record, 'versions')
+        ]
+
+    def createVersion(self, comment='', taskid=None):
+        self._request('createVersion')
+        versions = self._backend.filter('AssetVersion', asset_id=self.getId())
+        number = 1 + max([v.data['version'] for v in versions] or [0])
+        record = self._backend.create(
+            'AssetVersion', asset_id=self.getId(), task_id=taskid,
+            version=number, comment=comment, uses_version_ids=[],
+            is_published=False)
+        return LegacyAssetVersion(self._backend, record)
+
+
+class LegacyTask(_LegacyEntity):
+    '''The legacy Task class, used for any context (shots included)'''
+    def getParent(self):
+        self._request('getParent')
+        parent = self._backend.get(self._record.data.get('parent_id'))
+        return self._legacy(parent) if parent else None
+
+    def getParents(self):
+        self._request('getParents')
+        parents = []
+        record = self._backend.get(self._record.data.get('parent_id'))
+        while record is not None:
+            parents.append(self._legacy(record))
+            record = self._backend.get(record.data.get('parent_id'))
+        return parents
+
+    def getProject(self):
+        self._request('getProject')
+        return LegacyProject(
+            self._backend, self._backend.get(self._record.data['project_id']))
+
+    def getTasks(self):
+        self._request('getTasks')
+        return [
+            LegacyTask(self._backend, record)
+            for record in self._backend.filter('Task', parent_id=self.getId())
+        ]
+
+    def getAssets(self, assetTypes=None):
+        self._request('getAssets')
+        assets = []
+        for record in self._backend.filter('Asset', context_id=self.getId()):
+            short = self._backend.get(record.data['type_id']).data['short']
+            if not assetTypes or short in assetTypes:
+                assets.append(LegacyAsset(self._backend, record))
+        return assets
+
+    def createAsset(self, name, assetType):
+        self._request('createAsset')
+        asset_type = self._backend.first('AssetType', short=assetType)
+        record = self._backend.first(
+            'Asset', context_id=self.getId(), name=name, type_id=asset_type.id)
+        if record is None:
+            record = self._backend.create(
+                'Asset', name=name, context_id=self.getId(),
+                parent_id=self.getId(), type_id=asset_type.id)
+        return LegacyAsset(self._backend, record)
+
+    def setStatus(self, status):
+        self._request('setStatus')
+        self._record.data['status_id'] = status.getId()
+
+    def getStatus(self):
+        self._request('getStatus')
+        return LegacyStatus(self._backend, self._backend.get(self._record.data['status_id']))
+
+    def _legacy(self, record):
+        if record.entity_type == 'Project':
+            return LegacyProject(self._backend, record)
+        return LegacyTask(self._backend, record)
+
+
+class LegacyProject(LegacyTask):
+    def getTaskStatuses(self, typeid=None):
+        self._request('getTaskStatuses')
+        return [
+            LegacyStatus(self._backend, record)
+            for record in self._backend.of_type('Status')
+        ]
+
+
+class LegacyUser(_LegacyEntity):
+    def getTasks(self):
+        self._request('getTasks')
+        tasks = []
+        for appointment in self._backend.filter('Appointment', resource_id=self.getId()):
+            tasks.append(LegacyTask(self._backend, self._backend.get(
+                appointment.data['context_id'])))
+        return tasks
+
+
+class LegacyApi(object):
+    '''The legacy ``ftrack`` module entry points, bound to a backend'''
+    def __init__(self, backend):
+        self._backend = backend
+
+        api = self
+
+        class Review(object):
+            @staticmethod
+            def makeReviewable(version, path):
+                api._backend.request('legacy Review.makeReviewable')
+                return version.createComponent(name='ftrackreview-mp4', path=path)
+
+        self.Review = Review
+
+    def _fetch(self, name, entity_id, entity_types):
+        self._backend.request('legacy {0}'.format(name))
+        record = self._backend.get(entity_id)
+        if record is None or record.entity_type not in entity_types:
+            raise FakeFtrackError('{0} {1} not found'.format(name, entity_id))
+        return record
+
+    def setup(self, *args, **kwargs):
+        pass
+
+    def Task(self, *args, **kwargs):
+        entity_id = kwargs.get('id') or next((arg for arg in args if arg), None)
+        record = self._fetch('Task', entity_id, CONTEXT_TYPES)
+        if record.entity_type == 'Project':
+            return LegacyProject(self._backend, record)
+        return LegacyTask(self._backend, record)
+
+    def Shot(self, id=None, **kwargs):
+        return LegacyTask(self._backend, self._fetch('Shot', id, ('Shot',)))
+
+    def AssetVersion(self, id=None, **kwargs):
+        return LegacyAssetVersion(
+            self._backend, self._fetch('AssetVersion', id, ('AssetVersion',)))
+
+    def AssetType(self, short=None, **kwargs):
+        self._backend.request('legacy AssetType')
+        record = self._backend.first('AssetType', short=short)
+        if record is None:
+            raise FakeFtrackError('AssetType {0} not found'.format(short))
+        return LegacyAssetType(self._backend, record)
+
+    def User(self, username=None, **kwargs):
+        self._backend.request('legacy User')
+        record = self._backend.first('User', username=username)
+        if record is None:
+            raise FakeFtrackError('User {0} not found'.format(username))
+        return LegacyUser(self._backend, record)
+
+    def getTaskStatuses(self):
+        self._backend.request('legacy getTaskStatuses')
+        return [
+            LegacyStatus(self._backend, record)
+            for record in self._backend.of_type('Status')
+        ]
@@ -0,0 +1,502 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+A stand-in for the Unity side of the Python for Unity rpyc connection.
+
+The service mimics the parts of the UnityEditor, UnityEngine and System.IO
+APIs the connector relies on (AssetDatabase, AssetImporter, Selection,
+PrefabUtility and the ftrack ServerSideUtils) and serves them over a real
+rpyc socket, so the client pays the same netref round trips it would pay
+against a live editor. Every API call can be slowed down by a configurable
+latency to emulate a busy editor.
+
+The project also writes a .meta file next to every asset, modelled on
+fixture/model.fbx.meta, so the connector scans the same files it would find
+in a real project.
+"""
+
+import collections
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import rpyc
+from rpyc.utils.server import ThreadedServer
+
+logger = logging.getLogger(__name__)
+
+# Configuration shared by both ends of the connection. Public attributes
+# must be reachable since we serve plain Python objects instead of C# types.
+PROTOCOL_CONFIG = {
+    'allow_public_attrs': True,
+    'allow_pickle': False,
+    'sync_request_timeout': None,
+}
+
+MODEL_EXTENSIONS = ('.fbx', '.abc')
+
+META_FIXTURE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fixture', 'model.fbx.meta')
+
+# Unity folds the quoted scalars longer than this many columns
+META_WIDTH = 80
+
+_META_GUID = re.compile(r'^guid: .*$', re.MULTILINE)
+_META_USER_DATA = re.compile(r"^  userData: '(?:[^']|'')*'$", re.MULTILINE)
+_meta_template = None
+
+
+def fold_scalar(key, value, indentation=2, width=META_WIDTH):
+    '''
+    Return the YAML lines of *key* with the single quoted *value*, folded
+    at its spaces the way Unity does
+    '''
+    if not value:
+        return '{0}{1}: '.format(' ' * indentation, key)
+
+    words = value.replace("'", "''").split(' ')
+    lines = ["{0}{1}: '{2}".format(' ' * indentation, key, words[0])]
+    for previous, word in zip(words, words[1:]):
+        # Only single spaces can be folded
+        if previous and word and len(lines[-1]) + 1 + len(word) > width:
+            lines.append('{0}{1}'.format(' ' * (indentation + 2), word))
+        else:
+            lines[-1] += ' ' + word
+    lines[-1] += "'"
+    return '\n'.join(lines)
+
+
+def meta_text(guid, user_data):
+    '''Return the content of a .meta file of *guid* holding *user_data*'''
+    global _meta_template
+    if _meta_template is None:
+        with open(META_FIXTURE) as meta_file:
+            _meta_template = meta_file.read()
+
+    text = _META_GUID.sub(lambda match: 'guid: {0}'.format(guid), _meta_template)
+    return _META_USER_DATA.sub(lambda match: fold_scalar('userData', user_data), text)
+
+
+class FakeAsset(object):
+    '''An asset of the fake project'''
+    def __init__(self, guid, path, user_data=''):
+        self.guid = guid
+        self.path = path
+        self.user_data = user_data
+
+    @property
+    def is_model(self):
+        return os.path.splitext(self.path)[1].lower() in MODEL_EXTENSIONS
+
+
+class FakeProject(object):
+    '''
+    A synthetic Unity project of *asset_count* model assets, a fraction
+    (*ftrack_ratio*) of which carry ftrack metadata in their importer
+    userData.
+
+    *ftrack_metadata* is an optional list of asset data dictionaries (as
+    written by GenericAsset._import_unity_asset_component) to cycle through
+    for the ftrack assets, so the project can match a seeded ftrack backend.
+
+    The .meta files are written under *root*, which is emptied of the
+    assets and ftrack Library files of previous runs. By default the project
+    lives in a new temporary directory, removed by close.
+    '''
+    def __init__(self, asset_count, ftrack_ratio=0.5, seed=0,
+                 root=None, ftrack_metadata=None, selection_size=100):
+        self._temporary = root is None
+        self.root = root or tempfile.mkdtemp(prefix='fake_unity_project_')
+        self.data_path = os.path.join(self.root, 'Assets')
+        for path in ('Assets/ftrack', 'Library/ftrack'):
+            shutil.rmtree(self.full_path(path), ignore_errors=True)
+        self.lock = threading.RLock()
+        self.assets_by_guid = collections.OrderedDict()
+        self.assets_by_path = {}
+        self.selected_guids = []
+        self.selected_game_objects = []
+        self.console = []
+
+        self._random = random.Random(seed)
+        ftrack_every = int(round(1.0 / ftrack_ratio)) if ftrack_ratio else 0
+
+        for index in range(asset_count):
+            path = 'Assets/ftrack/Sequence_{0:03d}/Shot_{1:04d}/asset_{2:06d}.fbx'.format(
+                index // 10000, index // 100, index)
+
+            user_data = ''
+            if ftrack_every and index % ftrack_every == 0:
+                if ftrack_metadata:
+                    asset_data = ftrack_metadata[
+                        (index // ftrack_every) % len(ftrack_metadata)]
+                else:
+                    asset_data = self._make_asset_data(index, path)
+                user_data = json.dumps(asset_data)
+
+            self.add_asset(path, user_data)
+
+        # Select some assets in the project window and instantiate some of
+        # them in the scene
+        guids = list(self.assets_by_guid)
+        selection = guids[:selection_size]
+        self.selected_guids = selection[:len(selection) // 2]
+        self.selected_game_objects = [
+            FakeGameObject(self.assets_by_guid[guid].path)
+            for guid in selection[len(selection) // 2:]
+        ]
+
+    def _make_asset_data(self, index, path):
+        return {
+            'assetName': 'asset_{0:06d}'.format(index),
+            'assetType': 'geo',
+            'assetVersion': 1 + index % 5,
+            'assetVersionId': self.new_id(),
+            'componentName': 'main',
+            'componentId': self.new_id(),
+            'filePath': '/mnt/projects/{0}'.format(path),
+            'ftrack_connect_unity_version': 'benchmark'
+        }
+
+    def new_id(self):
+        '''Return a deterministic ftrack style id'''
+        return str(uuid.UUID(int=self._random.getrandbits(128)))
+
+    def new_guid(self):
+        '''Return a deterministic Unity style guid'''
+        return uuid.UUID(int=self._random.getrandbits(128)).hex
+
+    def add_asset(self, path, user_data=''):
+        '''Add or update the asset at *path* and return it'''
+        with self.lock:
+            asset = self.assets_by_path.get(path)
+            if asset:
+                asset.user_data = user_data
+            else:
+                asset = FakeAsset(self.new_guid(), path, user_data)
+                self.assets_by_guid[asset.guid] = asset
+                self.assets_by_path[path] = asset
+            self._write_meta(asset)
+            return asset
+
+    def remove_asset(self, path):
+        with self.lock:
+            asset = self.assets_by_path.pop(path, None)
+            if asset:
+                del self.assets_by_guid[asset.guid]
+                os.remove(self.full_path(path) + '.meta')
+            return asset is not None
+
+    def _write_meta(self, asset):
+        meta_path = self.full_path(asset.path) + '.meta'
+        directory = os.path.dirname(meta_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(meta_path, 'w') as meta_file:
+            meta_file.write(meta_text(asset.guid, asset.user_data))
+
+    def close(self):
+        '''Remove the project directory, if it is a temporary one'''
+        if self._temporary:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def full_path(self, path):
+        return os.path.normpath(os.path.join(self.root, path))
+
+    def asset_path(self, full_path):
+        '''Convert an absolute path under the project to an "Assets/..." path'''
+        relative = os.path.relpath(os.path.normpath(full_path), self.root)
+        return relative.replace(os.sep, '/')
+
+    @property
+    def ftrack_guids(self):
+        with self.lock:
+            return [
+                asset.guid for asset in self.assets_by_guid.values()
+                if asset.user_data
+            ]
+
+
+class FakeGameObject(object):
+    '''A scene instance of a prefab'''
+    def __init__(self, prefab_path):
+        self.prefab_path = prefab_path
+        self.name = os.path.splitext(os.path.basename(prefab_path))[0]
+
+
+class FakeEditorState(object):
+    '''State shared by all the fake API objects of a service'''
+    def __init__(self, project, latency=0.0):
+        self.project = project
+        self.latency = latency
+        self.calls = collections.Counter()
+        # Depth of AssetDatabase.StartAssetEditing, imports are deferred
+        self.asset_editing = 0
+
+    def call(self, name):
+        '''Record a call to the C# API *name* and wait for the latency'''
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class _FakeApi(object):
+    def __init__(self, state):
+        self._state = state
+
+    @property
+    def _project(self):
+        return self._state.project
+
+
+class FakeAssetDatabase(_FakeApi):
+    def FindAssets(self, search_filter, search_in_folders=None):
+        self._state.call('AssetDatabase.FindAssets')
+        with self._project.lock:
+            assets = list(self._project.assets_by_guid.values())
+        if search_filter == 't:model':
+            return [asset.guid for asset in assets if asset.is_model]
+        return [asset.guid for asset in assets]
+
+    def GUIDToAssetPath(self, guid):
+        self._state.call('AssetDatabase.GUIDToAssetPath')
+        asset = self._project.assets_by_guid.get(guid)
+        return asset.path if asset else ''
+
+    def AssetPathToGUID(self, path):
+        self._state.call('AssetDatabase.AssetPathToGUID')
+        asset = self._project.assets_by_path.get(path)
+        return asset.guid if asset else ''
+
+    def DeleteAsset(self, path):
+        self._state.call('AssetDatabase.DeleteAsset')
+        return self._project.remove_asset(path)
+
+    def ImportPackage(self, path, interactive):
+        self._state.call('AssetDatabase.ImportPackage')
+
+    def Refresh(self, *args):
+        self._state.call('AssetDatabase.Refresh')
+
+    def StartAssetEditing(self):
+        self._state.call('AssetDatabase.StartAssetEditing')
+        self._state.asset_editing += 1
+
+    def StopAssetEditing(self):
+        self._state.call('AssetDatabase.StopAssetEditing')
+        self._state.asset_editing = max(0, self._state.asset_editing - 1)
+
+
+class FakeModelImporter(object):
+    def __init__(self, asset):
+        self.assetPath = asset.path
+        self.userData = asset.user_data
+
+
+class FakeAssetImporter(_FakeApi):
+    def GetAtPath(self, path):
+        self._state.call('AssetImporter.GetAtPath')
+        asset = self._project.assets_by_path.get(path)
+        return FakeModelImporter(asset) if asset else None
+
+
+class FakeSelection(_FakeApi):
+    @property
+    def assetGUIDs(self):
+        self._state.call('Selection.assetGUIDs')
+        return list(self._project.selected_guids)
+
+    @property
+    def gameObjects(self):
+        self._state.call('Selection.gameObjects')
+        return list(self._project.selected_game_objects)
+
+
+class FakePrefabUtility(_FakeApi):
+    def GetPrefabAssetPathOfNearestInstanceRoot(self, game_object):
+        self._state.call('PrefabUtility.GetPrefabAssetPathOfNearestInstanceRoot')
+        return game_object.prefab_path
+
+
+class FakeServerSideUtils(_FakeApi):
+    '''The C# helpers the ftrack Unity package exposes to the client'''
+    def ImportAsset(self, json_arguments):
+        self._state.call('ServerSideUtils.ImportAsset')
+        arguments = json.loads(json_arguments)
+        asset_data = arguments['asset_data']
+        file_name = os.path.basename(asset_data['filePath'])
+        asset_path = self._project.asset_path(
+            os.path.join(arguments['dst_directory'], file_name))
+        if self._state.asset_editing and asset_path not in self._project.assets_by_path:
+            # Unity defers the import, there is no importer to hold the
+            # ftrack metadata yet
+            self._project.add_asset(asset_path)
+            self._project.console.append(
+                ('LogError', 'No importer for {0}'.format(asset_path)))
+            return
+        self._project.add_asset(asset_path, json.dumps(asset_data))
+
+    def SelectObjectsWithGuids(self, guids):
+        self._state.call('ServerSideUtils.SelectObjectsWithGuids')
+        self._project.selected_guids = list(guids)
+
+    def Publish(self, json_arguments):
+        self._state.call('ServerSideUtils.Publish')
+
+
+class FakeMovieRecorder(_FakeApi):
+    def ApplySettings(self, frame_start, frame_end, fps):
+        self._state.call('MovieRecorder.ApplySettings')
+
+
+class FakeApplication(_FakeApi):
+    @property
+    def dataPath(self):
+        self._state.call('Application.dataPath')
+        return self._project.data_path
+
+
+class FakeDebug(_FakeApi):
+    def _log(self, level, message):
+        self._state.call('Debug.' + level)
+        self._project.console.append((level, message))
+
+    def Log(self, message):
+        self._log('Log', message)
+
+    def LogWarning(self, message):
+        self._log('LogWarning', message)
+
+    def LogError(self, message):
+        self._log('LogError', message)
+
+
+class FakePath(_FakeApi):
+    def GetFullPath(self, path):
+        self._state.call('Path.GetFullPath')
+        return self._project.full_path(path)
+
+
+class _Namespace(object):
+    '''A C# namespace (or static class) holding other members'''
+    def __init__(self, **members):
+        self.__dict__.update(members)
+
+
+class FakeUnityService(rpyc.Service):
+    '''The service served to the client, standing in for the Unity server'''
+    def __init__(self, project, latency=0.0):
+        super(FakeUnityService, self).__init__()
+        self.state = FakeEditorState(project, latency)
+
+        state = self.state
+        self._unity_editor = _Namespace(
+            AssetDatabase=FakeAssetDatabase(state),
+            AssetImporter=FakeAssetImporter(state),
+            Selection=FakeSelection(state),
+            PrefabUtility=FakePrefabUtility(state),
+            Ftrack=_Namespace(
+                ConnectUnityEngine=_Namespace(
+                    ServerSideUtils=FakeServerSideUtils(state)
+                ),
+                MovieRecorder=FakeMovieRecorder(state)
+            )
+        )
+        self._unity_engine = _Namespace(
+            Application=FakeApplication(state),
+            Debug=FakeDebug(state)
+        )
+        self._modules = {
+            'System.IO': _Namespace(Path=FakePath(state))
+        }
+
+    @property
+    def exposed_UnityEditor(self):
+        return self._unity_editor
+
+    @property
+    def exposed_UnityEngine(self):
+        return self._unity_engine
+
+    def exposed_import_module(self, name):
+        return self._modules[name]
+
+
+class FakeClientService(object):
+    '''
+    Stands in for ftrackClientService on the client side: resolves the
+    UnityEngine/UnityEditor namespaces and modules through the connection
+    root, which is what the Unity client service does
+    '''
+    def __init__(self, connection):
+        self._connection = connection
+
+    @property
+    def UnityEngine(self):
+        return self._connection.root.UnityEngine
+
+    @property
+    def UnityEditor(self):
+        return self._connection.root.UnityEditor
+
+    def import_module(self, name):
+        return self._connection.root.import_module(name)
+
+
+class FakeUnityServer(object):
+    '''
+    Serve a FakeUnityService for *project* on a localhost socket. Use as a
+    context manager; connect() returns a client connection.
+    '''
+    def __init__(self, project, latency=0.0, hostname='localhost'):
+        self.service = FakeUnityService(project, latency)
+        self._server = ThreadedServer(
+            self.service,
+            hostname=hostname,
+            port=0,
+            protocol_config=PROTOCOL_CONFIG
+        )
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.port
+
+    @property
+    def calls(self):
+        return self.service.state.calls
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.start)
+        self._thread.daemon = True
+        self._thread.start()
+
+        # Wait for the server to accept connections
+        while not self._server.active:
+            time.sleep(0.01)
+
+        logger.debug('Fake Unity server listening on port {}'.format(self.port))
+        return self
+
+    def stop(self):
+        self._server.close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def connect(self):
+        return rpyc.connect(
+            self._server.host, self.port, config=PROTOCOL_CONFIG)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,129 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Shared helpers for the benchmark suites: python path setup (mirroring the
+environment the launch hook gives to the client process), rpyc round-trip
+counting and report formatting.
+"""
+
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SOURCE_PATH = os.path.join(ROOT_PATH, 'source')
+CONNECT_UNITY_PATH = os.path.join(SOURCE_PATH, 'ftrack_connect_unity')
+SCRIPTS_PATH = os.path.join(ROOT_PATH, 'resource', 'scripts')
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+
+
+def setup_paths():
+    '''
+    Make the client modules importable the same way they are when Unity
+    starts ftrack_client.py (see the launch hook PYTHONPATH)
+    '''
+    for path in (SCRIPTS_PATH, CONNECT_UNITY_PATH, SOURCE_PATH):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def parse_scales(value):
+    '''Parse a comma separated list of asset counts'''
+    return tuple(int(scale) for scale in value.split(',') if scale.strip())
+
+
+class AssetObject(object):
+    '''
+    The subset of FTAssetObject the connector reads, built from keyword
+    arguments so the benchmarks do not need a server to fill it
+    '''
+    def __init__(self, **kwargs):
+        self.assetName = ''
+        self.assetType = ''
+        self.assetVersion = 1
+        self.assetVersionId = ''
+        self.componentName = 'main'
+        self.componentId = ''
+        self.filePath = ''
+        self.options = {}
+        self.__dict__.update(kwargs)
+
+
+class RoundTripCounter(object):
+    '''
+    Count the requests sent over an rpyc *connection*. Every netref attribute
+    access, call or iteration goes through sync_request or async_request, so
+    this is the number of socket round trips the client pays for.
+    '''
+    def __init__(self, connection):
+        self.count = 0
+        self._connection = connection
+        self._sync_request = connection.sync_request
+        self._async_request = connection.async_request
+        connection.sync_request = self._counted(self._sync_request)
+        connection.async_request = self._counted(self._async_request)
+
+    def _counted(self, request):
+        def counted_request(*args, **kwargs):
+            self.count += 1
+            return request(*args, **kwargs)
+        return counted_request
+
+    def reset(self):
+        self.count = 0
+
+    def detach(self):
+        '''Restore the original request methods on the connection'''
+        self._connection.sync_request = self._sync_request
+        self._connection.async_request = self._async_request
+
+
+def measure(operation, scale, func, counter=None, repeat=1, queries=None):
+    '''
+    Run *func* *repeat* times and return a result dictionary with the best
+    wall time, the rpyc round trips (*counter*) and the backend queries
+    (*queries*, a callable returning a running total) of the best run
+    '''
+    best = None
+    for _ in range(repeat):
+        if counter:
+            counter.reset()
+        queries_before = queries() if queries else 0
+
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+
+        result = {
+            'operation': operation,
+            'scale': scale,
+            'seconds': elapsed,
+            'round_trips': counter.count if counter else None,
+            'queries': queries() - queries_before if queries else None
+        }
+        if best is None or elapsed < best['seconds']:
+            best = result
+
+    return best
+
+
+def print_report(title, results, stream=None):
+    '''Print *results* (as returned by measure) as a table'''
+    stream = stream or sys.stdout
+    header = '{0:<32} {1:>8} {2:>12} {3:>12} {4:>10}'
+    row = '{0:<32} {1:>8} {2:>12.4f} {3:>12} {4:>10}'
+
+    stream.write('\n{0}\n{1}\n'.format(title, '=' * len(title)))
+    stream.write(header.format(
+        'operation', 'assets', 'seconds', 'round trips', 'queries') + '\n')
+    for result in results:
+        stream.write(row.format(
+            result['operation'],
+            result['scale'],
+            result['seconds'],
+            '-' if result['round_trips'] is None else result['round_trips'],
+            '-' if result['queries'] is None else result['queries']
+        ) + '\n')
+    stream.flush()
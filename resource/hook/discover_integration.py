@@ -4,6 +4,8 @@
 import functools
 import sys
 import os
+import logging
+import time
 
 import ftrack_api
 
@@ -11,6 +13,59 @@ cwd = os.path.dirname(__file__)
 sources = os.path.abspath(os.path.join(cwd, '..', 'dependencies'))
 sys.path.append(sources)
 
+logger = logging.getLogger('ftrack_connect_unity_engine.hook')
+
+# Seconds a resolved launch context is reused for
+CONTEXT_CACHE_TTL = 60.0
+
+# entity id -> (resolution time, launch context), see _resolve_launch_context
+_context_cache = {}
+
+_CONTEXT_QUERY = (
+    'select id, parent_id, link, ancestors.object_type.name, '
+    'parent.custom_attributes '
+    'from Context where id is "{0}"'
+)
+
+
+def _resolve_launch_context(session, entity_id):
+    '''
+    Return the task id, shot id, frame start and frame end Unity is launched
+    with for *entity_id*, and the path to its context snapshot (see
+    ftrack_connect_unity.context_snapshot). The result is reused for
+    CONTEXT_CACHE_TTL seconds.
+    '''
+    cached = _context_cache.get(entity_id)
+    if cached and time.time() - cached[0] < CONTEXT_CACHE_TTL:
+        # Without a snapshot file (it could not be written) the context is
+        # still good to reuse
+        snapshot_path = cached[1]['snapshot_path']
+        if not snapshot_path or os.path.exists(snapshot_path):
+            return cached[1]
+
+    task = session.query(_CONTEXT_QUERY.format(entity_id)).one()
+    custom_attributes = task['parent']['custom_attributes']
+    context = {
+        'task_id': task['id'],
+        'shot_id': task['parent_id'],
+        'frame_start': custom_attributes.get('fstart', '1.0'),
+        'frame_end': custom_attributes.get('fend', '100.0'),
+        'snapshot_path': '',
+    }
+
+    # The snapshot spares the client a round of queries at startup, Unity
+    # still launches without it
+    try:
+        from ftrack_connect_unity import context_snapshot
+        context['snapshot_path'] = context_snapshot.write(
+            context_snapshot.build(task))
+    except Exception as error:
+        logger.warning('Could not write the context snapshot: {0}'.format(error))
+
+    _context_cache[entity_id] = (time.time(), context)
+    return context
+
+
 def on_discover_unity_engine_integration(session, event):
 
     from ftrack_connect_unity import __version__ as integration_version
@@ -43,11 +98,12 @@ def on_launch_unity_engine_integration(session, event):
     selection = event['data'].get('context', {}).get('selection', [])
     
     if selection:
-        task = session.get('Context', selection[0]['entityId'])
-        unity_base_data['integration']['env']['FTRACK_TASKID.set'] =  task['id']
-        unity_base_data['integration']['env']['FTRACK_SHOTID.set'] =  task['parent']['id']
-        unity_base_data['integration']['env']['FS.set'] = task['parent']['custom_attributes'].get('fstart', '1.0')
-        unity_base_data['integration']['env']['FE.set'] = task['parent']['custom_attributes'].get('fend', '100.0')
+        context = _resolve_launch_context(session, selection[0]['entityId'])
+        unity_base_data['integration']['env']['FTRACK_TASKID.set'] =  context['task_id']
+        unity_base_data['integration']['env']['FTRACK_SHOTID.set'] =  context['shot_id']
+        unity_base_data['integration']['env']['FS.set'] = context['frame_start']
+        unity_base_data['integration']['env']['FE.set'] = context['frame_end']
+        unity_base_data['integration']['env']['FTRACK_UNITY_CONTEXT_SNAPSHOT.set'] = context['snapshot_path']
 
     return unity_base_data
 
@@ -0,0 +1,291 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Import many asset versions into the project opened in the Unity editor,
+without the ftrack dialogs (farm jobs, project onboarding).
+
+The script connects to the Unity editor like the ftrack client does, so it
+must run with the same environment (PYTHONPATH and ftrack credentials as set
+by the launch hook):
+
+    python ftrack_batch_import.py <asset version id> [<asset version id> ...]
+    python ftrack_batch_import.py --components --ids-file component_ids.txt
+
+Components are resolved with a handful of queries, their files checked
+concurrently and all the imports sent to Unity without waiting for each
+other. Unity still imports them one at a time: they are not grouped into a
+single batched import, as Unity does not read the ftrack metadata of an
+asset imported inside StartAssetEditing. The time spent in each phase is
+printed at the end.
+"""
+
+import argparse
+import collections
+import logging
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+import ftrack_api.exception
+import ftrack_client
+import unity_python.client.unity_client as unity_client
+
+from connector import unity_assets
+from connector.import_paths import resolve_import_paths
+from connector.version_status import batched, format_ids
+from ftrack_connector_legacy.connector import FTAssetHandlerInstance
+from ftrack_connect_unity.session import get_shared_session
+
+logger = logging.getLogger('ftrack_connect_unity_engine.batch_import')
+
+_COMPONENT_QUERY = (
+    'select id, name, version.id, version.version, version.asset.name, '
+    'version.asset.type.short '
+    'from Component where {0} in ({1})'
+)
+
+
+class ImportObject(object):
+    '''The attributes of FTAssetObject the asset types read, for one component'''
+    def __init__(self, component, file_path):
+        version = component['version']
+        self.componentId = component['id']
+        self.componentName = component['name']
+        self.filePath = file_path
+        self.assetVersionId = version['id']
+        self.assetVersion = version['version']
+        self.assetName = version['asset']['name']
+        self.assetType = version['asset']['type']['short']
+        self.options = {}
+
+
+class PhaseTimer(object):
+    '''Record the time spent in named phases'''
+    def __init__(self):
+        self.phases = []
+
+    def __call__(self, name):
+        timer = self
+
+        class Phase(object):
+            def __enter__(self):
+                self.start = time.time()
+
+            def __exit__(self, *exc_info):
+                timer.phases.append((name, time.time() - self.start))
+
+        return Phase()
+
+    def report(self, stream=None):
+        stream = stream or sys.stdout
+        for name, seconds in self.phases:
+            stream.write('{0:<12} {1:>10.3f}s\n'.format(name, seconds))
+        stream.write('{0:<12} {1:>10.3f}s\n'.format(
+            'total', sum(seconds for _, seconds in self.phases)))
+
+
+def default_import_options(asset_class):
+    '''
+    Return the default values of the import options of *asset_class*, as
+    the import dialog would submit them untouched
+    '''
+    options = {}
+    xml = asset_class.importOptions()
+    if not xml.strip():
+        return options
+
+    for option in ElementTree.fromstring(xml).iter('option'):
+        if option.get('type') == 'checkbox':
+            options[option.get('name')] = option.get('value') == 'True'
+        elif option.get('type') == 'combo':
+            items = option.findall('optionitem')
+            if items:
+                options[option.get('name')] = items[0].get('name')
+        else:
+            options[option.get('name')] = option.get('value')
+    return options
+
+
+def _filesystem_paths(location, components):
+    '''
+    Return the file system paths of *components* in *location*, None for
+    the components whose path cannot be resolved
+    '''
+    try:
+        return location.get_filesystem_paths(components)
+    except ftrack_api.exception.Error:
+        # Resolve them one by one to find the culprits
+        pass
+
+    paths = []
+    for component in components:
+        try:
+            paths.append(location.get_filesystem_path(component))
+        except ftrack_api.exception.Error as error:
+            logger.error('Cannot resolve the path of component {0}: {1}'.format(
+                component['id'], error))
+            paths.append(None)
+    return paths
+
+
+def resolve_components(ids, by_component, component_name=None):
+    '''
+    Return the components of *ids* (component ids if *by_component*, else
+    asset version ids) and their file system paths, as a list of
+    (component, path) tuples. Components missing from every location are
+    reported and left out.
+    '''
+    session = get_shared_session()
+    attribute = 'id' if by_component else 'version_id'
+
+    components = []
+    for batch in batched(ids):
+        query = _COMPONENT_QUERY.format(attribute, format_ids(batch))
+        if component_name:
+            query += ' and name is "{0}"'.format(component_name)
+        components.extend(session.query(query))
+
+    if not components:
+        return []
+
+    # The best location of each component, in one query
+    by_location = collections.OrderedDict()
+    for component, location in zip(components, session.pick_locations(components)):
+        if location is None:
+            logger.error('Component {0} is not in any accessible location'.format(
+                component['id']))
+            continue
+        by_location.setdefault(location['id'], (location, []))[1].append(component)
+
+    paths = {}
+    for location, location_components in by_location.values():
+        for component, path in zip(
+                location_components, _filesystem_paths(location, location_components)):
+            if path:
+                paths[component['id']] = path
+
+    return [
+        (component, paths[component['id']])
+        for component in components if component['id'] in paths
+    ]
+
+
+def connect():
+    '''Connect to the Unity editor the way the ftrack client does'''
+    ftrack_client._service = ftrack_client.ftrackClientService()
+    ftrack_client._connection = unity_client.connect(ftrack_client._service)
+    ftrack_client.invalidate_handles()
+    return ftrack_client._connection
+
+
+def resolve_dst_directory(dst_directory, data_path):
+    '''
+    Return the absolute path of *dst_directory*, relative to the Unity
+    project of the Assets folder *data_path*. Raise ValueError when it is
+    not in the Assets folder.
+    '''
+    data_path = os.path.normpath(data_path)
+    directory = os.path.normpath(
+        os.path.join(os.path.dirname(data_path), dst_directory))
+    if directory != data_path and not directory.startswith(data_path + os.sep):
+        raise ValueError('{0} is not in the Assets folder of the Unity project {1}'.format(
+            dst_directory, os.path.dirname(data_path)))
+    return directory
+
+
+def run(ids, by_component=False, component_name=None, dst_directory=None):
+    '''
+    Import the components of *ids* into the Unity project, in
+    *dst_directory* (relative to the project, or absolute) if given. Return
+    the PhaseTimer of the run and the number of imports sent to Unity.
+    '''
+    timer = PhaseTimer()
+
+    with timer('connect'):
+        connection = connect()
+        unity_assets.registerAssetTypes()
+        asset_handler = FTAssetHandlerInstance.instance()
+        data_path = ftrack_client.GetDataPath()
+        if dst_directory:
+            dst_directory = resolve_dst_directory(dst_directory, data_path)
+
+    with timer('resolve'):
+        resolved = resolve_components(ids, by_component, component_name)
+        objects = [ImportObject(component, path) for component, path in resolved]
+        if dst_directory:
+            directories = dict((iAObj.assetVersionId, dst_directory) for iAObj in objects)
+        else:
+            directories = resolve_import_paths(
+                set(iAObj.assetVersionId for iAObj in objects), data_path)
+
+    with timer('stage'):
+        errors = unity_assets.check_ftrack_assets(objects)
+        imports = []
+        for iAObj, error_string in zip(objects, errors):
+            asset_class = asset_handler.getAssetClass(iAObj.assetType)
+            if not error_string and not asset_class:
+                error_string = 'Asset Type "{}" not supported by the Unity connector'.format(iAObj.assetType)
+            if error_string:
+                logger.error(error_string)
+                continue
+
+            iAObj.options = default_import_options(asset_class)
+            directory = os.path.abspath(directories[iAObj.assetVersionId])
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            imports.append((asset_class, iAObj, directory))
+
+    with timer('import'):
+        for asset_class, iAObj, directory in imports:
+            asset_class._import_ftrack_component(iAObj, directory, iAObj.options)
+
+    # The imports are asynchronous, wait for Unity to be done with them
+    with timer('unity'):
+        connection.ping(timeout=None)
+        connection.close()
+
+    return timer, len(imports)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        'ids', nargs='*',
+        help='Ids of the asset versions (or components) to import')
+    parser.add_argument(
+        '--ids-file',
+        help='File with one id per line, in addition to the ids given')
+    parser.add_argument(
+        '--components', action='store_true',
+        help='The ids are component ids instead of asset version ids')
+    parser.add_argument(
+        '--component-name',
+        help='Only import the asset version components with this name')
+    parser.add_argument(
+        '--dst',
+        help='Import everything into this directory of the Unity project '
+             '(e.g. Assets/ftrack/onboarding) instead of one directory per task')
+    parser.add_argument('--verbose', action='store_true')
+    namespace = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.DEBUG if namespace.verbose else logging.INFO)
+
+    ids = list(namespace.ids)
+    if namespace.ids_file:
+        with open(namespace.ids_file) as ids_file:
+            ids.extend(line.strip() for line in ids_file if line.strip())
+    if not ids:
+        parser.error('No ids to import')
+
+    timer, count = run(
+        ids, namespace.components, namespace.component_name, namespace.dst)
+
+    sys.stdout.write('Imported {0} components for {1} ids\n'.format(count, len(ids)))
+    timer.report()
+
+
+if __name__ == '__main__':
+    main()
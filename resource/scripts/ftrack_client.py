@@ -11,6 +11,9 @@ from connector.unity_connector import Connector
 import ftrack
 from ui import unity_menus
 from ftrack_connect_unity.usage import send_event
+from ftrack_connect_unity import context_data
+from ftrack_connect_unity import context_snapshot
+from ftrack_connect_unity import unity_console
 
 # Unity
 import unity_python.client.unity_client as unity_client
@@ -22,11 +25,11 @@ from QtExt import QtGui
 # Misc
 import logging
 import os
-from rpyc import async_
 from rpyc.core.protocol import PingError
 import rpyc.core.consts as consts
 import socket
 import sys
+import threading
 import time
 import traceback
 
@@ -37,31 +40,68 @@ _dialogs = []
 _publish_dialog = None
 _qapp  = None
 _service = None
+_unity_console = None
 
 logger = logging.getLogger('ftrack_connect_unity_engine')
+unity_console_logger = logging.getLogger(unity_console.LOGGER_NAME)
 
 """
 C# API access
 
-It is better to fetch the module each time we access it in case there was
-a domain reload (the previous module would not be valid anymore)
+Remote modules and types are not valid anymore after a domain reload, so
+they cannot be kept around forever. Resolving them costs round trips to the
+server though, so we cache the handles and drop the cache whenever the
+server shuts down (domain reload) or we reconnect.
 """
+_handles = {}
+
+def _get_handle(key, resolve):
+    try:
+        return _handles[key]
+    except KeyError:
+        handle = resolve()
+        _handles[key] = handle
+        return handle
+
+def invalidate_handles():
+    """
+    Forget the cached remote handles. Must be called whenever the connection
+    to the server changes
+    """
+    if _handles:
+        logger.debug('Invalidating {} cached Unity handles'.format(len(_handles)))
+    _handles.clear()
+
 def GetUnityEngine():
-    return _service.UnityEngine
+    return _get_handle('UnityEngine', lambda: _service.UnityEngine)
 def GetUnityEditor():
-    return _service.UnityEditor
+    return _get_handle('UnityEditor', lambda: _service.UnityEditor)
+def GetUnityEditorMember(path):
+    """
+    Return the UnityEditor type or static member at the dotted *path*,
+    e.g. 'AssetDatabase.GUIDToAssetPath'
+    """
+    def resolve():
+        member = GetUnityEditor()
+        for name in path.split('.'):
+            member = getattr(member, name)
+        return member
+    return _get_handle('UnityEditor.' + path, resolve)
+def GetDataPath():
+    """
+    Return Application.dataPath, the Assets folder of the Unity project
+    """
+    return _get_handle(
+        'Application.dataPath', lambda: GetUnityEngine().Application.dataPath)
 class GetSystem(object):
     @staticmethod
     def IO():
-        return _service.import_module('System.IO')
+        return _get_handle('System.IO', lambda: _service.import_module('System.IO'))
 
-# Logs an error in the Unity console. 
+# Logs an error in the Unity console. Messages are batched and forwarded
+# from the main loop, see unity_console
 def log_error_in_unity(msg):
-    # The following call is blocking (prone to 30-second lag issue)
-    log_error = async_(GetUnityEngine().Debug.LogError)
-
-    # The following is non-blocking
-    log_error(msg)
+    unity_console_logger.error(msg)
 
 
 class ftrackClientService(unity_client.UnityClientService):
@@ -72,6 +112,10 @@ class ftrackClientService(unity_client.UnityClientService):
         return "ftrack-connect-unity"
 
     def exposed_on_server_shutdown(self, invite_retry):
+        # Whether this is a domain reload or Unity quitting, the remote
+        # handles we hold are about to become invalid
+        invalidate_handles()
+
         if invite_retry:
             global _connection
             if _connection:
@@ -133,7 +177,7 @@ class ftrackClientService(unity_client.UnityClientService):
                 logger.error(error_string)
                 
                 # Also log in the console
-                GetUnityEngine().Debug.LogError(error_string)
+                log_error_in_unity(error_string)
                 
             if ftrack_dialog:
                 ftrack_dialog.show()
@@ -152,12 +196,14 @@ def _sync_recorder_values():
     frame_start = os.environ.get('FS')
     frame_end = os.environ.get('FE')
     
-    try:
-        shot_id = os.getenv('FTRACK_SHOTID')
-        shot = ftrack.Shot(id = shot_id)
-        fps = shot.get('fps')
-    except Exception:
-        fps = 24
+    fps = context_snapshot.get('fps')
+    if fps is None:
+        try:
+            shot_id = os.getenv('FTRACK_SHOTID')
+            shot = ftrack.Shot(id = shot_id)
+            fps = shot.get('fps')
+        except Exception:
+            fps = 24
     
     logger.debug('Setting Unity Recorder values:'
         '\nFrame start: {0}\nFrame end: {1}\nFPS: {2}'.format(frame_start, frame_end, fps)
@@ -184,11 +230,50 @@ def _initialize_ftrack():
     # with the context (if relevant)
     _sync_recorder_values()
 
+    # Have the publish dialog data ready by the time it is opened
+    _prewarm_publish_dialog()
+
+    # Follow the ftrack assets of the project from the file system events
+    # (Linux, FTRACK_UNITY_WATCH_ASSETS=1)
+    try:
+        _connector.watchAssets()
+    except Exception as e:
+        logger.warning('Could not watch the project assets: {}'.format(e))
+
     # Track usage
     send_event(
         'USED-FTRACK-CONNECT-UNITY-ENGINE'
     )
 
+def _prewarm_publish_dialog():
+    """
+    Fetch the current entity, its statuses and its assets, and the asset
+    types, in the background so the first Publish dialog opens with them
+    already loaded. Set FTRACK_UNITY_PREWARM_PUBLISH to 0 to disable.
+    """
+    if os.environ.get('FTRACK_UNITY_PREWARM_PUBLISH', '1').lower() in ('0', 'false', 'no'):
+        return
+
+    context_data.prefetch_asset_type_names()
+
+    from ftrack_connect_unity.ui.export_asset_options_widget import (
+        ExportAssetOptionsWidget, TASK_OBJECT_TYPE_ID)
+    asset_types = ExportAssetOptionsWidget.publishAssetTypes()
+
+    def prewarm():
+        try:
+            entity = _connector.getCurrentEntity()
+            context_data.prefetch_publish_context(
+                entity.getId(),
+                entity.get('object_typeid') == TASK_OBJECT_TYPE_ID,
+                asset_types)
+        except Exception as e:
+            logger.warning('Could not prewarm the publish dialog: {}'.format(e))
+
+    thread = threading.Thread(target=prewarm)
+    thread.daemon = True
+    thread.start()
+
 
 def _connect_to_unity():
     global _connection
@@ -206,6 +291,7 @@ def _connect_to_unity():
             sys.exit('Unity has quit or the server closed unexpectedly')
         else:
             logger.info('Connected')
+            invalidate_handles()
             break
 
     if not _connection:
@@ -252,12 +338,17 @@ def main():
     # Connect to Unity
     _connect_to_unity()
 
+    # Forward the messages meant for the Unity console
+    global _unity_console
+    _unity_console = unity_console.install(lambda: GetUnityEngine().Debug)
+
     # Initialize ftrack
     _initialize_ftrack()
 
     while (True):
         _qapp.processEvents()
         scheduling.process_jobs()
+        _unity_console.flush()
 
         ping_server()
         
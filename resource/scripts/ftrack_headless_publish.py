@@ -0,0 +1,188 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Publish Unity Recorder output to ftrack without the publish dialog, e.g.
+from render nodes. Several shots are published in parallel processes.
+
+Run with the environment of the ftrack client (PYTHONPATH and ftrack
+credentials as set by the launch hook). A single shot:
+
+    python ftrack_headless_publish.py --task <task id> --asset-name render
+        --image-path /renders/sh010/frame_<Frame> --image-ext png
+        --frame-start 1001 --frame-end 1100 --status "Pending review"
+
+or many, from a JSON file holding a list of jobs with the same keys
+(task_id, asset_name, image_path, image_ext, frame_start, frame_end and
+optionally movie_path, movie_ext, status, comment); the command line values
+are used for the keys a job leaves out:
+
+    python ftrack_headless_publish.py --jobs jobs.json --processes 8
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import ftrack
+
+from connector import unity_assets
+from connector.unity_connector import Connector
+from ftrack_connect_unity.publish import publish_asset, PublishError
+
+logger = logging.getLogger('ftrack_connect_unity_engine.headless_publish')
+
+JOB_KEYS = (
+    'task_id', 'asset_name', 'image_path', 'image_ext', 'frame_start',
+    'frame_end', 'movie_path', 'movie_ext', 'status', 'comment'
+)
+
+
+def _initialize_worker():
+    ftrack.setup()
+    unity_assets.registerAssetTypes()
+
+
+def publish_job(job):
+    '''
+    Publish the image sequence (and movie, if any) of *job* as an "img"
+    asset. Return a result dictionary with the *job*, the publish *seconds*,
+    the number of *frames* and either the *message* or the *error*.
+    '''
+    start = time.time()
+    result = {
+        'job': job,
+        'frames': 0,
+        'message': None,
+        'error': None
+    }
+
+    publish_args = {
+        'success': True,
+        'image_path': job['image_path'],
+        'image_ext': job['image_ext'],
+        'movie_path': job.get('movie_path'),
+        'movie_ext': job.get('movie_ext'),
+    }
+    options = {
+        'publishReviewable': bool(job.get('movie_path')),
+        'publishPackage': False
+    }
+
+    try:
+        # Frames may be given as floats ("1001.0"), as the recorder does
+        frame_start = int(float(job['frame_start']))
+        frame_end = int(float(job['frame_end']))
+        result['frames'] = frame_end - frame_start + 1
+
+        # ImageSequenceAsset.publishAsset takes the frame range from there
+        os.environ['FS'] = str(frame_start)
+        os.environ['FE'] = str(frame_end)
+
+        task = ftrack.Task(job['task_id'])
+        result['message'] = publish_asset(
+            Connector(), publish_args, job['task_id'], task.getParent(),
+            job['asset_name'], 'img', status=job.get('status'),
+            comment=job.get('comment') or '', options=options)
+    except PublishError as error:
+        result['error'] = error.message
+    except Exception as error:
+        logger.exception('Could not publish {0}'.format(job['task_id']))
+        result['error'] = str(error)
+
+    result['seconds'] = time.time() - start
+    return result
+
+
+def publish_jobs(jobs, processes):
+    '''
+    Publish *jobs* with *processes* worker processes. Return the results of
+    publish_job as they complete and the total wall time.
+    '''
+    start = time.time()
+    pool = multiprocessing.Pool(
+        min(processes, len(jobs)), initializer=_initialize_worker)
+    try:
+        results = []
+        for result in pool.imap_unordered(publish_job, jobs):
+            logger.info('{0} {1} in {2:.1f}s'.format(
+                result['job']['task_id'],
+                'failed: {0}'.format(result['error']) if result['error'] else 'published',
+                result['seconds']))
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results, time.time() - start
+
+
+def report(results, seconds, stream=None):
+    '''Print the throughput of a publish_jobs run'''
+    stream = stream or sys.stdout
+    published = [result for result in results if not result['error']]
+    frames = sum(result['frames'] for result in published)
+
+    stream.write('Published {0} of {1} shots in {2:.1f}s\n'.format(
+        len(published), len(results), seconds))
+    if published and seconds:
+        stream.write('{0:.2f} shots/min, {1:.1f} frames/s, {2:.1f}s per shot\n'.format(
+            60.0 * len(published) / seconds,
+            frames / seconds,
+            sum(result['seconds'] for result in published) / len(published)))
+    for result in results:
+        if result['error']:
+            stream.write('FAILED {0}: {1}\n'.format(
+                result['job']['task_id'], result['error']))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', help='JSON file with the list of jobs')
+    parser.add_argument('--task', dest='task_id', help='Task to publish from')
+    parser.add_argument('--asset-name')
+    parser.add_argument(
+        '--image-path', help='Recorder output path, with <Frame> for the frame number')
+    parser.add_argument('--image-ext')
+    parser.add_argument('--frame-start', type=int)
+    parser.add_argument('--frame-end', type=int)
+    parser.add_argument('--movie-path', help='Reviewable movie path, without extension')
+    parser.add_argument('--movie-ext')
+    parser.add_argument('--status', help='Status name to set on the task')
+    parser.add_argument('--comment', default='')
+    parser.add_argument(
+        '--processes', type=int, default=multiprocessing.cpu_count(),
+        help='Number of shots published in parallel')
+    parser.add_argument('--verbose', action='store_true')
+    namespace = parser.parse_args(arguments)
+
+    logging.basicConfig(
+        level=logging.DEBUG if namespace.verbose else logging.INFO)
+
+    defaults = dict((key, getattr(namespace, key)) for key in JOB_KEYS)
+    if namespace.jobs:
+        with open(namespace.jobs) as jobs_file:
+            jobs = []
+            for job in json.load(jobs_file):
+                jobs.append(dict(defaults))
+                jobs[-1].update(job)
+    else:
+        jobs = [defaults]
+
+    required = ('task_id', 'asset_name', 'image_path', 'image_ext', 'frame_start', 'frame_end')
+    for job in jobs:
+        missing = [key for key in required if job.get(key) in (None, '')]
+        if missing:
+            parser.error('Missing {0} for job {1}'.format(', '.join(missing), job))
+
+    results, seconds = publish_jobs(jobs, max(1, namespace.processes))
+    report(results, seconds)
+    return 0 if all(not result['error'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Manifest of the ftrack assets of a Unity project, built from the .meta
+files on disk rather than by asking the editor about every asset.
+
+The connector stores the ftrack metadata in the importer userData, which
+Unity writes to the asset .meta file. Scanning walks the Assets folder,
+reads the .meta files whose modification time changed since the previous
+scan (with a process pool when there are many) and persists the result in
+the project Library folder, so a warm start only stats the files.
+"""
+
+import errno
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+from ftrack_connect_unity import unity_meta
+
+_logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of the manifest changes
+MANIFEST_VERSION = 1
+
+# Below this many .meta files to read, a process pool costs more than it saves
+PROCESS_POOL_MIN_FILES = 500
+
+MAX_PROCESSES = 8
+
+# .meta files sent to a worker process at once
+PROCESS_CHUNK_SIZE = 64
+
+
+def read_meta_file(path):
+    '''
+    Return the (path, mtime, guid, ftrack metadata) of the .meta file at
+    *path*, or (path, None, None, None) when it cannot be read
+    '''
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, 'rb') as meta_file:
+            guid, metadata = unity_meta.read_meta(meta_file.read().decode('utf-8', 'replace'))
+    except (IOError, OSError):
+        return path, None, None, None
+    return path, mtime, guid, metadata
+
+
+def _read_meta_files(paths):
+    '''Yield the read_meta_file results of *paths*, in any order'''
+    if len(paths) < PROCESS_POOL_MIN_FILES or multiprocessing.cpu_count() < 2:
+        for path in paths:
+            yield read_meta_file(path)
+        return
+
+    try:
+        pool = multiprocessing.Pool(min(MAX_PROCESSES, multiprocessing.cpu_count()))
+    except (OSError, ImportError, NotImplementedError) as error:
+        _logger.debug('Reading .meta files in process: {0}'.format(error))
+        for path in paths:
+            yield read_meta_file(path)
+        return
+
+    try:
+        for result in pool.imap_unordered(
+                read_meta_file, paths, chunksize=PROCESS_CHUNK_SIZE):
+            yield result
+    finally:
+        pool.terminate()
+
+
+class AssetManifest(object):
+    '''
+    The ftrack assets of the project whose Assets folder is *data_path*,
+    persisted to *manifest_path*
+    '''
+    def __init__(self, data_path, manifest_path):
+        self.data_path = os.path.normpath(data_path)
+        self.manifest_path = manifest_path
+        # .meta path relative to the project -> [mtime, guid, metadata]
+        self._files = None
+        self._lock = threading.RLock()
+
+    # Persistence -------------------------------------------------------------
+
+    def _load(self):
+        self._files = {}
+        try:
+            with open(self.manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, OSError, ValueError):
+            return
+        if (manifest.get('version') == MANIFEST_VERSION and
+                manifest.get('data_path') == self.data_path):
+            self._files = manifest['files']
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(self.manifest_path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.manifest_path + '.tmp', 'w') as manifest_file:
+                json.dump({
+                    'version': MANIFEST_VERSION,
+                    'data_path': self.data_path,
+                    'files': self._files
+                }, manifest_file)
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            os.rename(self.manifest_path + '.tmp', self.manifest_path)
+        except (IOError, OSError) as error:
+            _logger.warning('Could not save the asset manifest: {0}'.format(error))
+
+    # Scanning ----------------------------------------------------------------
+
+    def _relative_path(self, meta_path):
+        '''Return the "Assets/..." path of the .meta file at *meta_path*'''
+        relative_path = os.path.relpath(meta_path, os.path.dirname(self.data_path))
+        return '/'.join(relative_path.split(os.sep))
+
+    def _walk(self):
+        '''Return a dictionary of "Assets/....meta" path -> mtime'''
+        # os.walk yields nothing for a missing folder, which would look like
+        # a project without assets
+        if not os.path.isdir(self.data_path) or not os.access(self.data_path, os.R_OK):
+            raise IOError(
+                errno.ENOENT, 'Cannot read the Assets folder', self.data_path)
+
+        mtimes = {}
+        for directory, directories, files in os.walk(self.data_path):
+            # Unity ignores hidden folders and folders ending with ~
+            directories[:] = [
+                name for name in directories
+                if not name.startswith('.') and not name.endswith('~')
+            ]
+            for name in files:
+                if not name.endswith('.meta'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    mtimes[self._relative_path(path)] = os.path.getmtime(path)
+                except OSError:
+                    # Removed while walking
+                    continue
+        return mtimes
+
+    def _read(self, relative_paths):
+        '''Read the .meta files at *relative_paths* into the manifest'''
+        project_path = os.path.dirname(self.data_path)
+        paths = [
+            os.path.join(project_path, *relative_path.split('/'))
+            for relative_path in relative_paths
+        ]
+        for path, mtime, guid, metadata in _read_meta_files(paths):
+            relative_path = self._relative_path(path)
+            if mtime is None:
+                self._files.pop(relative_path, None)
+            else:
+                self._files[relative_path] = [mtime, guid, metadata]
+
+    def scan(self):
+        '''
+        Bring the manifest up to date with the project and return its
+        assets (see assets). Raise IOError when the Assets folder cannot be
+        read.
+        '''
+        with self._lock:
+            if self._files is None:
+                self._load()
+
+            mtimes = self._walk()
+            removed = [path for path in self._files if path not in mtimes]
+            for path in removed:
+                del self._files[path]
+            changed = [
+                path for path, mtime in mtimes.items()
+                if path not in self._files or self._files[path][0] != mtime
+            ]
+            if changed:
+                self._read(changed)
+            if changed or removed:
+                self._save()
+
+            _logger.debug('Scanned {0} .meta files, {1} read, {2} removed'.format(
+                len(mtimes), len(changed), len(removed)))
+            return self.assets()
+
+    def update(self, meta_paths):
+        '''
+        Read again the .meta files at *meta_paths* (absolute paths, removed
+        files included) and return the assets they hold, as a dictionary of
+        guid -> (asset path, metadata) (metadata is None for assets that are
+        not, or no longer, ftrack assets), and the guids of the removed files
+        '''
+        with self._lock:
+            if self._files is None:
+                self._load()
+
+            relative_paths = [self._relative_path(path) for path in meta_paths]
+            previous_guids = dict(
+                (path, self._files[path][1]) for path in relative_paths
+                if path in self._files)
+            self._read(relative_paths)
+            self._save()
+
+            assets = {}
+            removed = []
+            for relative_path in relative_paths:
+                if relative_path in self._files:
+                    _, guid, metadata = self._files[relative_path]
+                    assets[guid] = (relative_path[:-len('.meta')], metadata)
+                elif previous_guids.get(relative_path):
+                    removed.append(previous_guids[relative_path])
+            return assets, removed
+
+    def assets(self):
+        '''
+        Return the ftrack assets of the manifest as a dictionary of guid ->
+        (asset path, metadata)
+        '''
+        with self._lock:
+            return dict(
+                (guid, (path[:-len('.meta')], metadata))
+                for path, (_, guid, metadata) in (self._files or {}).items()
+                if metadata and guid
+            )
@@ -0,0 +1,60 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Substring search over the ftrack assets of the project, by asset name, type
+and path.
+
+The index follows the asset state through its generations (see
+AssetState.changes_since), so only the assets changed since the previous
+search get indexed again.
+"""
+
+import threading
+
+from ftrack_connect_unity.search_index import TrigramIndex
+
+
+def asset_texts(entry):
+    '''Return the searchable texts of the AssetEntry *entry*'''
+    metadata = entry.metadata or {}
+    return [metadata.get('assetName'), metadata.get('assetType'), entry.path]
+
+
+class AssetSearchIndex(object):
+    '''Trigram index of the AssetEntry of a state, keyed by guid'''
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._index = TrigramIndex()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _sync(self, state):
+        changes = state.changes_since(self._generation)
+        if changes['reset']:
+            self._index.clear()
+
+        for _, guid in changes['added'] + changes['modified']:
+            entry = state.get(guid)
+            if entry is not None:
+                self._index.add(guid, asset_texts(entry))
+        for guid in changes['removed']:
+            self._index.remove(guid)
+
+        self._generation = changes['generation']
+
+    def search(self, state, text, case_sensitive=False):
+        '''
+        Return the guids of the entries of *state* (an AssetState) whose
+        name, type or path contains *text*
+        '''
+        with self._lock:
+            self._sync(state)
+            return self._index.search(text, case_sensitive)
@@ -0,0 +1,260 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+The connector's view of the ftrack assets living in the Unity project.
+
+Every change to the view bumps a generation counter and is recorded against
+it, so callers holding a generation can ask for what changed since then
+instead of rebuilding the whole list. Operations the connector starts
+itself (imports, version changes, removals) mark the assets they touch as
+dirty so only those get re-read from Unity.
+"""
+
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Number of removals remembered. Asking for changes older than the oldest
+# remembered removal requires a reset
+MAX_TOMBSTONES = 10000
+
+# Seconds an import is waited for before its pending path is forgotten, e.g.
+# when Unity failed to import it
+PENDING_PATH_TIMEOUT = 10 * 60
+
+
+class AssetEntry(object):
+    '''An ftrack asset in the Unity project'''
+    def __init__(self, guid, path, metadata, generation):
+        self.guid = guid
+        self.path = path
+        self.metadata = metadata
+        self.added_generation = generation
+        self.modified_generation = generation
+
+    @property
+    def component_id(self):
+        return self.metadata.get('componentId')
+
+    @property
+    def asset_version_id(self):
+        return self.metadata.get('assetVersionId')
+
+    def as_tuple(self):
+        '''Return the (componentId, guid) tuple the Asset Manager expects'''
+        return (self.component_id, self.guid)
+
+
+class AssetState(object):
+    '''
+    Generation counted set of AssetEntry, keyed by Unity asset guid
+    '''
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        '''Return the state shared by the connector and the asset types'''
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.generation = 0
+        self._entries = {}
+        # guid -> (removed generation, added generation)
+        self._tombstones = {}
+        self._oldest_generation = 0
+        self._dirty_guids = set()
+        # asset path -> (componentId expected once Unity has imported it,
+        # time the import was started)
+        self._pending_paths = {}
+        self._scanned = False
+        self._lock = threading.RLock()
+
+    # Queries -----------------------------------------------------------------
+
+    @property
+    def needs_full_scan(self):
+        return not self._scanned
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def get(self, guid):
+        return self._entries.get(guid)
+
+    def find(self, predicate):
+        '''Return the first entry for which *predicate* is true'''
+        with self._lock:
+            for entry in self._entries.values():
+                if predicate(entry):
+                    return entry
+        return None
+
+    def changes_since(self, generation=None):
+        '''
+        Return the changes since *generation* as a dictionary with the current
+        *generation*, lists of (componentId, guid) tuples for *added* and
+        *modified* assets and a list of guids for *removed* ones. When
+        *generation* is None or too old to be answered, *reset* is True and
+        *added* holds every asset.
+        '''
+        with self._lock:
+            reset = (
+                generation is None or
+                generation < self._oldest_generation or
+                generation > self.generation
+            )
+            if reset:
+                return {
+                    'generation': self.generation,
+                    'reset': True,
+                    'added': [entry.as_tuple() for entry in self._entries.values()],
+                    'modified': [],
+                    'removed': []
+                }
+
+            added = []
+            modified = []
+            for entry in self._entries.values():
+                if entry.added_generation > generation:
+                    added.append(entry.as_tuple())
+                elif entry.modified_generation > generation:
+                    modified.append(entry.as_tuple())
+
+            removed = [
+                guid for guid, (removed_generation, added_generation)
+                in self._tombstones.items()
+                if removed_generation > generation and added_generation <= generation
+            ]
+
+            return {
+                'generation': self.generation,
+                'reset': False,
+                'added': added,
+                'modified': modified,
+                'removed': removed
+            }
+
+    # Dirty tracking ----------------------------------------------------------
+
+    def mark_dirty(self, guid):
+        '''The asset with *guid* changed and must be read again'''
+        with self._lock:
+            self._dirty_guids.add(guid)
+
+    def mark_pending_path(self, asset_path, component_id):
+        '''
+        The component *component_id* is being imported at *asset_path*
+        ("Assets/..."); its guid is unknown until Unity finishes importing it
+        '''
+        with self._lock:
+            self._pending_paths[asset_path] = (component_id, time.time())
+
+    def mark_full_scan_required(self):
+        '''Changes happened that cannot be tracked individually'''
+        with self._lock:
+            self._scanned = False
+
+    def take_dirty(self):
+        '''
+        Return and forget the dirty guids, and return a dictionary of the
+        pending paths to their componentId (see resolve_pending_path).
+        Pending paths older than PENDING_PATH_TIMEOUT are forgotten.
+        '''
+        expiry = time.time() - PENDING_PATH_TIMEOUT
+        with self._lock:
+            dirty_guids = self._dirty_guids
+            self._dirty_guids = set()
+
+            pending_paths = {}
+            for asset_path, (component_id, started) in list(self._pending_paths.items()):
+                if started < expiry:
+                    _logger.debug('Gave up waiting for the import of {0}'.format(asset_path))
+                    del self._pending_paths[asset_path]
+                else:
+                    pending_paths[asset_path] = component_id
+            return dirty_guids, pending_paths
+
+    def resolve_pending_path(self, asset_path):
+        '''The import at *asset_path* has landed in the project'''
+        with self._lock:
+            self._pending_paths.pop(asset_path, None)
+
+    # Updates -----------------------------------------------------------------
+
+    def update(self, assets):
+        '''
+        Add or update *assets*, a dictionary of guid -> (path, metadata).
+        Return the number of changed assets.
+        '''
+        with self._lock:
+            generation = self.generation + 1
+            changed = 0
+            for guid, (path, metadata) in assets.items():
+                entry = self._entries.get(guid)
+                if entry is None:
+                    self._entries[guid] = AssetEntry(guid, path, metadata, generation)
+                    self._tombstones.pop(guid, None)
+                    changed += 1
+                elif entry.path != path or entry.metadata != metadata:
+                    entry.path = path
+                    entry.metadata = metadata
+                    entry.modified_generation = generation
+                    changed += 1
+
+            if changed:
+                self.generation = generation
+            return changed
+
+    def remove(self, guids):
+        '''Remove the assets with *guids*. Return the number removed.'''
+        with self._lock:
+            generation = self.generation + 1
+            removed = 0
+            for guid in guids:
+                entry = self._entries.pop(guid, None)
+                if entry is not None:
+                    self._tombstones[guid] = (generation, entry.added_generation)
+                    removed += 1
+
+            if removed:
+                self.generation = generation
+                self._compact()
+            return removed
+
+    def replace(self, assets):
+        '''
+        Replace the whole state with the result of a full scan (see update
+        for *assets*). Only the differences bump the generation.
+        '''
+        with self._lock:
+            self.remove([guid for guid in self._entries if guid not in assets])
+            self.update(assets)
+            self._scanned = True
+            self._dirty_guids.clear()
+
+            # Imports still in flight stay pending
+            for path, metadata in assets.values():
+                pending = self._pending_paths.get(path)
+                if pending and pending[0] == metadata.get('componentId'):
+                    del self._pending_paths[path]
+
+    def _compact(self):
+        if len(self._tombstones) <= MAX_TOMBSTONES:
+            return
+
+        oldest = sorted(
+            self._tombstones.items(), key=lambda item: item[1][0]
+        )[:len(self._tombstones) - MAX_TOMBSTONES]
+        for guid, (removed_generation, _) in oldest:
+            del self._tombstones[guid]
+            self._oldest_generation = max(self._oldest_generation, removed_generation)
+
+        _logger.debug(
+            'Forgot {0} removals, changes before generation {1} need a reset'.format(
+                len(oldest), self._oldest_generation))
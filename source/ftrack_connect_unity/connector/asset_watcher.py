@@ -0,0 +1,279 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Live view of the ftrack assets of the project on Linux.
+
+A background thread watches the Assets folder with inotify and, when .meta
+files change, reads them again into the asset manifest and applies the
+differences to the asset state, so the Asset Manager never needs to scan
+the project once the state is populated. Events are coalesced: the changed
+files are only read once they have been quiet for DEBOUNCE_INTERVAL, which
+turns the thousands of events of a large import into a single update.
+
+Set the FTRACK_UNITY_WATCH_ASSETS environment variable to 1 to enable it.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+ENVIRONMENT_VARIABLE = 'FTRACK_UNITY_WATCH_ASSETS'
+
+# Seconds without events before the changed files are read
+DEBOUNCE_INTERVAL = 0.5
+
+# Seconds after the first event by which the changed files are read, even
+# if events keep coming
+MAX_DELAY = 5.0
+
+# Seconds between checks for the watcher being stopped
+POLL_INTERVAL = 1.0
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+    IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+_watcher = None
+
+
+class Inotify(object):
+    '''Minimal inotify binding, through ctypes'''
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path, mask):
+        '''Watch the directory at *path*, return the watch descriptor'''
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding() or 'utf-8')
+        wd = self._add_watch(self.fd, path, mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def read_events(self):
+        '''Return the pending (watch descriptor, mask, name) events'''
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, name.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class AssetWatcher(threading.Thread):
+    '''
+    Keep *state* (an AssetState) in sync with the .meta files of the
+    Assets folder of *manifest* (an AssetManifest)
+    '''
+    def __init__(self, manifest, state):
+        super(AssetWatcher, self).__init__(name='ftrack asset watcher')
+        self.daemon = True
+        self.manifest = manifest
+        self.state = state
+        self._inotify = Inotify()
+        # watch descriptor -> directory
+        self._directories = {}
+        self._changed_paths = set()
+        self._first_event_time = None
+        self._last_event_time = None
+        self._stopped = threading.Event()
+
+        self._watch_tree(manifest.data_path)
+
+    def _watch_tree(self, root):
+        '''Watch *root* and its sub folders, return the .meta files found'''
+        meta_paths = []
+        for directory, directories, files in os.walk(root):
+            # Unity ignores hidden folders and folders ending with ~
+            directories[:] = [
+                name for name in directories
+                if not name.startswith('.') and not name.endswith('~')
+            ]
+            try:
+                wd = self._inotify.add_watch(directory, WATCH_MASK)
+            except OSError as error:
+                if error.errno == errno.ENOSPC:
+                    raise OSError(error.errno, 'Too many folders to watch, see '
+                                  '/proc/sys/fs/inotify/max_user_watches')
+                # Removed while walking
+                continue
+            self._directories[wd] = directory
+            meta_paths.extend(
+                os.path.join(directory, name) for name in files if name.endswith('.meta'))
+        return meta_paths
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                readable, _, _ = select.select(
+                    [self._inotify.fd], [], [], self._timeout())
+                if readable:
+                    self._handle_events(self._inotify.read_events())
+                if self._is_due():
+                    self._flush()
+        except Exception:
+            _logger.exception('The asset watcher stopped, falling back to scans')
+            self.state.mark_full_scan_required()
+        finally:
+            self._inotify.close()
+            global _watcher
+            if _watcher is self:
+                _watcher = None
+
+    def _timeout(self):
+        if self._last_event_time is None:
+            return POLL_INTERVAL
+        now = time.time()
+        return max(0, min(
+            self._last_event_time + DEBOUNCE_INTERVAL,
+            self._first_event_time + MAX_DELAY) - now)
+
+    def _is_due(self):
+        if self._last_event_time is None:
+            return False
+        now = time.time()
+        return (now - self._last_event_time >= DEBOUNCE_INTERVAL or
+                now - self._first_event_time >= MAX_DELAY)
+
+    def _handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                _logger.debug('inotify queue overflow, the project will be scanned')
+                self.state.mark_full_scan_required()
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    if not name.startswith('.') and not name.endswith('~'):
+                        self._add_changed(self._watch_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    # The .meta files below are gone, let the next query rescan
+                    self.state.mark_full_scan_required()
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if directory == self.manifest.data_path:
+                    self.state.mark_full_scan_required()
+            elif name.endswith('.meta'):
+                self._add_changed([path])
+
+    def _add_changed(self, paths):
+        if not paths:
+            return
+        self._changed_paths.update(paths)
+        self._last_event_time = time.time()
+        if self._first_event_time is None:
+            self._first_event_time = self._last_event_time
+
+    def _flush(self):
+        paths = list(self._changed_paths)
+        self._changed_paths.clear()
+        self._first_event_time = self._last_event_time = None
+
+        assets, removed = self.manifest.update(paths)
+        ftrack_assets = {}
+        for guid, (asset_path, metadata) in assets.items():
+            if metadata:
+                ftrack_assets[guid] = (asset_path, metadata)
+                self.state.resolve_pending_path(asset_path)
+            elif self.state.get(guid):
+                # No longer an ftrack asset
+                removed.append(guid)
+
+        removed_count = self.state.remove(removed)
+        changed_count = self.state.update(ftrack_assets)
+        _logger.debug('{0} .meta files changed: {1} ftrack assets updated, {2} removed'.format(
+            len(paths), changed_count, removed_count))
+
+
+def is_enabled():
+    return (
+        sys.platform.startswith('linux') and
+        os.environ.get(ENVIRONMENT_VARIABLE, '0').lower() in ('1', 'true', 'yes')
+    )
+
+
+def is_running():
+    '''Return whether a watcher keeps the asset state up to date'''
+    return _watcher is not None and _watcher.is_alive()
+
+
+def start(manifest, state):
+    '''
+    Start watching the project of *manifest* (an AssetManifest) to keep
+    *state* (an AssetState) up to date, if enabled. Return the watcher, or
+    None.
+    '''
+    global _watcher
+    if not is_enabled() or is_running():
+        return _watcher
+
+    try:
+        _watcher = AssetWatcher(manifest, state)
+    except (OSError, AttributeError) as error:
+        # AttributeError: no inotify in this libc
+        _logger.warning('Cannot watch the project assets: {0}'.format(error))
+        return None
+
+    _watcher.start()
+    return _watcher
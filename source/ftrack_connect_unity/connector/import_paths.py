@@ -0,0 +1,94 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Bulk resolution of where asset versions get imported in the Unity project:
+Assets/ftrack/<link of the version task, without the project>.
+"""
+
+import logging
+import threading
+
+from ftrack_connect_unity.session import get_shared_session
+from .version_status import batched, format_ids
+
+_logger = logging.getLogger(__name__)
+
+_TASK_LINK_QUERY = 'select id, task.link from AssetVersion where id in ({0})'
+
+
+def import_path(data_path, task_link):
+    '''
+    Return the directory under *data_path* (the Unity project Assets
+    folder) where the assets of the task with *task_link* get imported
+    '''
+    relative_path = ''.join(
+        '{0}/'.format(link['name'].replace(' ', '_')) for link in task_link[1:])
+    return '{0}/ftrack/{1}'.format(data_path, relative_path)
+
+
+class TaskLinkCache(object):
+    '''
+    Link of the task of asset versions, keyed by asset version id. Links
+    are fetched with one projection query for all the missing versions.
+    '''
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._links = {}
+        self._lock = threading.Lock()
+
+    def get(self, asset_version_ids):
+        '''
+        Return a dictionary of asset version id -> task link (a list of
+        dictionaries with the *id*, *name* and *type* of the task ancestors,
+        project first) for *asset_version_ids*. Versions without a task get
+        an empty link, unknown versions are left out.
+        '''
+        with self._lock:
+            missing = set(
+                version_id for version_id in asset_version_ids
+                if version_id and version_id not in self._links
+            )
+            if missing:
+                self._links.update(self._fetch(missing))
+
+            return dict(
+                (version_id, self._links[version_id])
+                for version_id in asset_version_ids
+                if version_id in self._links
+            )
+
+    def invalidate(self):
+        with self._lock:
+            self._links.clear()
+
+    def _fetch(self, asset_version_ids):
+        session = get_shared_session()
+        links = {}
+        for batch in batched(asset_version_ids):
+            for asset_version in session.query(_TASK_LINK_QUERY.format(format_ids(batch))):
+                task = asset_version['task']
+                links[asset_version['id']] = list(task['link']) if task else []
+
+        _logger.debug('Fetched the task link of {0} asset versions'.format(len(links)))
+        return links
+
+
+def resolve_import_paths(asset_version_ids, data_path):
+    '''
+    Return a dictionary of asset version id -> import_path for
+    *asset_version_ids*, with a single query for the versions never
+    resolved before
+    '''
+    links = TaskLinkCache.instance().get(asset_version_ids)
+    return dict(
+        (version_id, import_path(data_path, link))
+        for version_id, link in links.items()
+    )
@@ -3,23 +3,51 @@
 
 # ftrack
 import ftrack
-import ftrack_api
-from ftrack_client import GetUnityEngine, GetUnityEditor, GetSystem, log_error_in_unity
 import ftrack_connect_unity
+from ftrack_connect_unity import (asset_manifest, fbx_header, package_inspector,
+                                  package_store, unity_meta)
 from ftrack_connector_legacy.connector import (FTAssetType, FTAssetHandlerInstance,
                                       FTComponent)
+from . import asset_state, import_paths
 
 # misc
+import hashlib
 import json
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 from rpyc import async_
 import shutil
+import tempfile
 
 
 SUPPORTED_PACKAGES = ['.unitypackage', '.unitypack']
 SUPPORTED_EXTENSIONS = ['.abc', '.fbx']
 
+# Number of threads validating files concurrently. Component files usually
+# live on network storage where each check is a round trip
+MAX_WORKERS = 8
+
+
+def _ftrack_client():
+    """
+    We import ftrack_client on first use: it pulls in unity_python and Qt,
+    which the scripts publishing without Unity do not have (see
+    ftrack_headless_publish.py)
+    """
+    import ftrack_client
+    return ftrack_client
+def GetUnityEngine():
+    return _ftrack_client().GetUnityEngine()
+def GetUnityEditor():
+    return _ftrack_client().GetUnityEditor()
+def GetUnityEditorMember(path):
+    return _ftrack_client().GetUnityEditorMember(path)
+def GetDataPath():
+    return _ftrack_client().GetDataPath()
+def log_error_in_unity(msg):
+    _ftrack_client().log_error_in_unity(msg)
+
 class GenericAsset(FTAssetType):
     def __init__(self):
         super(GenericAsset, self).__init__()
@@ -61,7 +89,7 @@ class GenericAsset(FTAssetType):
 
             return False
         
-        asset_full_path = GetSystem.IO().Path.GetFullPath(asset_path)
+        asset_full_path = _ftrack_client().GetSystem.IO().Path.GetFullPath(asset_path)
         if not asset_full_path:
             error_string = 'Cannot determine the full path for {}'.format(asset_path)
             self.logger.error(error_string)
@@ -75,6 +103,9 @@ class GenericAsset(FTAssetType):
         # Import, without considering settings (preserve settings as they 
         # currently are)
         self._import_ftrack_component(iAObj, dst_directory, None)
+
+        # The previous version gets replaced
+        asset_state.AssetState.instance().mark_dirty(applicationObject)
         return True
 
     def publishAsset(self, publish_args, iAObj=None):
@@ -118,22 +149,12 @@ class GenericAsset(FTAssetType):
         return xml
 
     def _get_asset_import_path(self, iAObj):
-        ftrack_asset_version = ftrack.AssetVersion(iAObj.assetVersionId)
-        task = ftrack_asset_version.getTask()
-        task_links = ftrack_api.Session().query(
-            'select link from Task where id is "{0}"'.format(task.getId())
-        ).first()['link']
-        
-        relative_path = ""
-        # remove the project
-        task_links.pop(0)
-        for link in task_links:
-            relative_path += link['name'].replace(' ', '_')
-            relative_path += '/'
-        
-        return "{0}/ftrack/{1}".format(
-            GetUnityEngine().Application.dataPath, relative_path)
-    
+        import_path = import_paths.resolve_import_paths(
+            [iAObj.assetVersionId], GetDataPath()).get(iAObj.assetVersionId)
+        if import_path is None:
+            raise ValueError('Cannot find asset version {}'.format(iAObj.assetVersionId))
+        return import_path
+
     def _select_directory(self):
         """
         Displays a system dialog for the user to pick a destination folder
@@ -172,25 +193,13 @@ class GenericAsset(FTAssetType):
         return dst_directory
 
     def _validate_ftrack_asset(self, iAObj=None):
-        # Validate the file
-        if not os.path.exists(iAObj.filePath):
-            error_string = 'ftrack cannot import file "{}" because it does not exist'.format(iAObj.filePath)
+        error_string = check_ftrack_asset(iAObj)
+        if error_string:
             self.logger.error(error_string)
             
             # Also log to the Unity console
             log_error_in_unity(error_string)
             return False
-
-        (_, src_filename) = os.path.split(iAObj.filePath)
-        (_, src_extension) = os.path.splitext(src_filename)
-        if (src_extension.lower() not in SUPPORTED_EXTENSIONS and 
-            src_extension.lower() not in SUPPORTED_PACKAGES):
-            error_string = 'ftrack does not support importing files with extension "{}"'.format(src_extension)
-            self.logger.error(error_string)
-
-            # Also log to the Unity console
-            log_error_in_unity(error_string)
-            return False
         
         return True
 
@@ -200,7 +209,7 @@ class GenericAsset(FTAssetType):
         '''
         # Populate import options, if required
         if options:
-            self._populate_options(options)
+            self._populate_options(options, iAObj)
 
         (_, extension) = os.path.splitext(iAObj.filePath)
         extension = extension.lower()
@@ -209,6 +218,10 @@ class GenericAsset(FTAssetType):
             self._import_unity_asset_component(iAObj, dst_directory, options)
         elif extension in SUPPORTED_PACKAGES:
             self._import_unitypackage_component(iAObj, options)
+        elif package_store.is_recipe(iAObj.filePath):
+            package_path, checksum = self._materialize_package(iAObj.filePath)
+            self._import_unitypackage_component(
+                iAObj, options, package_path, checksum)
         else:
             raise ValueError('file type : {} is not supported'.format(extension))
     
@@ -246,17 +259,122 @@ class GenericAsset(FTAssetType):
             'options'      : options,
             'dst_directory': dst_directory
         }
-        import_asset = async_(GetUnityEditor().Ftrack.ConnectUnityEngine.ServerSideUtils.ImportAsset)
+        import_asset = async_(GetUnityEditorMember('Ftrack.ConnectUnityEngine.ServerSideUtils.ImportAsset'))
         import_asset(json.dumps(arguments))
 
-    def _import_unitypackage_component(self, iAObj, options):
-        import_package = async_(GetUnityEditor().AssetDatabase.ImportPackage)
-        import_package(iAObj.filePath, False)
+        # Let the delta feed pick the asset up once Unity has imported it
+        (_, src_filename) = os.path.split(iAObj.filePath)
+        asset_state.AssetState.instance().mark_pending_path(
+            self._get_unity_asset_path(os.path.join(dst_directory, src_filename)),
+            iAObj.componentId)
+
+    def _import_unitypackage_component(self, iAObj, options, package_path=None,
+                                       checksum=None):
+        package_path = original_path = package_path or iAObj.filePath
+        state = asset_state.AssetState.instance()
+        try:
+            contents = inspect_package(package_path, checksum)
+            package_path, entries = self._select_changed_assets(package_path, contents)
+        except Exception as error:
+            self.logger.warning('Could not read package {}: {}'.format(package_path, error))
+            entries = None
+
+        if entries == []:
+            self.logger.info('{} is already up to date in the project'.format(iAObj.filePath))
+            return
+
+        import_package = async_(GetUnityEditorMember('AssetDatabase.ImportPackage'))
+        result = import_package(package_path, False)
+
+        # Unity is done reading a reduced package once ImportPackage returns
+        if package_path != original_path:
+            result.add_callback(
+                lambda _: self._remove_reduced_package(package_path))
+
+        if entries is None:
+            # We do not know which assets the package holds
+            state.mark_full_scan_required()
+            return
+
+        # Only the ftrack assets of the package, and the assets it
+        # overwrites, need to be read again
+        for entry in entries:
+            if entry.ftrack_metadata or state.get(entry.guid):
+                state.mark_dirty(entry.guid)
+
+    def _select_changed_assets(self, package_path, contents):
+        '''
+        Return the path of a package holding only the assets of the package
+        at *package_path* (with *contents*) that are new or changed compared
+        to the project, and the entries of these assets
+        '''
+        project_path = os.path.dirname(os.path.normpath(GetDataPath()))
+        entries = package_inspector.changed_entries(contents, project_path)
+        if len(entries) == len(contents.entries) or not entries:
+            return package_path, entries
+
+        # A file per import, removed once Unity imported it (see
+        # _remove_reduced_package)
+        guids = sorted(entry.guid for entry in entries)
+        directory = os.path.join(get_library_path(), 'packages', contents.checksum)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        handle, selection_path = tempfile.mkstemp(
+            prefix='{}_'.format(hashlib.sha1(''.join(guids).encode('ascii')).hexdigest()),
+            suffix='.unitypackage', dir=directory)
+        os.close(handle)
+        try:
+            package_inspector.write_package(package_path, selection_path, guids)
+        except Exception:
+            self._remove_reduced_package(selection_path)
+            raise
+
+        self.logger.debug('Importing {} of the {} assets of {}'.format(
+            len(entries), len(contents.entries), package_path))
+        return selection_path, entries
+
+    def _remove_reduced_package(self, path):
+        '''
+        Delete the reduced package at *path* (see _select_changed_assets),
+        and its folder once empty
+        '''
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            # Already removed, or other packages remain in the folder
+            pass
+
+    def _materialize_package(self, recipe_path):
+        '''
+        Return the path and checksum of the package stored in chunks by the
+        recipe at *recipe_path*, assembled into the project Library folder
+        '''
+        return package_store.PackageStore.for_recipe(recipe_path).materialize(
+            recipe_path, os.path.join(get_library_path(), 'packages'))
+
+    def _get_unity_asset_path(self, full_path):
+        '''
+        Return the Unity asset path ("Assets/...") of the file at *full_path*
+        '''
+        data_path = os.path.normpath(GetDataPath())
+        relative_path = os.path.relpath(os.path.normpath(full_path), data_path)
+        return '/'.join(['Assets'] + relative_path.split(os.sep))
 
-    def _populate_options(self, options):
+    def _populate_options(self, options, iAObj):
         # Generic Assets do not modify the import options
         pass
 
+    def _scan_component(self, iAObj):
+        '''
+        Return the FbxInfo of the component file of *iAObj*, or None when it
+        is not an FBX file
+        '''
+        info = fbx_header.scan(iAObj.filePath)
+        if info:
+            self.logger.debug('{}: {}'.format(iAObj.filePath, info))
+        return info
+
 class GeoAsset(GenericAsset):
     @classmethod
     def importOptions(cls):
@@ -267,11 +385,19 @@ class GeoAsset(GenericAsset):
             </row>
         </tab>
         '''
-    def _populate_options(self, options):
+    def _populate_options(self, options, iAObj):
         # Force importing without animation. Users can always change this
         # directly in the ModelImporter Inspector panel
         options['unityImportAnim'] = False
 
+        info = self._scan_component(iAObj)
+        if not info:
+            return
+
+        # Unity would create placeholder materials
+        if not info.has_materials:
+            options['unityImportMaterials'] = False
+
 class AnimAsset(GenericAsset):
     @classmethod
     def importOptions(cls):
@@ -283,12 +409,16 @@ class AnimAsset(GenericAsset):
         </tab>
         '''
 
-    def _populate_options(self, options):
+    def _populate_options(self, options, iAObj):
         # Force importing without materials. Users can always change this
         # directly in the ModelImporter Inspector panel
         options['unityImportMaterials'] = False
         options['unityImportAnim'] = True
 
+        info = self._scan_component(iAObj)
+        if info and not info.has_animation:
+            self.logger.warning('{} holds no animation'.format(iAObj.filePath))
+
 class RigAsset(GenericAsset):
     @classmethod
     def importOptions(cls):
@@ -307,11 +437,16 @@ class RigAsset(GenericAsset):
             </row>
         </tab>
         '''
-    def _populate_options(self, options):
+    def _populate_options(self, options, iAObj):
         # Force importing without animation. Users can always change this
         # directly in the ModelImporter Inspector panel
         options['unityImportAnim'] = False
 
+        # Unity would create placeholder materials
+        info = self._scan_component(iAObj)
+        if info and not info.has_materials:
+            options['unityImportMaterials'] = False
+
 class ImageSequenceAsset(GenericAsset):
     @classmethod
     def exportOptions(cls):
@@ -385,7 +520,16 @@ class ImageSequenceAsset(GenericAsset):
         if publishPackage:
             package_filepath = publish_args['package_filepath']
             package_filepath = os.path.normpath(package_filepath)
-            
+
+            # Only transfer what the previous packages do not share
+            store = package_store.PackageStore.from_environment()
+            if store:
+                record = store.put(package_filepath)
+                self.logger.info('stored package {} in {} chunks, {} of {} bytes transferred'.format(
+                    package_filepath, len(record.chunks), record.transferred,
+                    os.path.getsize(package_filepath)))
+                package_filepath = store.recipe_path(record)
+
             self.logger.info('publishing package {} {}'.format('package', package_filepath))
 
             publishedComponents.append(
@@ -411,7 +555,7 @@ class ImageSequenceAsset(GenericAsset):
     
     def _get_asset_version_id(self, asset_path):
         # Get the importer for that asset
-        asset_importer = GetUnityEditor().AssetImporter.GetAtPath(asset_path)
+        asset_importer = GetUnityEditorMember('AssetImporter.GetAtPath')(asset_path)
         
         # Get the metadata
         try:
@@ -426,6 +570,144 @@ class ImageSequenceAsset(GenericAsset):
         
         return None
 
+def get_library_path():
+    '''Return the directory of the ftrack files in the project Library folder'''
+    project_path = os.path.dirname(os.path.normpath(GetDataPath()))
+    return os.path.join(project_path, 'Library', 'ftrack')
+
+_asset_manifest = None
+
+def get_asset_manifest():
+    '''Return the AssetManifest of the project, kept in the Library folder'''
+    global _asset_manifest
+    if _asset_manifest is None:
+        _asset_manifest = asset_manifest.AssetManifest(
+            GetDataPath(), os.path.join(get_library_path(), 'asset_manifest.json'))
+    return _asset_manifest
+
+_package_inspector = None
+
+def inspect_package(path, checksum=None):
+    '''
+    Return the PackageContents of the package at *path*, see
+    PackageInspector.inspect. The contents are cached in the project
+    Library folder.
+    '''
+    global _package_inspector
+    if _package_inspector is None:
+        _package_inspector = package_inspector.PackageInspector(
+            os.path.join(get_library_path(), 'package_contents'))
+    return _package_inspector.inspect(path, checksum)
+
+def check_ftrack_asset(iAObj):
+    '''
+    Return why the component file of *iAObj* cannot be imported, or None.
+    Only touches the file system, so it is safe to call from any thread.
+    '''
+    # Validate the file
+    if not os.path.exists(iAObj.filePath):
+        return 'ftrack cannot import file "{}" because it does not exist'.format(iAObj.filePath)
+
+    (_, src_filename) = os.path.split(iAObj.filePath)
+    (_, src_extension) = os.path.splitext(src_filename)
+    if (src_extension.lower() not in SUPPORTED_EXTENSIONS and 
+        src_extension.lower() not in SUPPORTED_PACKAGES and
+        not package_store.is_recipe(iAObj.filePath)):
+        return 'ftrack does not support importing files with extension "{}"'.format(src_extension)
+
+    return None
+
+def check_ftrack_assets(iAObjs):
+    '''
+    Run check_ftrack_asset on all of *iAObjs* concurrently and return the
+    results in the same order
+    '''
+    if len(iAObjs) < 2:
+        return [check_ftrack_asset(iAObj) for iAObj in iAObjs]
+
+    pool = ThreadPool(min(MAX_WORKERS, len(iAObjs)))
+    try:
+        return pool.map(check_ftrack_asset, iAObjs)
+    finally:
+        pool.close()
+
+def _is_asset_at(project_path, asset_path, guid):
+    '''
+    Return whether the asset *guid* is still at *asset_path* ("Assets/..."),
+    from its .meta file on disk
+    '''
+    meta_path = os.path.join(project_path, *asset_path.split('/')) + '.meta'
+    try:
+        with open(meta_path, 'rb') as meta_file:
+            meta = meta_file.read().decode('utf-8', 'replace')
+    except (IOError, OSError):
+        return False
+    return unity_meta.read_meta(meta)[0] == guid
+
+def changeVersions(items):
+    '''
+    Change the version of many assets at once. *items* is a list of
+    (applicationObject, iAObj) tuples, the arguments of one
+    GenericAsset.changeVersion call each.
+
+    The asset paths come from the connector asset state, checked against the
+    .meta files on disk, the component files are validated concurrently and
+    all the imports are sent to Unity without waiting for each other.
+
+    Return a dictionary of applicationObject -> whether its import was sent.
+    '''
+    logger = logging.getLogger(__name__ + '.changeVersions')
+    asset_handler = FTAssetHandlerInstance.instance()
+    state = asset_state.AssetState.instance()
+    results = dict((applicationObject, False) for applicationObject, _ in items)
+
+    # Resolve the asset paths. The state knows every ftrack asset the
+    # connector has seen, but the asset may have moved since; ask Unity for
+    # the assets whose .meta file is no longer there
+    project_path = os.path.dirname(os.path.normpath(GetDataPath()))
+    asset_paths = {}
+    for applicationObject, _ in items:
+        entry = state.get(applicationObject)
+        if entry and _is_asset_at(project_path, entry.path, applicationObject):
+            asset_paths[applicationObject] = entry.path
+        else:
+            asset_paths[applicationObject] = GetUnityEditorMember(
+                'AssetDatabase.GUIDToAssetPath')(applicationObject)
+
+    errors = check_ftrack_assets([iAObj for _, iAObj in items])
+
+    imports = []
+    for (applicationObject, iAObj), error_string in zip(items, errors):
+        change_asset = asset_handler.getAssetClass(iAObj.assetType)
+        asset_path = asset_paths.get(applicationObject)
+        if not error_string and not change_asset:
+            error_string = 'Asset Type "{}" not supported by the Unity connector'.format(iAObj.assetType)
+        if not error_string and not asset_path:
+            error_string = 'Cannot find a related asset path in the Asset Database'
+
+        if error_string:
+            logger.error(error_string)
+
+            # Also log to the Unity console
+            log_error_in_unity(error_string)
+            continue
+
+        asset_full_path = os.path.normpath(os.path.join(project_path, asset_path))
+        imports.append((change_asset, applicationObject, iAObj, os.path.dirname(asset_full_path)))
+
+    # Not within AssetDatabase.StartAssetEditing: Unity defers the imports
+    # until StopAssetEditing, and ServerSideUtils.ImportAsset needs the
+    # importer of the copied file to store the ftrack metadata and options
+    for change_asset, applicationObject, iAObj, dst_directory in imports:
+        # Import, without considering settings (preserve settings as they
+        # currently are)
+        change_asset._import_ftrack_component(iAObj, dst_directory, None)
+        state.mark_dirty(applicationObject)
+        results[applicationObject] = True
+
+    logger.debug('Sent {0} of {1} version changes to Unity'.format(len(imports), len(items)))
+    return results
+
 def registerAssetTypes():
     assetHandler = FTAssetHandlerInstance.instance()
     assetHandler.registerAssetType(name='anim', cls=AnimAsset)
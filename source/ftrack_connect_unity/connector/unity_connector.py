@@ -8,6 +8,11 @@ import ftrack_api
 import ftrack_connector_legacy.config
 from ftrack_connector_legacy.connector import base as maincon
 from ftrack_connector_legacy.connector import FTAssetHandlerInstance
+from ftrack_connect_unity import context_snapshot
+from . import asset_search
+from . import asset_state
+from . import asset_watcher
+from . import version_status
 
 # misc
 import json
@@ -36,6 +41,16 @@ def GetUnityEngine():
     """
     from ftrack_client import GetUnityEngine as ftGetUnityEngine
     return ftGetUnityEngine()
+def GetUnityEditorMember(path):
+    """
+    We import ftrack_client here to avoid a circular dependency between
+    ftrack_client and unity_connector
+    """
+    from ftrack_client import GetUnityEditorMember as ftGetUnityEditorMember
+    return ftGetUnityEditorMember(path)
+
+# (task id, shot id) -> entity, see Connector.getCurrentEntity
+_current_entities = {}
 
 class Connector(maincon.Connector):
     def __init__(self):
@@ -43,9 +58,16 @@ class Connector(maincon.Connector):
 
     @staticmethod
     def getCurrentEntity():
-        return ftrack.Task(
-               os.getenv('FTRACK_TASKID'),
-               os.getenv('FTRACK_SHOTID'))
+        '''
+        Return the task (or shot) Unity was launched from. The entity is
+        fetched once per context.
+        '''
+        key = (os.getenv('FTRACK_TASKID'), os.getenv('FTRACK_SHOTID'))
+        entity = _current_entities.get(key)
+        if entity is None:
+            entity = ftrack.Task(*key)
+            _current_entities[key] = entity
+        return entity
 
     @staticmethod
     def isTaskPartOfShotOrSequence(currentTask):
@@ -53,6 +75,11 @@ class Connector(maincon.Connector):
         Return whether the given task is part of a shot
         or sequence.
         '''
+        fromSnapshot = context_snapshot.is_part_of_shot_or_sequence(
+            currentTask.getId())
+        if fromSnapshot is not None:
+            return fromSnapshot
+
         session = ftrack_api.Session()
         linksForTask = session.query(
             'select link from Task where id is "' +
@@ -108,15 +135,110 @@ class Connector(maincon.Connector):
         '''
         Return the available assets in the project, return the *componentId(s)*
         '''
-        ftrack_assets = [ ]
+        state = asset_state.AssetState.instance()
+        if asset_watcher.is_running() and not state.needs_full_scan:
+            # The state follows the project already
+            Connector._refresh_dirty_assets(state)
+            return [entry.as_tuple() for entry in state.entries()]
 
-        unity_asset_guids = GetUnityEditor().AssetDatabase.FindAssets('t:model', None)
-        for guid in unity_asset_guids:
-            ftrack_asset = Connector._ftrack_asset_from_guid(guid) 
-            if ftrack_asset:
-                ftrack_assets.append(ftrack_asset)
+        scanned_assets = Connector._scan_assets()
+
+        # Keep the delta feed in sync with what we just saw
+        state.replace(scanned_assets)
+
+        return [
+            (ftrack_metadata.get('componentId'), guid)
+            for guid, (_, ftrack_metadata) in scanned_assets.items()
+        ]
+
+    @staticmethod
+    def watchAssets():
+        '''
+        Keep the ftrack assets of the project up to date from the file system
+        events, if enabled (see asset_watcher). Return whether they are.
+        '''
+        import unity_assets
+        asset_watcher.start(
+            unity_assets.get_asset_manifest(), asset_state.AssetState.instance())
+        return asset_watcher.is_running()
+
+    @staticmethod
+    def getPackageContents(filePath, checksum=None):
+        '''
+        Return the assets of the .unitypackage at *filePath*, without
+        importing it, as a list of (guid, pathname, size) tuples. The package
+        is read once per *checksum* (computed when not given).
+        '''
+        import unity_assets
+        contents = unity_assets.inspect_package(filePath, checksum)
+        return [
+            (entry.guid, entry.pathname, entry.size)
+            for entry in contents.entries if not entry.is_folder
+        ]
+
+    @staticmethod
+    def getAssetChanges(generation=None):
+        '''
+        Return what changed in the project ftrack assets since *generation*,
+        a value previously returned by this method. The result is a dictionary
+        with the current *generation*, *added* and *modified* lists of
+        (componentId, guid) tuples and a *removed* list of guids. When
+        *generation* is None or too old, *reset* is True and *added* holds
+        all the assets.
+
+        When the project assets are watched (see watchAssets), only the
+        assets the connector touched since the last call are read from Unity.
+        Otherwise the project is scanned, which only reads the .meta files
+        changed since the previous scan (see AssetManifest), so the assets
+        deleted, moved or re-imported in the editor are reported too.
+        '''
+        state = asset_state.AssetState.instance()
+        if state.needs_full_scan or not asset_watcher.is_running():
+            Connector.getAssets()
+        else:
+            Connector._refresh_dirty_assets(state)
+
+        return state.changes_since(generation)
+
+    @staticmethod
+    def searchAssets(text, caseSensitive=False):
+        '''
+        Return the ftrack assets of the project whose name, type or path
+        contains *text*, as a list of (componentId, guid) tuples. The
+        assets are indexed once and then only re-indexed when they change.
+        '''
+        Connector.getAssetChanges()
+
+        state = asset_state.AssetState.instance()
+        guids = asset_search.AssetSearchIndex.instance().search(
+            state, text, caseSensitive)
+        entries = [state.get(guid) for guid in guids]
+        return [entry.as_tuple() for entry in entries if entry is not None]
+
+    @staticmethod
+    def getVersionStatus(componentIds=None):
+        '''
+        Return the version status of the imported *componentIds* (by default
+        every ftrack asset in the project) as a dictionary of
+        componentId -> status. Statuses are resolved in bulk and cached until
+        invalidateVersionStatus is called, see VersionStatusCache.get.
+        '''
+        if componentIds is None:
+            Connector.getAssetChanges()
+            componentIds = [
+                entry.component_id
+                for entry in asset_state.AssetState.instance().entries()
+            ]
+
+        return version_status.VersionStatusCache.instance().get(componentIds)
 
-        return ftrack_assets
+    @staticmethod
+    def invalidateVersionStatus(componentIds=None):
+        '''
+        Forget the cached version status of *componentIds*, or of all the
+        components when None (e.g. after publishing new versions)
+        '''
+        version_status.VersionStatusCache.instance().invalidate(componentIds)
 
     @staticmethod
     def changeVersion(applicationObject=None, iAObj=None):
@@ -132,33 +254,32 @@ class Connector(maincon.Connector):
             Logger.warning('Asset Type "{}" not supported by the Unity connector'.format(iAObj.assetType))
             return False
 
+    @staticmethod
+    def changeVersions(items):
+        '''
+        Change the version of many assets at once. *items* is a list of
+        (applicationObject, iAObj) tuples as given to changeVersion. The
+        imports are sent to Unity without waiting for each other.
+
+        Return a dictionary of applicationObject -> success
+        '''
+        import unity_assets
+        return unity_assets.changeVersions(items)
+
     @staticmethod
     def getAsset(assetName, assetType, taskid):
-        unity_asset_guids = GetUnityEditor().AssetDatabase.FindAssets('t:model', None)
-        for guid in unity_asset_guids:
-            # Get the asset path
-            asset_path = GetUnityEditor().AssetDatabase.GUIDToAssetPath(guid)
-
-            # Get the importer for that asset
-            asset_importer = GetUnityEditor().AssetImporter.GetAtPath(asset_path)
-
-            # Get the metadata
-            try:
-                json_data = json.loads(asset_importer.userData)
-            except:
-                # Invalid or no user data.
-                continue
-
-            # Make sure this is metadata is for ftrack by looking for this key
-            if json_data.get('ftrack_connect_unity_version'):
-                if json_data.get('assetName') == assetName and \
-                   json_data.get('assetType') == assetType:
-                    # We use the guid as the name (will be passed back as the
-                    # applicationObject when changeVersion gets called
-                    asset_version_id = json_data.get('assetVersionId')
-                    asset_version = ftrack.AssetVersion(asset_version_id)
-                    if asset_version.getTask().getId() == taskid:
-                        return asset_version
+        scanned_assets = Connector._scan_assets()
+        asset_state.AssetState.instance().replace(scanned_assets)
+
+        for guid, (_, json_data) in scanned_assets.items():
+            if json_data.get('assetName') == assetName and \
+               json_data.get('assetType') == assetType:
+                # We use the guid as the name (will be passed back as the
+                # applicationObject when changeVersion gets called
+                asset_version_id = json_data.get('assetVersionId')
+                asset_version = ftrack.AssetVersion(asset_version_id)
+                if asset_version.getTask().getId() == taskid:
+                    return asset_version
 
         return None
 
@@ -176,10 +297,13 @@ class Connector(maincon.Connector):
         
         # Then look at selected game objects in case they relate to ftrack 
         # assets
+        get_prefab_asset_path = GetUnityEditorMember(
+            'PrefabUtility.GetPrefabAssetPathOfNearestInstanceRoot')
+        asset_path_to_guid = GetUnityEditorMember('AssetDatabase.AssetPathToGUID')
         for game_object in GetUnityEditor().Selection.gameObjects:
-            asset_path = GetUnityEditor().PrefabUtility.GetPrefabAssetPathOfNearestInstanceRoot(game_object)
+            asset_path = get_prefab_asset_path(game_object)
             if asset_path:
-                guid = GetUnityEditor().AssetDatabase.AssetPathToGUID(asset_path)
+                guid = asset_path_to_guid(asset_path)
                 if guid:
                     guids.add(guid)
 
@@ -201,7 +325,7 @@ class Connector(maincon.Connector):
             return
 
         # Select the assets
-        select_objs = async_(GetUnityEditor().Ftrack.ConnectUnityEngine.ServerSideUtils.SelectObjectsWithGuids)
+        select_objs = async_(GetUnityEditorMember('Ftrack.ConnectUnityEngine.ServerSideUtils.SelectObjectsWithGuids'))
         select_objs(guids)
 
     @staticmethod
@@ -226,22 +350,95 @@ class Connector(maincon.Connector):
         delete_asset = async_(GetUnityEditor().AssetDatabase.DeleteAsset)
         delete_asset(asset_path)
 
+        # The deletion is asynchronous, reading the asset back right away
+        # could still find it
+        asset_state.AssetState.instance().remove([applicationObject])
+
     @staticmethod
     def getConnectorName():
         '''Return the connector name'''
         return 'unity'
         
+    @staticmethod
+    def _scan_assets():
+        '''
+        Return the ftrack assets of the project as a dictionary of guid ->
+        (Unity asset path, ftrack metadata dictionary), from the .meta files
+        on disk (see AssetManifest), or from Unity when they cannot be read
+        '''
+        import unity_assets
+        try:
+            return unity_assets.get_asset_manifest().scan()
+        except Exception as error:
+            _logger.warning('Could not scan the project .meta files: {0}'.format(error))
+
+        scanned_assets = {}
+        unity_asset_guids = GetUnityEditorMember('AssetDatabase.FindAssets')('t:model', None)
+        for guid in unity_asset_guids:
+            ftrack_metadata = Connector._ftrack_metadata_from_guid(guid)
+            if ftrack_metadata:
+                scanned_assets[guid] = ftrack_metadata
+        return scanned_assets
+
     @staticmethod
     def _ftrack_asset_from_guid(guid):
         '''
         Helper method to go from one Unity asset guid to a tuple of 
         (ftrack componentId, Unity asset guid)
         '''
+        ftrack_metadata = Connector._ftrack_metadata_from_guid(guid)
+        if ftrack_metadata:
+            # We use the guid as the name (will be passed back as the 
+            # applicationObject when changeVersion gets called
+            return ( (ftrack_metadata[1].get('componentId'), guid) )
+
+        return None
+
+    @staticmethod
+    def _refresh_dirty_assets(state):
+        '''
+        Read back from Unity the assets *state* flagged as dirty or pending
+        '''
+        dirty_guids, pending_paths = state.take_dirty()
+
+        if pending_paths:
+            asset_path_to_guid = GetUnityEditorMember('AssetDatabase.AssetPathToGUID')
+            for asset_path, component_id in pending_paths.items():
+                guid = asset_path_to_guid(asset_path)
+                if not guid:
+                    # Not imported yet
+                    continue
+
+                ftrack_metadata = Connector._ftrack_metadata_from_guid(guid)
+                if ftrack_metadata and ftrack_metadata[1].get('componentId') == component_id:
+                    state.resolve_pending_path(asset_path)
+                    state.update({guid: ftrack_metadata})
+                    dirty_guids.discard(guid)
+
+        updated_assets = {}
+        removed_guids = []
+        for guid in dirty_guids:
+            ftrack_metadata = Connector._ftrack_metadata_from_guid(guid)
+            if ftrack_metadata:
+                updated_assets[guid] = ftrack_metadata
+            else:
+                removed_guids.append(guid)
+
+        state.remove(removed_guids)
+        state.update(updated_assets)
+
+    @staticmethod
+    def _ftrack_metadata_from_guid(guid):
+        '''
+        Helper method to go from one Unity asset guid to a tuple of 
+        (Unity asset path, ftrack metadata dictionary), or None if the asset
+        does not come from ftrack
+        '''
         # Get the asset path
-        asset_path = GetUnityEditor().AssetDatabase.GUIDToAssetPath(guid)
+        asset_path = GetUnityEditorMember('AssetDatabase.GUIDToAssetPath')(guid)
         
         # Get the importer for that asset
-        asset_importer = GetUnityEditor().AssetImporter.GetAtPath(asset_path)
+        asset_importer = GetUnityEditorMember('AssetImporter.GetAtPath')(asset_path)
         
         # Get the metadata
         try:
@@ -252,8 +449,6 @@ class Connector(maincon.Connector):
         
         # Make sure this is metadata is for ftrack by looking for this key
         if json_data.get('ftrack_connect_unity_version'):
-            # We use the guid as the name (will be passed back as the 
-            # applicationObject when changeVersion gets called
-            return ( (json_data.get('componentId'), guid) )
+            return (asset_path, json_data)
             
         return None
@@ -0,0 +1,112 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Bulk resolution of the version status of imported components: which asset
+and version each component belongs to and what the latest version of that
+asset is.
+"""
+
+import logging
+import threading
+
+from ftrack_connect_unity.session import get_shared_session
+
+_logger = logging.getLogger(__name__)
+
+# Number of component ids sent in a single query
+QUERY_BATCH_SIZE = 1000
+
+_STATUS_QUERY = (
+    'select id, version.id, version.version, version.asset.id, '
+    'version.asset.name, version.asset.latest_version.id, '
+    'version.asset.latest_version.version '
+    'from Component where id in ({0})'
+)
+
+
+def batched(values, size=QUERY_BATCH_SIZE):
+    '''Yield successive lists of at most *size* items of *values*'''
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def format_ids(ids):
+    '''Return *ids* formatted for an "in (...)" query expression'''
+    return ', '.join('"{0}"'.format(id_) for id_ in ids)
+
+
+class VersionStatusCache(object):
+    '''
+    Version status of components, keyed by component id. Statuses are
+    fetched with one projection query for all the missing components and
+    kept until invalidated.
+    '''
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def get(self, component_ids):
+        '''
+        Return a dictionary of component id -> status for *component_ids*.
+        A status is a dictionary with the *assetId*, *assetName*,
+        *assetVersionId*, *version*, *latestVersionId*, *latestVersion* and
+        whether the component is *outdated*. Unknown components are left out.
+        '''
+        component_ids = [component_id for component_id in component_ids if component_id]
+
+        with self._lock:
+            missing = set(
+                component_id for component_id in component_ids
+                if component_id not in self._statuses
+            )
+            if missing:
+                self._statuses.update(self._fetch(missing))
+
+            return dict(
+                (component_id, self._statuses[component_id])
+                for component_id in component_ids
+                if self._statuses.get(component_id)
+            )
+
+    def invalidate(self, component_ids=None):
+        '''Forget the statuses of *component_ids*, or all of them'''
+        with self._lock:
+            if component_ids is None:
+                self._statuses.clear()
+            else:
+                for component_id in component_ids:
+                    self._statuses.pop(component_id, None)
+
+    def _fetch(self, component_ids):
+        session = get_shared_session()
+        # Remember the components the server does not know about too, so
+        # they do not get queried again
+        statuses = dict((component_id, None) for component_id in component_ids)
+
+        for batch in batched(component_ids):
+            for component in session.query(_STATUS_QUERY.format(format_ids(batch))):
+                version = component['version']
+                asset = version['asset']
+                latest_version = asset['latest_version'] or version
+                statuses[component['id']] = {
+                    'assetId': asset['id'],
+                    'assetName': asset['name'],
+                    'assetVersionId': version['id'],
+                    'version': version['version'],
+                    'latestVersionId': latest_version['id'],
+                    'latestVersion': latest_version['version'],
+                    'outdated': latest_version['version'] > version['version']
+                }
+
+        _logger.debug('Fetched the version status of {0} components'.format(len(component_ids)))
+        return statuses
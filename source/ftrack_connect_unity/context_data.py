@@ -0,0 +1,295 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Data the publish widgets display for a context (task statuses and existing
+assets), fetched with ftrack_api projection queries so each context costs a
+fixed number of requests. Nothing here touches Qt, so it can run on any
+thread.
+
+Background fetches all run on a single worker thread: sessions are per
+thread and creating one costs several requests, so they share the session of
+that thread.
+"""
+
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from ftrack_connect_unity.session import get_shared_session
+
+_logger = logging.getLogger(__name__)
+
+_TASK_STATUSES_QUERY = (
+    'select id, status_id, type_id, '
+    'project.project_schema._task_workflow.statuses.id, '
+    'project.project_schema._task_workflow.statuses.name, '
+    'project.project_schema._overrides.type_id, '
+    'project.project_schema._overrides.workflow_schema.statuses.id, '
+    'project.project_schema._overrides.workflow_schema.statuses.name '
+    'from Task where id is "{0}"'
+)
+
+# Assets published from a task, or living under any other context
+_TASK_ASSETS_QUERY = (
+    'select id, name, type.short from Asset '
+    'where versions any (task_id is "{0}"){1}'
+)
+_CONTEXT_ASSETS_QUERY = (
+    'select id, name, type.short from Asset '
+    'where context_id is "{0}"{1}'
+)
+
+_ASSET_TYPES_QUERY = 'select short, name from AssetType'
+
+_ASSIGNED_TASKS_QUERY = (
+    'select id from Task where parent_id is "{0}" and '
+    'assignments any (type is "assignment" and resource.username is "{1}")'
+)
+
+# (entity id, is task, asset types) -> _Request, see prefetch_publish_context
+_prefetched = {}
+_prefetched_lock = threading.Lock()
+
+# (username, parent id) -> frozenset of assigned task ids, for the session
+_assigned_task_ids = {}
+_assigned_task_ids_lock = threading.Lock()
+
+# Asset type short name -> name, and its pending fetch if any, see
+# get_asset_type_names
+_asset_type_names = None
+_asset_type_names_request = None
+_asset_type_names_lock = threading.Lock()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _asset_type_filter(asset_types):
+    if not asset_types:
+        return ''
+    return ' and type.short in ({0})'.format(
+        ', '.join('"{0}"'.format(asset_type) for asset_type in asset_types))
+
+
+def fetch_task_statuses(task_id, session=None):
+    '''
+    Return the statuses available to the task *task_id* as a list of
+    (status id, status name) tuples, and the id of its current status
+    '''
+    session = session or get_shared_session()
+    task = session.query(_TASK_STATUSES_QUERY.format(task_id)).one()
+    statuses = task['project']['project_schema'].get_statuses(
+        'Task', task['type_id'])
+    return [(status['id'], status['name']) for status in statuses], task['status_id']
+
+
+def fetch_assigned_task_ids(parent_id, username, session=None):
+    '''
+    Return the ids of the tasks under *parent_id* assigned to *username*.
+    Results are cached for the lifetime of the process.
+    '''
+    key = (username, parent_id)
+    with _assigned_task_ids_lock:
+        if key in _assigned_task_ids:
+            return _assigned_task_ids[key]
+
+    session = session or get_shared_session()
+    task_ids = frozenset(
+        task['id'] for task in session.query(
+            _ASSIGNED_TASKS_QUERY.format(parent_id, username)))
+
+    with _assigned_task_ids_lock:
+        _assigned_task_ids[key] = task_ids
+    return task_ids
+
+
+def fetch_assets(entity_id, is_task, asset_types=None, session=None):
+    '''
+    Return the assets of *entity_id* as a list of (asset id, name, asset type
+    short name) tuples sorted by name, optionally restricted to the
+    *asset_types* short names. For a task (*is_task*) these are the assets
+    published from it.
+    '''
+    session = session or get_shared_session()
+    query = _TASK_ASSETS_QUERY if is_task else _CONTEXT_ASSETS_QUERY
+    assets = [
+        (asset['id'], asset['name'], asset['type']['short'])
+        for asset in session.query(
+            query.format(entity_id, _asset_type_filter(asset_types)))
+    ]
+    return sorted(assets, key=lambda asset: asset[1].lower())
+
+
+def fetch_asset_type_names(session=None):
+    '''Return a dictionary of asset type short name -> name'''
+    session = session or get_shared_session()
+    return dict(
+        (asset_type['short'], asset_type['name'])
+        for asset_type in session.query(_ASSET_TYPES_QUERY)
+    )
+
+
+def fetch_publish_context(entity_id, is_task, asset_types=None, session=None):
+    '''
+    Return everything ExportAssetOptionsWidget.updateView displays for
+    *entity_id*: a dictionary with the *statuses* and current *statusId*
+    (tasks only) and the *assets* (see fetch_assets)
+    '''
+    data = {'statuses': [], 'statusId': None}
+    if is_task:
+        data['statuses'], data['statusId'] = fetch_task_statuses(
+            entity_id, session)
+    data['assets'] = fetch_assets(entity_id, is_task, asset_types, session)
+
+    _logger.debug('Fetched {0} assets and {1} statuses for {2}'.format(
+        len(data['assets']), len(data['statuses']), entity_id))
+    return data
+
+
+class _Request(object):
+    '''
+    A call to *function* with *args* run by the FetchWorker, then to
+    *callback* with its result (None on failure). A request cancelled before
+    its turn is skipped.
+    '''
+    def __init__(self, function, args, callback=None):
+        self.done = threading.Event()
+        self.data = None
+        self.cancelled = False
+        self._function = function
+        self._args = args
+        self._callback = callback
+
+    def cancel(self):
+        '''Skip the request if it has not run yet'''
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            self.done.set()
+            return
+        try:
+            self.data = self._function(*self._args)
+        except Exception:
+            _logger.exception(
+                'Could not fetch the publish context of {0}'.format(self._args[0]))
+        finally:
+            self.done.set()
+        if self._callback:
+            self._callback(self.data)
+
+
+class FetchWorker(threading.Thread):
+    '''Run the requests put on its queue one after the other'''
+    def __init__(self):
+        super(FetchWorker, self).__init__(name='ftrack-publish-context')
+        self.daemon = True
+        self._queue = queue.Queue()
+
+    def submit(self, request):
+        self._queue.put(request)
+        return request
+
+    def run(self):
+        while True:
+            self._queue.get().run()
+
+
+def _submit(function, args, callback=None):
+    '''Run *function* on the worker thread, see _Request'''
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = FetchWorker()
+            _worker.start()
+    return _worker.submit(_Request(function, args, callback))
+
+
+def _prefetch_key(entity_id, is_task, asset_types):
+    return (entity_id, bool(is_task), tuple(sorted(asset_types or ())))
+
+
+def prefetch_publish_context(entity_id, is_task, asset_types=None):
+    '''
+    Start fetching the publish context of *entity_id* in the background (see
+    fetch_publish_context). The next get_publish_context call for the same
+    arguments uses the result.
+    '''
+    key = _prefetch_key(entity_id, is_task, asset_types)
+    with _prefetched_lock:
+        if key not in _prefetched:
+            _prefetched[key] = _submit(fetch_publish_context, key)
+
+
+def get_publish_context(entity_id, is_task, asset_types=None, session=None):
+    '''
+    Return the publish context of *entity_id*, from a prefetch if one was
+    started (waiting for it if needed) or else fetched now. A prefetched
+    result is only used once, later calls see fresh data.
+    '''
+    with _prefetched_lock:
+        prefetch = _prefetched.pop(
+            _prefetch_key(entity_id, is_task, asset_types), None)
+
+    if prefetch is not None:
+        # On the worker, a prefetch still pending is queued behind the caller
+        if threading.current_thread() is not _worker:
+            prefetch.done.wait()
+        if prefetch.data is not None:
+            return prefetch.data
+    return fetch_publish_context(entity_id, is_task, asset_types, session)
+
+
+def request_publish_context(entity_id, is_task, asset_types, callback,
+                            supersedes=None):
+    '''
+    Get the publish context of *entity_id* in the background (see
+    get_publish_context) and call *callback* with it, or with None on
+    failure, from the worker thread. The request *supersedes*, a previous
+    request of the caller, is cancelled if still queued. Return the new
+    request.
+    '''
+    if supersedes is not None:
+        supersedes.cancel()
+    return _submit(
+        get_publish_context, (entity_id, is_task, asset_types), callback)
+
+
+def _store_asset_type_names(names):
+    global _asset_type_names
+    with _asset_type_names_lock:
+        if names is not None:
+            _asset_type_names = names
+
+
+def prefetch_asset_type_names():
+    '''
+    Start fetching the asset type names in the background, see
+    get_asset_type_names
+    '''
+    global _asset_type_names_request
+    with _asset_type_names_lock:
+        if _asset_type_names is None and _asset_type_names_request is None:
+            _asset_type_names_request = _submit(
+                fetch_asset_type_names, (), _store_asset_type_names)
+
+
+def get_asset_type_names():
+    '''
+    Return a dictionary of asset type short name -> name, from a prefetch if
+    one was started (waiting for it if needed) or else fetched now. The
+    names are cached for the lifetime of the process.
+    '''
+    with _asset_type_names_lock:
+        request = _asset_type_names_request
+    if request is not None and threading.current_thread() is not _worker:
+        request.done.wait()
+
+    if _asset_type_names is None:
+        _store_asset_type_names(fetch_asset_type_names())
+    return _asset_type_names
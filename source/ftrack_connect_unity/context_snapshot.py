@@ -0,0 +1,177 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Snapshot of the launch context, written by the launch hook and read by the
+client process.
+
+The hook has the task and shot at hand already, so it records what the
+client would otherwise query again at startup (frame range and rate, links
+and their entity types) in a JSON file whose path is passed in the
+FTRACK_UNITY_CONTEXT_SNAPSHOT environment variable. Everything comes from
+the launch query itself, the snapshot costs the hook no request. The client
+treats it as a warm cache: every lookup falls back to querying the server
+when the snapshot is missing or does not match the launch context.
+
+There is one snapshot file per launch context, rewritten by the next launch
+of the same context; files left by other contexts are deleted after
+SNAPSHOT_MAX_AGE seconds.
+"""
+
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+ENVIRONMENT_VARIABLE = 'FTRACK_UNITY_CONTEXT_SNAPSHOT'
+
+# Bumped whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 2
+
+# Seconds after which the snapshot files of other contexts are deleted
+SNAPSHOT_MAX_AGE = 24 * 60 * 60
+
+_SNAPSHOT_PREFIX = 'ftrack_unity_context_'
+
+_snapshot = None
+_loaded = False
+_lock = threading.Lock()
+
+
+# Launch hook -----------------------------------------------------------------
+
+def build(context):
+    '''
+    Return the snapshot of *context*, a Context entity fetched with its
+    link, ancestors.object_type.name and parent.custom_attributes
+    '''
+    link = context['link']
+    # The link only types the project, the object types of the ancestors
+    # tell shots and sequences apart
+    entity_types = dict(
+        (ancestor['id'], ancestor['object_type']['name'])
+        for ancestor in context['ancestors']
+    )
+    entity_types[context['id']] = context.entity_type
+
+    custom_attributes = context['parent']['custom_attributes']
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'task_id': context['id'],
+        'shot_id': context['parent_id'],
+        'is_task': context.entity_type == 'Task',
+        'frame_start': custom_attributes.get('fstart'),
+        'frame_end': custom_attributes.get('fend'),
+        'fps': custom_attributes.get('fps'),
+        'link': [
+            {
+                'id': item['id'],
+                'name': item['name'],
+                'entity_type': entity_types.get(item['id'], item.get('type'))
+            }
+            for item in link
+        ]
+    }
+    return snapshot
+
+
+def _remove_stale_snapshots(keep):
+    '''Delete the snapshot files older than SNAPSHOT_MAX_AGE, but *keep*'''
+    expiry = time.time() - SNAPSHOT_MAX_AGE
+    pattern = os.path.join(tempfile.gettempdir(), _SNAPSHOT_PREFIX + '*.json')
+    for path in glob.glob(pattern):
+        try:
+            if path != keep and os.path.getmtime(path) < expiry:
+                os.remove(path)
+        except OSError:
+            # Removed by another launch, or not ours to remove
+            pass
+
+
+def write(snapshot):
+    '''
+    Write *snapshot* to the snapshot file of its context and return its
+    path
+    '''
+    path = os.path.join(
+        tempfile.gettempdir(),
+        '{0}{1}.json'.format(_SNAPSHOT_PREFIX, snapshot['task_id']))
+
+    # Write aside and rename, a client may be reading the previous snapshot
+    handle, temporary_path = tempfile.mkstemp(
+        prefix=_SNAPSHOT_PREFIX, suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, 'w') as snapshot_file:
+            json.dump(snapshot, snapshot_file)
+        if os.path.exists(path):
+            # No atomic replace on Windows with Python 2
+            os.remove(path)
+        os.rename(temporary_path, path)
+    except Exception:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+    _remove_stale_snapshots(path)
+    return path
+
+
+# Client ----------------------------------------------------------------------
+
+def load():
+    '''
+    Return the snapshot passed by the launch hook, or None when there is
+    none or it was taken for another context than the current one
+    '''
+    global _snapshot, _loaded
+    with _lock:
+        if _loaded:
+            return _snapshot
+        _loaded = True
+
+        path = os.environ.get(ENVIRONMENT_VARIABLE)
+        if not path:
+            return None
+        try:
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (IOError, OSError, ValueError) as error:
+            _logger.debug('Could not read the context snapshot {0}: {1}'.format(
+                path, error))
+            return None
+
+        if (snapshot.get('version') != SNAPSHOT_VERSION or
+                snapshot.get('task_id') != os.environ.get('FTRACK_TASKID')):
+            _logger.debug('Ignoring the context snapshot {0}, it does not '
+                          'match the launch context'.format(path))
+            return None
+
+        _snapshot = snapshot
+        return _snapshot
+
+
+def get(key, default=None):
+    '''Return the *key* value of the snapshot, or *default*'''
+    snapshot = load()
+    if snapshot is None or snapshot.get(key) is None:
+        return default
+    return snapshot[key]
+
+
+def is_part_of_shot_or_sequence(task_id):
+    '''
+    Return whether *task_id* has a shot or sequence ancestor, or None when
+    the snapshot does not tell
+    '''
+    snapshot = load()
+    if snapshot is None or snapshot['task_id'] != task_id:
+        return None
+    return any(
+        item['entity_type'] in ('Shot', 'Sequence')
+        for item in snapshot['link'][:-1]
+    )
@@ -0,0 +1,234 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Quick look into FBX files, to pick import options matching what a file
+holds before handing it to Unity.
+
+Only the Definitions section (object counts per type) is read, plus the
+headers of the Objects section children when the skin deformers must be
+told apart from the other deformers. Binary files are walked record by
+record, skipping the contents with seeks; ASCII files are read line by line
+and the reading stops as soon as the answer is known.
+"""
+
+import logging
+import os
+import re
+import struct
+import threading
+
+_logger = logging.getLogger(__name__)
+
+BINARY_MAGIC = b'Kaydara FBX Binary  \x00'
+
+# First binary version with 64 bits record headers
+WIDE_HEADER_VERSION = 7500
+
+# Size of the fixed part of the property types
+_PROPERTY_SIZES = {
+    b'Y': 2, b'C': 1, b'I': 4, b'F': 4, b'D': 8, b'L': 8
+}
+_PROPERTY_FORMATS = {
+    b'Y': '<h', b'C': '<?', b'I': '<i', b'F': '<f', b'D': '<d', b'L': '<q'
+}
+
+_ASCII_OBJECT_TYPE = re.compile(r'^\s*ObjectType:\s*"(\w+)"')
+_ASCII_COUNT = re.compile(r'^\s*Count:\s*(\d+)')
+_ASCII_SKIN = re.compile(r'^\s*Deformer:.*"Skin"\s*\{')
+
+# (path, size, mtime) -> FbxInfo
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class FbxInfo(object):
+    '''What an FBX file holds, as far as the import options are concerned'''
+    def __init__(self, version, counts, has_skin):
+        self.version = version
+        # Object type -> number of objects, from the Definitions section
+        self.counts = counts
+        self.has_skin = has_skin
+
+    @property
+    def has_materials(self):
+        return self.counts.get('Material', 0) > 0
+
+    @property
+    def has_animation(self):
+        return self.counts.get('AnimationCurve', 0) > 0
+
+    @property
+    def has_geometry(self):
+        return self.counts.get('Geometry', 0) > 0
+
+    def __repr__(self):
+        return '<FbxInfo version={0} counts={1} has_skin={2}>'.format(
+            self.version, self.counts, self.has_skin)
+
+
+# Binary ----------------------------------------------------------------------
+
+def _read_record_header(fbx_file, wide):
+    '''Return the (end offset, property list length, name) of a record'''
+    if wide:
+        data = fbx_file.read(25)
+        if len(data) < 25:
+            raise ValueError('Unexpected end of file')
+        end_offset, _, property_length, name_length = struct.unpack('<QQQB', data)
+    else:
+        data = fbx_file.read(13)
+        if len(data) < 13:
+            raise ValueError('Unexpected end of file')
+        end_offset, _, property_length, name_length = struct.unpack('<IIIB', data)
+    return end_offset, property_length, fbx_file.read(name_length).decode('ascii', 'replace')
+
+
+def _read_properties(data):
+    '''Return the scalar and string properties in *data*, skipping arrays'''
+    properties = []
+    offset = 0
+    while offset < len(data):
+        code = data[offset:offset + 1]
+        offset += 1
+        if code in _PROPERTY_SIZES:
+            size = _PROPERTY_SIZES[code]
+            properties.append(struct.unpack(
+                _PROPERTY_FORMATS[code], data[offset:offset + size])[0])
+            offset += size
+        elif code in (b'S', b'R'):
+            length = struct.unpack('<I', data[offset:offset + 4])[0]
+            value = data[offset + 4:offset + 4 + length]
+            properties.append(value.decode('utf-8', 'replace') if code == b'S' else value)
+            offset += 4 + length
+        elif code in (b'f', b'd', b'l', b'i', b'b'):
+            # Array length, encoding, compressed length
+            offset += 12 + struct.unpack('<I', data[offset + 8:offset + 12])[0]
+        else:
+            raise ValueError('Unknown FBX property type {0!r}'.format(code))
+    return properties
+
+
+def _children(fbx_file, end_offset, wide):
+    '''
+    Yield the (end offset, properties, name) of the children records of the
+    record ending at *end_offset*, the file being at its first child. Each
+    child is skipped past once the caller moves on.
+    '''
+    while fbx_file.tell() < end_offset:
+        child_end, property_length, name = _read_record_header(fbx_file, wide)
+        if child_end == 0:
+            # Null record closing the list
+            return
+        properties = _read_properties(fbx_file.read(property_length))
+        yield child_end, properties, name
+        fbx_file.seek(child_end)
+
+
+def _scan_binary(fbx_file):
+    version = struct.unpack('<I', fbx_file.read(6)[2:])[0]
+    wide = version >= WIDE_HEADER_VERSION
+    fbx_file.seek(0, os.SEEK_END)
+    file_size = fbx_file.tell()
+    fbx_file.seek(27)
+
+    counts = {}
+    has_skin = False
+    for end_offset, _, name in _children(fbx_file, file_size, wide):
+        if name == 'Definitions':
+            for type_end, type_properties, type_name in _children(fbx_file, end_offset, wide):
+                if type_name != 'ObjectType' or not type_properties:
+                    continue
+                for _, count_properties, count_name in _children(fbx_file, type_end, wide):
+                    if count_name == 'Count' and count_properties:
+                        counts[type_properties[0]] = int(count_properties[0])
+                        break
+        elif name == 'Objects':
+            # Deformers are skins, clusters (part of a skin) or blend shapes
+            if counts.get('Deformer', 0) > 0:
+                for _, properties, object_name in _children(fbx_file, end_offset, wide):
+                    if (object_name == 'Deformer' and len(properties) > 2 and
+                            properties[2] == 'Skin'):
+                        has_skin = True
+                        break
+            # Everything needed comes before the end of the objects
+            break
+
+    return FbxInfo(version, counts, has_skin)
+
+
+# ASCII -----------------------------------------------------------------------
+
+def _scan_ascii(fbx_file, first_line):
+    version_match = re.search(r'FBX (\d+)\.(\d+)', first_line.decode('ascii', 'replace'))
+    version = (
+        int(version_match.group(1)) * 1000 + int(version_match.group(2)) * 100
+        if version_match else None)
+
+    counts = {}
+    has_skin = False
+    object_type = None
+    in_definitions = False
+    for raw_line in fbx_file:
+        line = raw_line.decode('utf-8', 'replace')
+        if not in_definitions:
+            if line.startswith('Definitions:'):
+                in_definitions = True
+            elif line.startswith('Objects:'):
+                if counts.get('Deformer', 0) == 0:
+                    break
+            elif _ASCII_SKIN.match(line):
+                has_skin = True
+                break
+            elif line.startswith('Connections:') or line.startswith('Takes:'):
+                break
+            continue
+
+        if line.startswith('}'):
+            in_definitions = False
+            continue
+        match = _ASCII_OBJECT_TYPE.match(line)
+        if match:
+            object_type = match.group(1)
+            continue
+        match = _ASCII_COUNT.match(line)
+        if match and object_type:
+            counts[object_type] = int(match.group(1))
+            object_type = None
+
+    return FbxInfo(version, counts, has_skin)
+
+
+# Public ----------------------------------------------------------------------
+
+def scan(path):
+    '''
+    Return the FbxInfo of the FBX file at *path*, or None when it is not an
+    FBX file or cannot be read
+    '''
+    if os.path.splitext(path)[1].lower() != '.fbx':
+        return None
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_size, stat.st_mtime)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    info = None
+    try:
+        with open(path, 'rb') as fbx_file:
+            if fbx_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                info = _scan_binary(fbx_file)
+            else:
+                fbx_file.seek(0)
+                info = _scan_ascii(fbx_file, fbx_file.readline())
+    except (IOError, OSError, ValueError, struct.error) as error:
+        _logger.debug('Could not scan {0}: {1}'.format(path, error))
+
+    with _cache_lock:
+        _cache[key] = info
+    return info
@@ -0,0 +1,161 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Verification of the image sequences produced by the Unity Recorder before
+they get published: every frame must exist, be non empty, start with the
+header of its format and, for formats with one, end with their trailer.
+Frames are checksummed while they are read, and the checksums are stored as
+component metadata for later transfers and caches to dedupe on.
+
+Frames are memory mapped and verified concurrently; hashlib releases the
+GIL on large buffers so the threads hash in parallel.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+from multiprocessing.pool import ThreadPool
+
+_logger = logging.getLogger(__name__)
+
+CHECKSUM_ALGORITHM = 'sha1'
+
+# Number of frames verified concurrently
+MAX_WORKERS = 16
+
+# Bytes hashed per update, bounds the memory copied out of the mapping
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Component metadata keys
+METADATA_CHECKSUM = 'ftrack_checksum'
+METADATA_FRAME_CHECKSUMS = 'ftrack_frame_checksums'
+
+# extension -> (header magic, trailer magic or None)
+FORMATS = {
+    'exr': (b'\x76\x2f\x31\x01', None),
+    'jpg': (b'\xff\xd8\xff', b'\xff\xd9'),
+    'jpeg': (b'\xff\xd8\xff', b'\xff\xd9'),
+    'png': (b'\x89PNG\r\n\x1a\n', b'IEND\xaeB`\x82'),
+}
+
+
+class FrameResult(object):
+    '''The verification of a single frame'''
+    def __init__(self, frame, path):
+        self.frame = frame
+        self.path = path
+        self.size = 0
+        self.checksum = None
+        self.error = None
+
+
+class SequenceVerification(object):
+    '''The verification of a whole sequence, see verify_sequence'''
+    def __init__(self, frames):
+        self.frames = frames
+
+    @property
+    def errors(self):
+        return [frame for frame in self.frames if frame.error]
+
+    @property
+    def size(self):
+        return sum(frame.size for frame in self.frames)
+
+    @property
+    def checksum(self):
+        '''Checksum of the whole sequence, from the frame checksums in order'''
+        sequence_hash = hashlib.new(CHECKSUM_ALGORITHM)
+        for frame in self.frames:
+            sequence_hash.update((frame.checksum or '').encode('ascii'))
+        return sequence_hash.hexdigest()
+
+    def describe_errors(self, limit=10):
+        '''Return a human readable summary of the invalid frames'''
+        errors = self.errors
+        lines = ['{0}: {1}'.format(frame.path, frame.error) for frame in errors[:limit]]
+        if len(errors) > limit:
+            lines.append('... and {0} more'.format(len(errors) - limit))
+        return '{0} invalid frames\n{1}'.format(len(errors), '\n'.join(lines))
+
+    def metadata(self):
+        '''Return the component metadata recording the checksums'''
+        return {
+            METADATA_CHECKSUM: '{0}:{1}'.format(CHECKSUM_ALGORITHM, self.checksum),
+            METADATA_FRAME_CHECKSUMS: json.dumps(dict(
+                (str(frame.frame), frame.checksum) for frame in self.frames))
+        }
+
+
+def frame_paths(image_path, image_ext, frame_start, frame_end):
+    '''
+    Return the (frame, path) tuples of the sequence written by the Recorder
+    at *image_path* ("<Frame>" standing for the frame number), named like
+    ImageSequenceAsset.publishAsset expects them
+    '''
+    tokens = image_path.split('<Frame>')
+    prefix = tokens[0]
+    suffix = tokens[1] if len(tokens) > 1 else ''
+    return [
+        (frame, '{0}{1:04d}{2}.{3}'.format(prefix, frame, suffix, image_ext))
+        for frame in range(int(float(frame_start)), int(float(frame_end)) + 1)
+    ]
+
+
+def verify_frame(frame, path):
+    '''Return the FrameResult of the frame *frame* at *path*'''
+    result = FrameResult(frame, path)
+    header, trailer = FORMATS.get(
+        os.path.splitext(path)[1][1:].lower(), (None, None))
+
+    try:
+        with open(path, 'rb') as frame_file:
+            result.size = os.fstat(frame_file.fileno()).st_size
+            if not result.size:
+                result.error = 'empty file'
+                return result
+
+            mapping = mmap.mmap(frame_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if header and mapping[:len(header)] != header:
+                    result.error = 'invalid header'
+                    return result
+                if trailer and mapping[-len(trailer):] != trailer:
+                    result.error = 'truncated file'
+                    return result
+
+                frame_hash = hashlib.new(CHECKSUM_ALGORITHM)
+                for offset in range(0, result.size, HASH_BLOCK_SIZE):
+                    frame_hash.update(mapping[offset:offset + HASH_BLOCK_SIZE])
+                result.checksum = frame_hash.hexdigest()
+            finally:
+                mapping.close()
+    except (IOError, OSError) as error:
+        result.error = 'missing file' if not os.path.exists(path) else str(error)
+
+    return result
+
+
+def verify_sequence(image_path, image_ext, frame_start, frame_end,
+                    workers=MAX_WORKERS):
+    '''
+    Verify the frames of the sequence described by the arguments (see
+    frame_paths) with *workers* threads and return a SequenceVerification
+    '''
+    frames = frame_paths(image_path, image_ext, frame_start, frame_end)
+    if not frames:
+        return SequenceVerification([])
+
+    pool = ThreadPool(max(1, min(workers, len(frames))))
+    try:
+        results = pool.map(lambda item: verify_frame(*item), frames)
+    finally:
+        pool.close()
+
+    verification = SequenceVerification(results)
+    _logger.debug('Verified {0} frames ({1} bytes), {2} invalid'.format(
+        len(results), verification.size, len(verification.errors)))
+    return verification
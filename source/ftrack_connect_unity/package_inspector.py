@@ -0,0 +1,349 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Streaming inspection of .unitypackage files.
+
+A package is a gzipped tar holding one directory per asset, named after the
+asset guid, with the asset content ("asset"), its importer settings
+("asset.meta") and its path in the project ("pathname"). The package is
+read once as a stream, so inspecting it takes constant memory whatever its
+size, and the results are cached per package checksum.
+
+The contents can be compared with the project to write a smaller package
+holding only the new and changed assets, so Unity does not reimport the
+assets a newer version of a package left untouched.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import threading
+from multiprocessing.pool import ThreadPool
+
+from ftrack_connect_unity import unity_meta
+
+_logger = logging.getLogger(__name__)
+
+CHECKSUM_ALGORITHM = 'sha1'
+
+# Bytes read at once from the package and its entries
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Bumped whenever the layout of the cached contents changes
+CACHE_VERSION = 1
+
+# Number of project files compared concurrently
+MAX_WORKERS = 8
+
+# Packages written by write_package are temporary, favour speed over size
+WRITE_COMPRESS_LEVEL = 1
+
+# (path, size, mtime) -> checksum of the project files already hashed
+_file_checksums = {}
+_file_checksums_lock = threading.Lock()
+
+
+class PackageEntry(object):
+    '''An asset of a package'''
+    def __init__(self, guid, pathname=None, size=0, checksum=None,
+                 meta_checksum=None, ftrack_metadata=None):
+        self.guid = guid
+        self.pathname = pathname
+        self.size = size
+        self.checksum = checksum
+        self.meta_checksum = meta_checksum
+        self.ftrack_metadata = ftrack_metadata
+
+    @property
+    def is_folder(self):
+        '''Folders have a .meta but no content'''
+        return self.checksum is None
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class PackageContents(object):
+    '''The assets of the package with *checksum*'''
+    def __init__(self, checksum, entries):
+        self.checksum = checksum
+        self.entries = entries
+
+    @property
+    def size(self):
+        return sum(entry.size for entry in self.entries)
+
+    @property
+    def guids(self):
+        return [entry.guid for entry in self.entries]
+
+    def to_dict(self):
+        return {
+            'version': CACHE_VERSION,
+            'checksum': self.checksum,
+            'entries': [entry.to_dict() for entry in self.entries]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != CACHE_VERSION:
+            raise ValueError('Unsupported package contents version')
+        return cls(
+            data['checksum'],
+            [PackageEntry.from_dict(entry) for entry in data['entries']])
+
+
+class _HashingReader(object):
+    '''File object wrapper hashing what is read through it'''
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.hash = hashlib.new(CHECKSUM_ALGORITHM)
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.hash.update(data)
+        return data
+
+    def drain(self):
+        '''Hash what the tar reader left unread (padding)'''
+        while self.read(READ_BLOCK_SIZE):
+            pass
+
+
+def _member_parts(member):
+    '''Return the (guid, name, ...) parts of the path of *member*'''
+    return member.name.lstrip('./').split('/')
+
+
+def _hash_member(stream, member):
+    member_file = stream.extractfile(member)
+    member_hash = hashlib.new(CHECKSUM_ALGORITHM)
+    while True:
+        data = member_file.read(READ_BLOCK_SIZE)
+        if not data:
+            break
+        member_hash.update(data)
+    return member_hash.hexdigest()
+
+
+def read_package(path):
+    '''
+    Read the package at *path* in a single streaming pass and return its
+    PackageContents
+    '''
+    entries = {}
+    with open(path, 'rb') as package_file:
+        reader = _HashingReader(package_file)
+        stream = tarfile.open(fileobj=reader, mode='r|gz')
+        try:
+            for member in stream:
+                if not member.isfile():
+                    continue
+                parts = _member_parts(member)
+                if len(parts) != 2:
+                    continue
+
+                guid, name = parts
+                entry = entries.get(guid)
+                if entry is None:
+                    entry = entries[guid] = PackageEntry(guid)
+
+                if name == 'asset':
+                    entry.size = member.size
+                    entry.checksum = _hash_member(stream, member)
+                elif name == 'asset.meta':
+                    meta = stream.extractfile(member).read()
+                    entry.meta_checksum = hashlib.new(CHECKSUM_ALGORITHM, meta).hexdigest()
+                    entry.ftrack_metadata = unity_meta.read_meta(
+                        meta.decode('utf-8', 'replace'))[1]
+                elif name == 'pathname':
+                    pathname = stream.extractfile(member).read().decode('utf-8')
+                    # Newer packages add lines after the path
+                    entry.pathname = pathname.splitlines()[0].strip() if pathname else ''
+        finally:
+            stream.close()
+        reader.drain()
+
+    return PackageContents(
+        reader.hash.hexdigest(),
+        sorted(entries.values(), key=lambda entry: entry.pathname or ''))
+
+
+class PackageInspector(object):
+    '''
+    Read packages with read_package, caching the results per package
+    checksum in memory and in *cache_directory*
+    '''
+    def __init__(self, cache_directory):
+        self.cache_directory = cache_directory
+        self._contents = {}
+        # (path, size, mtime) -> package checksum
+        self._checksums = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, checksum):
+        return os.path.join(self.cache_directory, '{0}.json'.format(checksum))
+
+    def _load(self, checksum):
+        contents = self._contents.get(checksum)
+        if contents is not None:
+            return contents
+        try:
+            with open(self._cache_path(checksum)) as cache_file:
+                contents = PackageContents.from_dict(json.load(cache_file))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+        self._contents[checksum] = contents
+        return contents
+
+    def _save(self, contents, checksum):
+        '''Cache *contents* under *checksum*'''
+        self._contents[checksum] = contents
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            cache_path = self._cache_path(checksum)
+            with open(cache_path + '.tmp', 'w') as cache_file:
+                json.dump(contents.to_dict(), cache_file)
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            os.rename(cache_path + '.tmp', cache_path)
+        except (IOError, OSError) as error:
+            _logger.debug('Could not cache the package contents: {0}'.format(error))
+
+    def inspect(self, path, checksum=None):
+        '''
+        Return the PackageContents of the package at *path*. Pass the
+        package *checksum* when known (e.g. from the component metadata) to
+        skip reading the package when its contents are cached; the contents
+        are then cached under that checksum too.
+        '''
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            checksum = checksum or self._checksums.get(key)
+            contents = self._load(checksum) if checksum else None
+            if contents is not None:
+                return contents
+
+        contents = read_package(path)
+        _logger.debug('Read {0}: {1} assets, {2} bytes'.format(
+            path, len(contents.entries), contents.size))
+        with self._lock:
+            # Later calls find the contents by path, or by either checksum
+            self._checksums[key] = checksum or contents.checksum
+            self._save(contents, contents.checksum)
+            if checksum and checksum != contents.checksum:
+                self._save(contents, checksum)
+        return contents
+
+
+def _file_checksum(path, stat):
+    key = (path, stat.st_size, stat.st_mtime)
+    with _file_checksums_lock:
+        checksum = _file_checksums.get(key)
+    if checksum is not None:
+        return checksum
+
+    file_hash = hashlib.new(CHECKSUM_ALGORITHM)
+    with open(path, 'rb') as project_file:
+        while True:
+            data = project_file.read(READ_BLOCK_SIZE)
+            if not data:
+                break
+            file_hash.update(data)
+    checksum = file_hash.hexdigest()
+
+    with _file_checksums_lock:
+        _file_checksums[key] = checksum
+    return checksum
+
+
+def is_entry_changed(entry, project_path):
+    '''
+    Return whether importing *entry* would change the project at
+    *project_path*: the asset is missing, has another guid, or its content
+    or importer settings differ
+    '''
+    if not entry.pathname:
+        return True
+    path = os.path.join(project_path, *entry.pathname.split('/'))
+
+    try:
+        with open(path + '.meta', 'rb') as meta_file:
+            meta = meta_file.read()
+    except (IOError, OSError):
+        return True
+    if unity_meta.read_meta(meta.decode('utf-8', 'replace'))[0] != entry.guid:
+        return True
+
+    if entry.is_folder:
+        return not os.path.isdir(path)
+    if hashlib.new(CHECKSUM_ALGORITHM, meta).hexdigest() != entry.meta_checksum:
+        return True
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return True
+    if stat.st_size != entry.size:
+        return True
+    return _file_checksum(path, stat) != entry.checksum
+
+
+def changed_entries(contents, project_path, workers=MAX_WORKERS):
+    '''
+    Return the entries of *contents* for which is_entry_changed is true,
+    comparing *workers* assets concurrently
+    '''
+    if not contents.entries:
+        return []
+
+    pool = ThreadPool(max(1, min(workers, len(contents.entries))))
+    try:
+        changed = pool.map(
+            lambda entry: is_entry_changed(entry, project_path), contents.entries)
+    finally:
+        pool.close()
+
+    return [entry for entry, is_changed in zip(contents.entries, changed) if is_changed]
+
+
+def write_package(source_path, destination_path, guids):
+    '''
+    Write to *destination_path* a package holding the assets of the package
+    at *source_path* whose guid is in *guids*, streaming both packages
+    '''
+    guids = set(guids)
+    directory = os.path.dirname(destination_path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    partial_path = destination_path + '.part'
+    source = tarfile.open(source_path, mode='r|gz')
+    try:
+        destination = tarfile.open(
+            partial_path, mode='w:gz', compresslevel=WRITE_COMPRESS_LEVEL)
+        try:
+            for member in source:
+                if _member_parts(member)[0] not in guids:
+                    continue
+                if member.isfile():
+                    destination.addfile(member, source.extractfile(member))
+                else:
+                    destination.addfile(member)
+        finally:
+            destination.close()
+    finally:
+        source.close()
+
+    if os.path.exists(destination_path):
+        os.remove(destination_path)
+    os.rename(partial_path, destination_path)
@@ -0,0 +1,461 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Deduplicating store for the .unitypackage components.
+
+Scene packages are published again and again with most of their content
+unchanged. When the FTRACK_UNITY_PACKAGE_STORE environment variable points to
+a directory (usually on the shared storage), a package is not published as
+is: it is split into chunks, only the chunks the store does not hold yet are
+copied, and the component points to a small recipe listing the chunks.
+Importing such a component assembles the package again into the Unity
+project Library folder.
+
+The gzip stream of a package changes entirely past the first edited byte, so
+the package is chunked after decompressing it. A package holds one folder
+per asset guid; a chunk is a run of whole asset folders, ending after a
+folder whose guid hash matches CHUNK_ANCHOR_MODULO once past CHUNK_MIN_SIZE
+bytes (or at CHUNK_MAX_SIZE). The boundaries do not depend on the content of
+the assets, so an edited asset only changes the chunk holding it. The tar headers are normalised (no modification times, owners) so an
+asset exported again unchanged gives the same bytes, and every chunk is
+stored compressed.
+
+The hashes of the chunks known to be in a store are remembered locally so
+that republishing does not hand every chunk to the transfer workers. A known
+chunk is still checked to exist, and forgotten when it does not (the store
+was purged or recreated), and as every chunk is written under its final
+name atomically, an interrupted transfer resumes where it stopped.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import uuid
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import appdirs
+
+_logger = logging.getLogger(__name__)
+
+ENVIRONMENT_VARIABLE = 'FTRACK_UNITY_PACKAGE_STORE'
+
+CHECKSUM_ALGORITHM = 'sha1'
+
+# Bounds of the uncompressed chunk sizes. Past the minimum size, a chunk
+# ends after one asset folder in CHUNK_ANCHOR_MODULO on average
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_MAX_SIZE = 8 * 1024 * 1024
+CHUNK_ANCHOR_MODULO = 2
+
+# Chunks are compressed once and stored, packages are assembled locally for
+# a single import
+CHUNK_COMPRESS_LEVEL = 6
+PACKAGE_COMPRESS_LEVEL = 1
+
+# Bytes read at once from the packages and chunks
+READ_BLOCK_SIZE = 1024 * 1024
+
+_TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+# Number of chunks copied concurrently
+MAX_WORKERS = 8
+
+# Extension of the recipe files, appended to the package file name
+RECIPE_EXTENSION = '.chunks'
+
+# Bumped whenever the layout of the recipes or chunks changes
+RECIPE_VERSION = 2
+
+KNOWN_CHUNKS_PATH = os.path.join(
+    appdirs.user_data_dir('ftrack-connect-unity-engine', 'ftrack'),
+    'known_chunks'
+)
+
+
+class PackageRecord(object):
+    '''A package stored in a PackageStore, as described by its recipe'''
+    def __init__(self, checksum, size, chunks, name, transferred=0, store=None):
+        self.checksum = checksum
+        self.size = size
+        # (checksum, size) of the chunks, in order
+        self.chunks = chunks
+        self.name = name
+        # Bytes copied to the store when storing the package
+        self.transferred = transferred
+        # Root of the store the package was written to
+        self.store = store
+
+    def to_dict(self):
+        return {
+            'version': RECIPE_VERSION,
+            'checksum': self.checksum,
+            'size': self.size,
+            'name': self.name,
+            'store': self.store,
+            'chunks': [list(chunk) for chunk in self.chunks]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != RECIPE_VERSION:
+            raise ValueError('Unsupported package recipe version {0}'.format(
+                data.get('version')))
+        return cls(
+            data['checksum'], data['size'],
+            [tuple(chunk) for chunk in data['chunks']], data['name'],
+            store=data.get('store'))
+
+
+def read_recipe(recipe_path):
+    '''Return the PackageRecord of the recipe at *recipe_path*'''
+    with open(recipe_path, 'rb') as recipe_file:
+        return PackageRecord.from_dict(json.loads(recipe_file.read().decode('utf-8')))
+
+
+def is_recipe(path):
+    return path.lower().endswith(RECIPE_EXTENSION)
+
+
+def _guid(member):
+    '''Return the asset guid of the package member *member*'''
+    return member.name.lstrip('./').split('/')[0]
+
+
+def _is_anchor(guid):
+    '''Return whether a chunk may end after the asset folder of *guid*'''
+    guid_hash = hashlib.md5(guid.encode('utf-8')).hexdigest()
+    return int(guid_hash[:8], 16) % CHUNK_ANCHOR_MODULO == 0
+
+
+def _member_blocks(stream, member):
+    '''
+    Yield the tar blocks of the package *member* of *stream*, with a
+    normalised header
+    '''
+    info = tarfile.TarInfo(member.name)
+    info.type = member.type
+    info.mode = member.mode
+    info.linkname = member.linkname
+    info.size = member.size if member.isfile() else 0
+    yield info.tobuf(tarfile.GNU_FORMAT)
+
+    if not member.isfile():
+        return
+    member_file = stream.extractfile(member)
+    while True:
+        data = member_file.read(READ_BLOCK_SIZE)
+        if not data:
+            break
+        yield data
+    padding = -member.size % _TAR_BLOCK_SIZE
+    if padding:
+        yield b'\0' * padding
+
+
+class _ChunkWriter(object):
+    '''Compress a chunk to a temporary file in *directory*, hashing it'''
+    def __init__(self, directory):
+        handle, self.path = tempfile.mkstemp(dir=directory)
+        self._file = os.fdopen(handle, 'wb')
+        self._compressor = zlib.compressobj(CHUNK_COMPRESS_LEVEL)
+        self._hash = hashlib.new(CHECKSUM_ALGORITHM)
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        self._file.write(self._compressor.compress(data))
+
+    def close(self):
+        '''Return the checksum of the chunk'''
+        self._file.write(self._compressor.flush())
+        self._file.close()
+        return self._hash.hexdigest()
+
+
+class PackageStore(object):
+    '''Chunk store rooted at the directory *root*'''
+    def __init__(self, root, workers=MAX_WORKERS):
+        self.root = root
+        self._workers = workers
+        self._known_lock = threading.Lock()
+        self._known = None
+
+    @classmethod
+    def from_environment(cls):
+        '''Return the store configured in the environment, or None'''
+        root = os.environ.get(ENVIRONMENT_VARIABLE)
+        return cls(root) if root else None
+
+    @classmethod
+    def for_recipe(cls, recipe_path):
+        '''
+        Return the store holding the chunks of the recipe at *recipe_path*:
+        the store it was written to, the store configured in the environment
+        or the store the recipe lies in, whichever holds its first chunk. A
+        location may have copied the recipe anywhere, and the store may be
+        mounted elsewhere on this machine.
+        '''
+        record = read_recipe(recipe_path)
+        roots = [
+            record.store,
+            os.environ.get(ENVIRONMENT_VARIABLE),
+            os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.abspath(recipe_path))))
+        ]
+        for root in roots:
+            if not root:
+                continue
+            store = cls(root)
+            if not record.chunks or os.path.exists(store.chunk_path(record.chunks[0][0])):
+                return store
+
+        raise IOError(
+            'Cannot find the chunks of {0}, set {1} to the package store '
+            'holding them'.format(recipe_path, ENVIRONMENT_VARIABLE))
+
+    def chunk_path(self, checksum):
+        return os.path.join(self.root, 'chunks', checksum[:2], checksum)
+
+    def recipe_path(self, record):
+        return os.path.join(
+            self.root, 'packages', record.checksum,
+            record.name + RECIPE_EXTENSION)
+
+    # Known chunks ------------------------------------------------------------
+
+    def _known_chunks_path(self):
+        root_hash = hashlib.md5(
+            os.path.abspath(self.root).encode('utf-8')).hexdigest()
+        return os.path.join(KNOWN_CHUNKS_PATH, root_hash)
+
+    def _known_chunks(self):
+        with self._known_lock:
+            if self._known is None:
+                self._known = set()
+                try:
+                    with open(self._known_chunks_path()) as known_file:
+                        self._known.update(line.strip() for line in known_file)
+                except (IOError, OSError):
+                    pass
+            return self._known
+
+    def _remember_chunks(self, checksums):
+        '''Record *checksums* as held by the store, in memory and on disk'''
+        if not checksums:
+            return
+        with self._known_lock:
+            self._known.update(checksums)
+            path = self._known_chunks_path()
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'a') as known_file:
+                    known_file.write(''.join(
+                        '{0}\n'.format(checksum) for checksum in checksums))
+            except (IOError, OSError) as error:
+                _logger.debug('Could not record the known chunks: {0}'.format(error))
+
+    def _forget_chunks(self, checksums):
+        '''Record *checksums* as missing from the store'''
+        if not checksums:
+            return
+        with self._known_lock:
+            self._known.difference_update(checksums)
+            path = self._known_chunks_path()
+            try:
+                self._write_atomically(path, lambda output: output.write(''.join(
+                    '{0}\n'.format(checksum) for checksum in sorted(self._known)
+                ).encode('ascii')), replace=True)
+            except (IOError, OSError) as error:
+                _logger.debug('Could not record the known chunks: {0}'.format(error))
+
+    # Storing -----------------------------------------------------------------
+
+    def _write_atomically(self, path, write, replace=False):
+        '''
+        Call *write* with a file object, then move the file to *path*. An
+        existing file at *path* is kept, unless *replace*.
+        '''
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created concurrently
+                if not os.path.isdir(directory):
+                    raise
+
+        temporary_path = '{0}.{1}.tmp'.format(path, uuid.uuid4().hex)
+        try:
+            with open(temporary_path, 'wb') as output:
+                write(output)
+            if os.path.exists(path) and not replace:
+                # Written concurrently, by another publish
+                os.remove(temporary_path)
+            else:
+                if os.path.exists(path):
+                    # No atomic replace on Windows with Python 2
+                    os.remove(path)
+                os.rename(temporary_path, path)
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+    def _transfer(self, checksum, temporary_path):
+        '''Copy the compressed chunk at *temporary_path* to the store'''
+        try:
+            chunk_path = self.chunk_path(checksum)
+            # Stored by another publish, or before an interruption
+            if os.path.exists(chunk_path):
+                return checksum, 0
+
+            def write(output):
+                with open(temporary_path, 'rb') as chunk_file:
+                    shutil.copyfileobj(chunk_file, output, READ_BLOCK_SIZE)
+            self._write_atomically(chunk_path, write)
+            return checksum, os.path.getsize(temporary_path)
+        finally:
+            os.remove(temporary_path)
+
+    def put(self, path):
+        '''
+        Store the package at *path* and write its recipe. Return the
+        PackageRecord of the package.
+        '''
+        known = self._known_chunks()
+        package_hash = hashlib.new(CHECKSUM_ALGORITHM)
+        chunks = []
+        pending = set()
+        # Known chunks missing from the store
+        stale = []
+        transfers = []
+
+        temporary_directory = tempfile.mkdtemp(prefix='ftrack_package_')
+        pool = ThreadPool(self._workers)
+        try:
+            def end_chunk(writer):
+                checksum = writer.close()
+                chunks.append((checksum, writer.size))
+                if checksum in pending or (
+                        checksum in known and os.path.exists(self.chunk_path(checksum))):
+                    os.remove(writer.path)
+                else:
+                    if checksum in known:
+                        stale.append(checksum)
+                    pending.add(checksum)
+                    transfers.append(pool.apply_async(
+                        self._transfer, (checksum, writer.path)))
+
+            stream = tarfile.open(path, mode='r|gz')
+            try:
+                writer = None
+                folder_guid = None
+                for member in stream:
+                    guid = _guid(member)
+                    if guid != folder_guid:
+                        if writer and (writer.size >= CHUNK_MAX_SIZE or (
+                                writer.size >= CHUNK_MIN_SIZE and _is_anchor(folder_guid))):
+                            end_chunk(writer)
+                            writer = None
+                        folder_guid = guid
+
+                    if writer is None:
+                        writer = _ChunkWriter(temporary_directory)
+                    for data in _member_blocks(stream, member):
+                        writer.write(data)
+                        package_hash.update(data)
+                if writer:
+                    end_chunk(writer)
+            finally:
+                stream.close()
+
+            if not chunks:
+                raise ValueError('Cannot store the empty package {0}'.format(path))
+
+            self._forget_chunks(stale)
+            transferred = 0
+            for transfer in transfers:
+                checksum, written = transfer.get()
+                self._remember_chunks([checksum])
+                transferred += written
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+        record = PackageRecord(
+            package_hash.hexdigest(), sum(size for _, size in chunks), chunks,
+            os.path.basename(path), transferred, os.path.abspath(self.root))
+        recipe_path = self.recipe_path(record)
+        if not os.path.exists(recipe_path):
+            self._write_atomically(
+                recipe_path,
+                lambda output: output.write(json.dumps(record.to_dict()).encode('utf-8')))
+
+        _logger.debug('Stored {0} in {1} chunks, {2} bytes transferred'.format(
+            path, len(chunks), transferred))
+        return record
+
+    # Loading -----------------------------------------------------------------
+
+    def _read_chunk(self, checksum, size):
+        '''Yield the uncompressed content of the chunk *checksum*'''
+        decompressor = zlib.decompressobj()
+        chunk_hash = hashlib.new(CHECKSUM_ALGORITHM)
+        read_size = 0
+        with open(self.chunk_path(checksum), 'rb') as chunk_file:
+            while True:
+                data = chunk_file.read(READ_BLOCK_SIZE)
+                data = decompressor.decompress(data) if data else decompressor.flush()
+                if not data:
+                    break
+                chunk_hash.update(data)
+                read_size += len(data)
+                yield data
+
+        if read_size != size or chunk_hash.hexdigest() != checksum:
+            raise IOError('Chunk {0} is corrupt'.format(checksum))
+
+    def materialize(self, recipe_path, directory):
+        '''
+        Assemble the package of the recipe at *recipe_path* into *directory*
+        and return its path and checksum. An assembled package is reused.
+        '''
+        record = read_recipe(recipe_path)
+        path = os.path.join(directory, record.checksum, record.name)
+        if os.path.exists(path):
+            return path, record.checksum
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        partial_path = path + '.part'
+
+        try:
+            # No modification time, the same recipe gives the same bytes
+            with open(partial_path, 'wb') as package_file:
+                output = gzip.GzipFile(
+                    record.name, 'wb', PACKAGE_COMPRESS_LEVEL, package_file, mtime=0)
+                try:
+                    for checksum, size in record.chunks:
+                        for data in self._read_chunk(checksum, size):
+                            output.write(data)
+                    # End of archive
+                    output.write(b'\0' * 2 * _TAR_BLOCK_SIZE)
+                finally:
+                    output.close()
+        except Exception:
+            os.remove(partial_path)
+            raise
+
+        os.rename(partial_path, path)
+        return path, record.checksum
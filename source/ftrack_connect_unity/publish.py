@@ -0,0 +1,159 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+The ftrack side of a publish, once Unity has produced the artifacts: asset
+version creation, component creation and task status update. Used by the
+publish dialog and by the headless publish script.
+"""
+
+import logging
+import os
+
+import ftrack
+from ftrack_connector_legacy import connector as ftrack_connector
+
+from ftrack_connect_unity import frame_verification
+
+_logger = logging.getLogger(__name__)
+
+TASK_OBJECT_TYPE_ID = '11c137c0-ee7e-4f9c-91c5-8c77cec22b2c'
+
+
+class PublishError(Exception):
+    '''
+    A publish could not go through. *subject* summarizes the problem,
+    *warning* tells whether it is an input problem rather than a failure.
+    '''
+    def __init__(self, subject, message, warning=True):
+        super(PublishError, self).__init__(message)
+        self.subject = subject
+        self.message = message
+        self.warning = warning
+
+
+def publish_asset(connector, publish_args, task_id, shot, asset_name,
+                  asset_type, status=None, comment='', options=None,
+                  progress=None):
+    '''
+    Publish the artifacts described by *publish_args* (as reported by Unity)
+    as a new version of the *asset_name* asset of type *asset_type* under
+    *shot*, from the task *task_id*, then set the task *status* (a status
+    name) if given. *progress* is called with a percentage as the publish
+    goes.
+
+    Return the message of the asset type publish. Raise PublishError when
+    the publish cannot go through.
+    '''
+    options = options or {}
+    progress = progress or (lambda value: None)
+
+    # Check for failure first
+    if publish_args['success'] == False:
+        raise PublishError('Publish failed', publish_args['error_msg'])
+
+    if asset_name == '':
+        raise PublishError('Missing assetName', 'assetName can not be blank')
+
+    prePubObj = ftrack_connector.FTAssetObject(
+        options=options, taskId=task_id
+    )
+
+    result, message = connector.prePublish(prePubObj)
+    if not result:
+        raise PublishError('Prepublish failed', message)
+
+    progress(50)
+
+    # Bad frames must not make it to a version
+    verification = None
+    if (publish_args.get('image_path') and
+            os.environ.get('FS') and os.environ.get('FE')):
+        verification = frame_verification.verify_sequence(
+            publish_args['image_path'], publish_args.get('image_ext'),
+            os.environ['FS'], os.environ['FE'])
+        if verification.errors:
+            raise PublishError(
+                'Invalid frames', verification.describe_errors(), warning=False)
+
+    asset = shot.createAsset(asset_name, asset_type)
+
+    assetVersion = asset.createVersion(comment=comment, taskid=task_id)
+
+    # Get version that is in project
+    # given the name and type of asset
+    # Note: Don't need to do this for image sequences
+    if asset_type != "img":
+        oldAssetVersion = connector.getAsset(asset_name, asset_type, task_id)
+        if not oldAssetVersion:
+            raise PublishError(
+                'Publish failed',
+                'Publish failed: Selected asset not in project',
+                warning=False)
+
+        # copy over used versions and components
+        usesVersions = list(oldAssetVersion.usesVersions())
+        usesVersions.append(oldAssetVersion)
+        assetVersion.addUsesVersions(usesVersions)
+
+        oldComponents = oldAssetVersion.getComponents()
+        for oldComp in oldComponents:
+            compName = oldComp.getName()
+            if compName == 'thumbnail' or compName == 'ftrackreview-mp4':
+                continue
+            filePath = oldComp.getFilesystemPath()
+            assetVersion.createComponent(
+                name=compName,
+                path=(filePath if filePath else ''))
+
+    pubObj = ftrack_connector.FTAssetObject(
+        assetVersionId=assetVersion.getId(),
+        options=options
+    )
+    _logger.info('pubObj' + str(pubObj))
+    publishedComponents, message = connector.publishAsset(
+        publish_args, pubObj)
+
+    if publishedComponents:
+        for ftComponent in publishedComponents:
+            path = ftComponent.path
+            compName = ftComponent.componentname
+            try:
+                # TODO: find a better way to check if this is a reviewable
+                if "reviewable" in compName:
+                    ftrack.Review.makeReviewable(assetVersion, path)
+                else:
+                    component = assetVersion.createComponent(
+                        name=compName, path=path)
+                    if compName == 'image_sequence' and verification:
+                        component.setMeta(verification.metadata())
+            except Exception as error:
+                _logger.error(str(error))
+        assetVersion.publish()
+
+        # Imported components of this asset are now out of date
+        connector.invalidateVersionStatus()
+
+    if status:
+        set_task_status(task_id, status)
+
+    return message
+
+
+def set_task_status(task_id, status):
+    '''Set the status named *status* on *task_id*, if it is a task'''
+    ftTask = ftrack.Task(id=task_id)
+    if not ftTask or ftTask.get('object_typeid') != TASK_OBJECT_TYPE_ID:
+        return
+
+    for taskStatus in ftrack.getTaskStatuses():
+        if (
+            taskStatus.getName() == status and
+            taskStatus.get('statusid') != ftTask.get('statusid')
+        ):
+            try:
+                ftTask.setStatus(taskStatus)
+            except Exception as error:
+                _logger.warning('Could not set the task status: {0}'.format(error))
+
+            break
@@ -0,0 +1,185 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+In-memory substring search over many short texts (asset names, types and
+paths).
+
+Every text is indexed by its trigrams (lower cased), each trigram holding
+the compact array of the documents it appears in. A query of three
+characters or more only looks at the documents of its rarest trigrams and
+checks the substring on these candidates only. Shorter queries are answered
+from the trigrams containing them, or by checking every text when they are
+too common.
+
+Removing a key only marks its document dead; the postings are rebuilt once
+the dead documents make up a good part of the index.
+"""
+
+import array
+import threading
+
+# Joins the texts of a key, never part of a query
+_SEPARATOR = '\n'
+
+# Postings larger than this many times the rarest one are not intersected,
+# checking the substring on the candidates is cheaper
+INTERSECT_RATIO = 8
+
+# Fraction of dead documents triggering a rebuild of the postings
+COMPACT_RATIO = 0.25
+
+
+def trigrams(text):
+    '''Return the set of the trigrams of *text*'''
+    return set(text[index:index + 3] for index in range(len(text) - 2))
+
+
+class TrigramIndex(object):
+    '''Index of the texts of keys, see search'''
+    def __init__(self):
+        # key -> document
+        self._documents = {}
+        # document -> key, joined texts as given and lower cased; None once
+        # the document is dead
+        self._keys = []
+        self._texts = []
+        self._lowered = []
+        self._dead = 0
+        # trigram -> array of documents, ascending
+        self._postings = {}
+        # Documents too short to hold a trigram
+        self._short_documents = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, key):
+        return key in self._documents
+
+    def add(self, key, texts):
+        '''Index *key* under *texts*, replacing what it was indexed under'''
+        text = _SEPARATOR.join(text for text in texts if text)
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                if self._texts[document] == text:
+                    return
+                self._kill(document)
+            self._add(key, text)
+            self._maybe_compact()
+
+    def _add(self, key, text):
+        document = len(self._keys)
+        lowered = text.lower()
+        self._documents[key] = document
+        self._keys.append(key)
+        self._texts.append(text)
+        self._lowered.append(lowered)
+
+        if len(lowered) < 3:
+            self._short_documents.add(document)
+
+        postings = self._postings
+        for trigram in trigrams(lowered):
+            documents = postings.get(trigram)
+            if documents is None:
+                postings[trigram] = array.array('i', [document])
+            else:
+                documents.append(document)
+
+    def remove(self, key):
+        with self._lock:
+            document = self._documents.pop(key, None)
+            if document is not None:
+                self._kill(document)
+                self._maybe_compact()
+
+    def _kill(self, document):
+        self._documents.pop(self._keys[document], None)
+        self._keys[document] = None
+        self._texts[document] = None
+        self._lowered[document] = None
+        self._short_documents.discard(document)
+        self._dead += 1
+
+    def _maybe_compact(self):
+        if self._dead <= COMPACT_RATIO * len(self._keys):
+            return
+
+        live = [
+            (key, text) for key, text in zip(self._keys, self._texts)
+            if key is not None
+        ]
+        self._clear()
+        for key, text in live:
+            self._add(key, text)
+
+    def _clear(self):
+        self._documents = {}
+        self._keys = []
+        self._texts = []
+        self._lowered = []
+        self._dead = 0
+        self._postings = {}
+        self._short_documents = set()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def search(self, query, case_sensitive=False):
+        '''Return the set of the keys with a text containing *query*'''
+        with self._lock:
+            if not query:
+                return set(self._documents)
+
+            lowered_query = query.lower()
+            texts = self._texts if case_sensitive else self._lowered
+            needle = query if case_sensitive else lowered_query
+
+            if len(lowered_query) < 3:
+                postings = [
+                    documents for trigram, documents in self._postings.items()
+                    if lowered_query in trigram
+                ]
+                if sum(len(documents) for documents in postings) < len(texts):
+                    candidates = set(self._short_documents)
+                    for documents in postings:
+                        candidates.update(documents)
+                    exact = not case_sensitive and not self._short_documents
+                else:
+                    # Common characters, cheaper to check every text
+                    candidates = range(len(texts))
+                    exact = False
+            else:
+                postings = []
+                for trigram in trigrams(lowered_query):
+                    documents = self._postings.get(trigram)
+                    if documents is None:
+                        return set()
+                    postings.append(documents)
+                postings.sort(key=len)
+
+                candidates = set(postings[0])
+                for documents in postings[1:]:
+                    if len(documents) > INTERSECT_RATIO * len(candidates):
+                        break
+                    candidates.intersection_update(documents)
+                exact = not case_sensitive and len(lowered_query) == 3
+
+            keys = self._keys
+            if exact:
+                # Dead documents stay in the postings until compacted, their
+                # key is None
+                result = set(keys[document] for document in candidates)
+                result.discard(None)
+                return result
+
+            result = set()
+            for document in candidates:
+                text = texts[document]
+                if text is not None and needle in text:
+                    result.add(keys[document])
+            return result
@@ -0,0 +1,23 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+import threading
+
+import ftrack_api
+
+_local = threading.local()
+
+
+def get_shared_session():
+    '''
+    Return the ftrack_api session of the calling thread.
+
+    Creating a session is expensive (it fetches the server schemas) and
+    sessions are not thread safe, so each thread creates one the first time
+    it needs it and reuses it afterwards.
+    '''
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = ftrack_api.Session(auto_connect_event_hub=False)
+        _local.session = session
+    return session
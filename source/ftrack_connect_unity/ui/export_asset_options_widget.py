@@ -4,15 +4,23 @@
 import os
 import getpass
 import logging
+import functools
 
 from QtExt import QtCore, QtWidgets, QtGui
 
 import ftrack
 from ftrack_connector_legacy.connector import FTAssetHandlerInstance
 from ftrack_connect_unity.connector.unity_connector import Connector
+from ftrack_connect_unity import context_data
 
 logger = logging.getLogger(__name__)
 
+# Object type id of tasks, the only contexts with a status
+TASK_OBJECT_TYPE_ID = '11c137c0-ee7e-4f9c-91c5-8c77cec22b2c'
+
+# Number of existing assets added to the model per event loop iteration
+POPULATE_CHUNK_SIZE = 200
+
 
 class Ui_ExportAssetOptions(object):
     def setupUi(self, ExportAssetOptions):
@@ -149,6 +157,8 @@ class Ui_ExportAssetOptions(object):
 class ExportAssetOptionsWidget(QtWidgets.QWidget):
     clickedAssetSignal = QtCore.Signal(str)
     clickedAssetTypeSignal = QtCore.Signal(str)
+    # (fetch token, context_data.fetch_publish_context result or None)
+    contextFetchedSignal = QtCore.Signal(int, object)
 
     supported_asset = 'img'
 
@@ -159,6 +169,12 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
         self.currentAssetType = None
         self.currentTask = None
         self.browseMode = browseMode
+        # Bumped by updateView, results of older fetches are dropped
+        self._fetchToken = 0
+        # The queued fetch, cancelled when another context is selected
+        self._fetchRequest = None
+        # Asset name to select once the existing assets are fetched
+        self._pendingAssetName = None
         self.ui.ListAssetsViewModel = QtGui.QStandardItemModel()
 
         self.ui.ListAssetsSortModel = QtCore.QSortFilterProxyModel()
@@ -176,22 +192,28 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
         self.assetTypes.append('')
         self.ui.ListAssetsComboBoxModel.appendRow(assetTypeItem)
 
-        assetHandler = FTAssetHandlerInstance.instance()
-        self.assetTypesStr = sorted(assetHandler.getAssetTypes())
-
-        # filter out only img
-        self.assetTypesStr = [fmt for fmt in self.assetTypesStr if fmt==self.supported_asset]
+        self.assetTypesStr = self.publishAssetTypes()
 
+        # A single query for the names of all the asset types, usually
+        # prefetched at startup
+        try:
+            assetTypeNames = context_data.get_asset_type_names()
+        except Exception as error:
+            logger.warning('Could not fetch the asset types: {0}'.format(error))
+            assetTypeNames = {}
         for assetTypeStr in self.assetTypesStr:
-            try:
-                assetType = ftrack.AssetType(assetTypeStr)
-            except:
-                logger.warning(
-                    '{0} not supported in ftrack'.format(assetTypeStr)
-                )
-                continue
-            assetTypeItem = QtGui.QStandardItem(assetType.getName())
-            assetTypeItem.type = assetType.getShort()
+            assetTypeName = assetTypeNames.get(assetTypeStr)
+            if assetTypeName is None:
+                try:
+                    assetType = ftrack.AssetType(assetTypeStr)
+                except:
+                    logger.warning(
+                        '{0} not supported in ftrack'.format(assetTypeStr)
+                    )
+                    continue
+                assetTypeName = assetType.getName()
+            assetTypeItem = QtGui.QStandardItem(assetTypeName)
+            assetTypeItem.type = assetTypeStr
             self.assetTypes.append(assetTypeItem.type)
             self.ui.ListAssetsComboBoxModel.appendRow(assetTypeItem)
 
@@ -203,11 +225,21 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
         self.ui.ListAssetNamesComboBox.currentIndexChanged[str].connect(
             self.onAssetChanged
         )
+        self.contextFetchedSignal.connect(self._onContextFetched)
 
         if browseMode == 'Task':
             self.ui.AssetTaskComboBox.hide()
             self.ui.assetTaskLabel.hide()
 
+    @classmethod
+    def publishAssetTypes(cls):
+        '''Return the registered asset types which can be published'''
+        assetHandler = FTAssetHandlerInstance.instance()
+        assetTypesStr = sorted(assetHandler.getAssetTypes())
+
+        # filter out only img
+        return [fmt for fmt in assetTypesStr if fmt==cls.supported_asset]
+
     def onAssetChanged(self, asset_name):
         '''Hanldes the asset name logic on asset change'''
         if asset_name != 'New':
@@ -219,31 +251,20 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
 
     @QtCore.Slot(object)
     def updateView(self, ftrackEntity):
-        '''Update view with the provided *ftrackEntity*'''
+        '''
+        Update view with the provided *ftrackEntity*. The statuses and existing
+        assets are fetched in the background and added once available.
+        '''
         try:
             self.currentTask = ftrackEntity
-            project = self.currentTask.getProject()
-            taskid = '11c137c0-ee7e-4f9c-91c5-8c77cec22b2c'
-            # Populate statuses based on task if it is a task.
-            if self.currentTask.get('object_typeid') == taskid:
-                self.ui.ListStatusComboBox.show()
-                self.ui.assetTaskLabel_2.show()
-                self.ui.ListStatusComboBox.clear()
-                statuses = project.getTaskStatuses(
-                    self.currentTask.get('typeid')
-                )
-                for index, status, in enumerate(statuses):
-                    self.ui.ListStatusComboBox.addItem(status.getName())
-                    if status.get('statusid') == self.currentTask.get('statusid'):
-                        self.ui.ListStatusComboBox.setCurrentIndex(index)
-            else:
-                self.ui.ListStatusComboBox.hide()
-                self.ui.assetTaskLabel_2.hide()
+            self._fetchToken += 1
+            isTask = self.currentTask.get('object_typeid') == TASK_OBJECT_TYPE_ID
 
-            assets = self.currentTask.getAssets(assetTypes=self.assetTypesStr)
-            assets = sorted(assets, key=lambda a: a.getName().lower())
-            self.ui.ListAssetsViewModel.clear()
+            self.ui.ListStatusComboBox.clear()
+            self.ui.ListStatusComboBox.setVisible(isTask)
+            self.ui.assetTaskLabel_2.setVisible(isTask)
 
+            self.ui.ListAssetsViewModel.clear()
             item = QtGui.QStandardItem('New')
             item.id = ''
             curAssetType = self.currentAssetType
@@ -253,28 +274,54 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
                 itemType = QtGui.QStandardItem('')
             self.ui.ListAssetsViewModel.setItem(0, 0, item)
             self.ui.ListAssetsViewModel.setItem(0, 1, itemType)
-
-            blankRows = 0
-            for i in range(0, len(assets)):
-                assetName = assets[i].getName()
-                if assetName != '':
-                    item = QtGui.QStandardItem(assetName)
-                    item.id = assets[i].getId()
-                    itemType = QtGui.QStandardItem(
-                        assets[i].getType().getShort()
-                    )
-
-                    j = i - blankRows + 1
-                    self.ui.ListAssetsViewModel.setItem(j, 0, item)
-                    self.ui.ListAssetsViewModel.setItem(j, 1, itemType)
-                else:
-                    blankRows += 1
             self.ui.ListAssetNamesComboBox.setCurrentIndex(0)
+
+            self._fetchRequest = context_data.request_publish_context(
+                self.currentTask.getId(), isTask, self.assetTypesStr,
+                functools.partial(self.contextFetchedSignal.emit, self._fetchToken),
+                supersedes=self._fetchRequest)
         except:
             import traceback
             import sys
             traceback.print_exc(file=sys.stdout)
 
+    @QtCore.Slot(int, object)
+    def _onContextFetched(self, token, data):
+        if token != self._fetchToken or data is None:
+            return
+
+        for index, (statusId, statusName) in enumerate(data['statuses']):
+            self.ui.ListStatusComboBox.addItem(statusName)
+            if statusId == data['statusId']:
+                self.ui.ListStatusComboBox.setCurrentIndex(index)
+
+        assets = [asset for asset in data['assets'] if asset[1] != '']
+        self._populateAssets(token, assets, 0)
+
+    def _populateAssets(self, token, assets, start):
+        '''
+        Add *assets* to the model from *start*, a chunk per event loop
+        iteration so large contexts do not freeze the dialog
+        '''
+        if token != self._fetchToken:
+            return
+
+        end = min(start + POPULATE_CHUNK_SIZE, len(assets))
+        for row, (assetId, assetName, assetType) in enumerate(
+                assets[start:end], start + 1):
+            item = QtGui.QStandardItem(assetName)
+            item.id = assetId
+            self.ui.ListAssetsViewModel.setItem(row, 0, item)
+            self.ui.ListAssetsViewModel.setItem(
+                row, 1, QtGui.QStandardItem(assetType))
+
+        if end < len(assets):
+            QtCore.QTimer.singleShot(
+                0, lambda: self._populateAssets(token, assets, end))
+        elif self._pendingAssetName:
+            self.setAssetName(self._pendingAssetName)
+            self._pendingAssetName = None
+
     @QtCore.Slot(QtCore.QModelIndex)
     def emitAssetId(self, modelindex):
         '''Signal for emitting changes on the assetId for the give *modelIndex*'''
@@ -327,6 +374,8 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
 
         if not existingAssetFound:
             self.ui.AssetNameLineEdit.setText(assetName)
+        # The existing assets may still be fetching, try again once they are
+        self._pendingAssetName = None if existingAssetFound else assetName
 
     def getAssetType(self):
         '''Return the current asset type'''
@@ -337,17 +386,11 @@ class ExportAssetOptionsWidget(QtWidgets.QWidget):
         '''Update task with the provided *ftrackEntity*'''
         self.currentTask = ftrackEntity
         try:
-            shotpath = self.currentTask.getName()
-            taskParents = self.currentTask.getParents()
-
-            for parent in taskParents:
-                shotpath = '{0}.{1}'.format(parent.getName(), shotpath)
-
             self.ui.AssetTaskComboBox.clear()
             tasks = self.currentTask.getTasks()
             curIndex = 0
-            ftrackuser = ftrack.User(getpass.getuser())
-            taskids = [x.getId() for x in ftrackuser.getTasks()]
+            taskids = context_data.fetch_assigned_task_ids(
+                self.currentTask.getId(), getpass.getuser())
 
             for i in range(len(tasks)):
                 assetTaskItem = QtGui.QStandardItem(tasks[i].getName())
@@ -9,6 +9,42 @@ import ftrack
 from ftrack_connector_legacy.ui.widget.stacked_options import StackedOptionsWidget
 from ftrack_connector_legacy import connector as ftrack_connector
 
+# Options XML per asset type registry state, see ExportOptionsWidget.getXml
+_xmlCache = {}
+
+
+def _snapshotWidgets(root):
+    '''
+    Return the values of the option widgets under *root* as a list of
+    (widget, value) tuples, see _restoreWidgets
+    '''
+    snapshot = []
+    for widget in root.findChildren(QtWidgets.QAbstractButton):
+        if widget.isCheckable():
+            snapshot.append((widget, widget.isChecked()))
+    for widget in root.findChildren(QtWidgets.QLineEdit):
+        snapshot.append((widget, widget.text()))
+    for widget in root.findChildren(QtWidgets.QComboBox):
+        snapshot.append((widget, widget.currentIndex()))
+    for widget in root.findChildren(QtWidgets.QSpinBox):
+        snapshot.append((widget, widget.value()))
+    for widget in root.findChildren(QtWidgets.QDoubleSpinBox):
+        snapshot.append((widget, widget.value()))
+    return snapshot
+
+
+def _restoreWidgets(snapshot):
+    '''Set the widgets back to the values of *snapshot*'''
+    for widget, value in snapshot:
+        if isinstance(widget, QtWidgets.QAbstractButton):
+            widget.setChecked(value)
+        elif isinstance(widget, QtWidgets.QLineEdit):
+            widget.setText(value)
+        elif isinstance(widget, QtWidgets.QComboBox):
+            widget.setCurrentIndex(value)
+        else:
+            widget.setValue(value)
+
 
 class Ui_ExportOptions(object):
     def setupUi(self, ExportOptions):
@@ -91,13 +127,29 @@ class ExportOptionsWidget(QtWidgets.QWidget):
             self, connector=connector
         )
 
-        xml = self.getXml()
+        self._xml = self.getXml()
 
-        self.stackedOptionsWidget.initStackedOptions(xml)
+        self.stackedOptionsWidget.initStackedOptions(self._xml)
+        self._defaults = _snapshotWidgets(self.stackedOptionsWidget)
         self.ui.optionsPlaceHolderLayout.addWidget(self.stackedOptionsWidget)
         self.ui.progressBar.hide()
 
     def getXml(self):
+        '''
+        Return the options XML of the registered asset types. It only
+        changes when asset types are registered, so it is built once per
+        registry state.
+        '''
+        assetHandler = ftrack_connector.FTAssetHandlerInstance.instance()
+        registryKey = tuple(
+            (assetTypeStr, assetHandler.getAssetClass(assetTypeStr))
+            for assetTypeStr in sorted(assetHandler.getAssetTypes())
+        )
+        if registryKey not in _xmlCache:
+            _xmlCache[registryKey] = self._buildXml()
+        return _xmlCache[registryKey]
+
+    def _buildXml(self):
         xml = """<?xml version="1.0" encoding="UTF-8" ?>
         <options>
             <assettype name="default">
@@ -122,9 +174,22 @@ class ExportOptionsWidget(QtWidgets.QWidget):
         return xml
 
     def resetOptions(self):
-        '''Reset IO options'''
+        '''
+        Reset IO options. The option pages are only rebuilt when the asset
+        types changed, otherwise their default values are restored in place.
+        '''
         xml = self.getXml()
+        if xml == self._xml:
+            try:
+                _restoreWidgets(self._defaults)
+                return
+            except RuntimeError:
+                # A page widget was deleted underneath us, rebuild them
+                pass
+
+        self._xml = xml
         self.stackedOptionsWidget.resetOptions(xml)
+        self._defaults = _snapshotWidgets(self.stackedOptionsWidget)
 
     @QtCore.Slot(str)
     def setStackedWidget(self, stackName):
@@ -21,6 +21,7 @@ from ftrack_connector_legacy.ui.widget.context_selector import ContextSelector
 from ftrack_connect_unity.ui.export_asset_options_widget import ExportAssetOptionsWidget
 from ftrack_connect_unity.ui.export_options_widget import ExportOptionsWidget
 from ftrack_connect_unity.connector.unity_connector import Connector, GetUnityEditor
+from ftrack_connect_unity.publish import publish_asset, PublishError
 
 
 class FtrackPublishDialog(QtWidgets.QDialog):
@@ -38,7 +39,7 @@ class FtrackPublishDialog(QtWidgets.QDialog):
         self.logger = logging.getLogger(
             __name__ + '.' + self.__class__.__name__
         )
-        self.currentEntity = Connector.getCurrentEntity()
+        self.currentEntity = self.connector.getCurrentEntity()
 
         super(FtrackPublishDialog, self).__init__(self.parent)
         self.setSizePolicy(
@@ -213,116 +214,33 @@ class FtrackPublishDialog(QtWidgets.QDialog):
         self.exportOptionsWidget.setProgress(25)
 
     def publishAsset(self, publish_args):
-        # Check for failure first
-        if publish_args['success'] == False:
-            self.showWarning('Publish failed', publish_args['error_msg'])
-            self.exportOptionsWidget.setProgress(100)
-            return
-
         task = self.exportAssetOptionsWidget.getTask()
-        taskId = task.getId()
-        shot = self.exportAssetOptionsWidget.getShot()
-
-        assettype = self.exportAssetOptionsWidget.getAssetType()
-        assetName = self.exportAssetOptionsWidget.getAssetName()
-        status = self.exportAssetOptionsWidget.getStatus()
-
-        comment = self.exportOptionsWidget.getComment()
-        options = self.exportOptionsWidget.getOptions()
-
-        if assetName == '':
-            self.showWarning('Missing assetName', 'assetName can not be blank')
-            return
-
-        prePubObj = ftrack_connector.FTAssetObject(
-            options=options, taskId=taskId
-        )
-
-        result, message = self.connector.prePublish(prePubObj)
-
-        if not result:
-            self.showWarning('Prepublish failed', message)
-            return
-
-        self.exportOptionsWidget.setProgress(50)
-        asset = shot.createAsset(assetName, assettype)
-
-        assetVersion = asset.createVersion(comment=comment, taskid=taskId)
-
-        # Get version that is in project
-        # given the name and type of asset
-        # Note: Don't need to do this for image sequences
-        if assettype != "img":
-            oldAssetVersion = Connector.getAsset(assetName, assettype, taskId)
-            if not oldAssetVersion:
-                self.showError("Publish failed: Selected asset not in project")
-                return
-
-            # copy over used versions and components
-            usesVersions = list(oldAssetVersion.usesVersions())
-            usesVersions.append(oldAssetVersion)
-            assetVersion.addUsesVersions(usesVersions)
-
-            oldComponents = oldAssetVersion.getComponents()
-            for oldComp in oldComponents:
-                compName = oldComp.getName()
-                if compName == 'thumbnail' or compName == 'ftrackreview-mp4':
-                    continue
-                filePath = oldComp.getFilesystemPath()
-                assetVersion.createComponent(
-                    name=compName,
-                    path=(filePath if filePath else ''))
-
-        pubObj = ftrack_connector.FTAssetObject(
-            assetVersionId=assetVersion.getId(),
-            options=options
-        )
         try:
-            self.logger.info('pubObj' + str(pubObj))
-            publishedComponents, message = self.connector.publishAsset(
-                publish_args, pubObj)
+            message = publish_asset(
+                self.connector,
+                publish_args,
+                task.getId() if task else None,
+                self.exportAssetOptionsWidget.getShot(),
+                self.exportAssetOptionsWidget.getAssetName(),
+                self.exportAssetOptionsWidget.getAssetType(),
+                status=self.exportAssetOptionsWidget.getStatus(),
+                comment=self.exportOptionsWidget.getComment(),
+                options=self.exportOptionsWidget.getOptions(),
+                progress=self.exportOptionsWidget.setProgress
+            )
+        except PublishError as error:
+            if error.warning:
+                self.showWarning(error.subject, error.message)
+            else:
+                self.showError(error.message)
+            if not publish_args['success']:
+                self.exportOptionsWidget.setProgress(100)
+            return
         except:
             self.exportOptionsWidget.setProgress(100)
             self.showError('Publish failed. Please check the console.')
             raise
 
-        if publishedComponents:
-            session = ftrack_api.Session()
-            for componentNumber, ftComponent in enumerate(publishedComponents):
-                path = ftComponent.path
-                compName = ftComponent.componentname
-                location = Connector.pickLocation(copyFiles=True)
-                try:
-                    # TODO: find a better way to check if this is a reviewable
-                    if "reviewable" in compName:
-                        ftrack.Review.makeReviewable(assetVersion, path)
-                    else:
-                        assetVersion.createComponent(
-                            name=compName, path=path)
-                except Exception as error:
-                    self.logger.error(str(error))
-            assetVersion.publish()
-        else:
-            self.exportOptionsWidget.setProgress(100)
-
-        # Update status of task.
-        ftTask = ftrack.Task(id=taskId)
-        if (
-            ftTask and
-            ftTask.get('object_typeid') == '11c137c0-ee7e-4f9c-91c5-8c77cec22b2c'
-        ):
-            for taskStatus in ftrack.getTaskStatuses():
-                if (
-                    taskStatus.getName() == status and
-                    taskStatus.get('statusid') != ftTask.get('statusid')
-                ):
-                    try:
-                        ftTask.setStatus(taskStatus)
-                    except Exception, error:
-                        print 'warning: {0}'.format(error)
-
-                    break
-
         self.headerWidget.setMessage(message, 'info')
         self.exportOptionsWidget.setComment('')
         self.resetOptions()
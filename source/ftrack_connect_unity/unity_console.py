@@ -0,0 +1,174 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Forwarding of log messages to the Unity console.
+
+Every Debug.Log* call is a round trip to Unity, so messages are buffered,
+identical ones are coalesced and the buffer is flushed from the client main
+loop with at most one call per severity, under a rate limit.
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+from rpyc import async_
+
+# Name of the logger whose messages end up in the Unity console
+LOGGER_NAME = 'ftrack_connect_unity.unity_console'
+
+# Not LOGGER_NAME, whose records are forwarded to Unity
+_logger = logging.getLogger('ftrack_connect_unity')
+
+# Minimum time between two flushes, in seconds
+FLUSH_INTERVAL = 0.5
+
+# Messages forwarded per flush at most (FTRACK_UNITY_CONSOLE_MAX_MESSAGES),
+# the others wait for the next flush
+DEFAULT_MAX_MESSAGES_PER_FLUSH = 20
+
+
+def _max_messages_per_flush():
+    value = os.environ.get(
+        'FTRACK_UNITY_CONSOLE_MAX_MESSAGES', DEFAULT_MAX_MESSAGES_PER_FLUSH)
+    try:
+        max_messages = int(value)
+        if max_messages > 0:
+            return max_messages
+    except ValueError:
+        pass
+    _logger.warning(
+        'Ignoring FTRACK_UNITY_CONSOLE_MAX_MESSAGES={0}, not a positive '
+        'number, using {1}'.format(value, DEFAULT_MAX_MESSAGES_PER_FLUSH))
+    return DEFAULT_MAX_MESSAGES_PER_FLUSH
+
+
+MAX_MESSAGES_PER_FLUSH = _max_messages_per_flush()
+
+# Messages kept waiting at most, the least severe are dropped first
+MAX_BUFFERED_MESSAGES = 1000
+
+# Debug method used for the records at or above each level
+_SEVERITIES = (
+    (logging.ERROR, 'LogError'),
+    (logging.WARNING, 'LogWarning'),
+    (logging.NOTSET, 'Log'),
+)
+
+_SEVERITY_ORDER = [method for _, method in _SEVERITIES]
+
+
+def _debug_method(levelno):
+    for level, method in _SEVERITIES:
+        if levelno >= level:
+            return method
+
+
+class UnityConsoleHandler(logging.Handler):
+    '''
+    Logging handler forwarding records to the Unity console. *get_debug*
+    returns the UnityEngine.Debug class; it is only called from flush, which
+    must run on the thread owning the connection to Unity.
+    '''
+    def __init__(self, get_debug, level=logging.NOTSET,
+                 flush_interval=FLUSH_INTERVAL,
+                 max_messages=MAX_MESSAGES_PER_FLUSH):
+        super(UnityConsoleHandler, self).__init__(level)
+        self._get_debug = get_debug
+        self._flush_interval = flush_interval
+        self._max_messages = max_messages
+        # (debug method, message) -> number of occurrences
+        self._buffer = collections.OrderedDict()
+        self._dropped = 0
+        self._last_flush = 0.0
+        self._buffer_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            key = (_debug_method(record.levelno), self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+
+        with self._buffer_lock:
+            if key in self._buffer:
+                self._buffer[key] += 1
+                return
+            if len(self._buffer) >= MAX_BUFFERED_MESSAGES:
+                self._drop_least_severe()
+            self._buffer[key] = 1
+
+    def _drop_least_severe(self):
+        for _, method in reversed(_SEVERITIES):
+            for key in self._buffer:
+                if key[0] == method:
+                    del self._buffer[key]
+                    self._dropped += 1
+                    return
+
+    def flush(self, force=False):
+        '''
+        Forward the buffered messages to Unity, unless the last flush was
+        less than the flush interval ago (and not *force*)
+        '''
+        now = time.time()
+        if not force and now - self._last_flush < self._flush_interval:
+            return
+        self._last_flush = now
+
+        with self._buffer_lock:
+            if not self._buffer:
+                return
+            # Most severe first, in order of arrival: errors are not held
+            # back by earlier warnings when there are more than max_messages
+            batch = sorted(
+                self._buffer.items(),
+                key=lambda item: _SEVERITY_ORDER.index(item[0][0])
+            )[:self._max_messages]
+            dropped = self._dropped
+
+        messages = collections.OrderedDict()
+        for (method, message), count in batch:
+            if count > 1:
+                message = '{0} (repeated {1} times)'.format(message, count)
+            messages.setdefault(method, []).append(message)
+        if dropped:
+            messages.setdefault('LogWarning', []).append(
+                'ftrack: {0} messages were not shown, see the ftrack log'.format(dropped))
+
+        try:
+            debug = self._get_debug()
+            for method, lines in messages.items():
+                async_(getattr(debug, method))('\n'.join(lines))
+        except Exception:
+            # Unity is unreachable (e.g. domain reload), try again later
+            return
+
+        with self._buffer_lock:
+            for key, count in batch:
+                remaining = self._buffer.pop(key, count) - count
+                if remaining > 0:
+                    self._buffer[key] = remaining
+            self._dropped -= dropped
+
+    def close(self):
+        try:
+            self.flush(force=True)
+        finally:
+            super(UnityConsoleHandler, self).close()
+
+
+def install(get_debug):
+    '''
+    Forward the records of the LOGGER_NAME logger to Unity through a
+    UnityConsoleHandler, and return the handler. The records are not
+    propagated further, callers already log them to the ftrack log.
+    '''
+    handler = UnityConsoleHandler(get_debug)
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    logger.propagate = False
+    return handler
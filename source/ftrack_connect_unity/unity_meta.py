@@ -0,0 +1,137 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+"""
+Minimal reader for the Unity .meta files, enough to find the asset guid
+and the ftrack metadata the connector stores in the importer userData.
+
+.meta files are YAML, and both values are scalars at known places, so
+searching for their keys is enough and much cheaper than a YAML parser.
+Unity folds long quoted scalars (such as the ftrack metadata) onto indented
+continuation lines, which are joined back following the YAML folding rules.
+"""
+
+import json
+import re
+
+# Key the connector always writes in the ftrack metadata
+FTRACK_METADATA_KEY = 'ftrack_connect_unity_version'
+
+_GUID = re.compile(r'^guid:(.*)$', re.MULTILINE)
+_USER_DATA = re.compile(r'^([ \t]*)userData:[ \t]*', re.MULTILINE)
+
+
+def _scalar(value):
+    '''Return the single line YAML scalar *value* unquoted'''
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] == "'":
+        return value[1:-1].replace("''", "'")
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        return json.loads(value)
+    return value
+
+
+def _fold(lines, escapes=False):
+    '''
+    Join the *lines* of a multi line YAML scalar: a line break becomes a
+    space and each empty line a line break. With *escapes* (double quoted
+    scalars), a line ending with a backslash joins the next one directly.
+    '''
+    folded = lines[0].rstrip(' \t')
+    line_breaks = 0
+    escaped = False
+    for line in lines[1:]:
+        line = line.strip(' \t')
+        if not line:
+            line_breaks += 1
+            continue
+        if escapes and folded.endswith('\\') and (
+                len(folded) - len(folded.rstrip('\\'))) % 2:
+            folded = folded[:-1]
+            escaped = True
+        if line_breaks:
+            folded += '\n' * line_breaks
+        elif not escaped:
+            folded += ' '
+        folded += line
+        line_breaks = 0
+        escaped = False
+    if line_breaks:
+        folded += ' '
+    return folded
+
+
+def _read_scalar(text, position, indentation):
+    '''
+    Return the YAML scalar of *text* at *position*, the value of a key
+    indented by *indentation* characters, or None if it is not terminated
+    '''
+    quote = text[position:position + 1]
+    if quote == "'":
+        end = position + 1
+        while True:
+            end = text.find("'", end)
+            if end < 0:
+                return None
+            if text[end + 1:end + 2] != "'":
+                break
+            end += 2
+        lines = text[position + 1:end].replace('\r', '').split('\n')
+        return _fold(lines).replace("''", "'")
+
+    if quote == '"':
+        end = position + 1
+        while True:
+            end = text.find('"', end)
+            if end < 0:
+                return None
+            backslash = end
+            while text[backslash - 1] == '\\':
+                backslash -= 1
+            if not (end - backslash) % 2:
+                break
+            end += 1
+        lines = text[position + 1:end].replace('\r', '').split('\n')
+        return json.loads('"{0}"'.format(_fold(lines, escapes=True)), strict=False)
+
+    # Plain scalar, continued on the lines indented deeper than its key
+    lines = []
+    while position < len(text):
+        end = text.find('\n', position)
+        if end < 0:
+            end = len(text)
+        line = text[position:end].rstrip('\r')
+        if lines and line.strip() and (
+                len(line) - len(line.lstrip(' \t')) <= indentation):
+            break
+        lines.append(line)
+        position = end + 1
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return _fold(lines) if lines else ''
+
+
+def read_meta(text):
+    '''
+    Return the (guid, ftrack metadata) of the .meta file content *text*.
+    The metadata is None when the asset does not come from ftrack.
+    '''
+    match = _GUID.search(text)
+    guid = _scalar(match.group(1)) if match else None
+
+    metadata = None
+    # Skip the regular expression for the vast majority of the assets
+    if FTRACK_METADATA_KEY in text:
+        for match in _USER_DATA.finditer(text):
+            try:
+                user_data = _read_scalar(text, match.end(), len(match.group(1)))
+                if not user_data or FTRACK_METADATA_KEY not in user_data:
+                    continue
+                metadata = json.loads(user_data)
+            except ValueError:
+                continue
+            if isinstance(metadata, dict) and metadata.get(FTRACK_METADATA_KEY):
+                break
+            metadata = None
+
+    return guid, metadata
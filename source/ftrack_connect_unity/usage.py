@@ -1,14 +1,53 @@
 # :coding: utf-8
 # :copyright: Copyright (c) 2017 ftrack
 
+import atexit
+import json
+import logging
+import os
+import platform
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import appdirs
+
 import ftrack_connect_unity
-import ftrack_connector_legacy.usage
+from ftrack_connect_unity.session import get_shared_session
 
-import platform
+logger = logging.getLogger(__name__)
+
+# Events sent in a single server call at most
+BATCH_SIZE = 50
+
+# Time given to more events to join a batch, in seconds
+FLUSH_INTERVAL = 2.0
+
+# Time between attempts to replay the spooled events, in seconds
+RETRY_INTERVAL = 300.0
+
+# Events kept on disk while the server is unreachable, oldest dropped first
+MAX_SPOOLED_EVENTS = 1000
+
+SPOOL_PATH = os.path.join(
+    appdirs.user_data_dir('ftrack-connect-unity-engine', 'ftrack'),
+    'usage_spool.json'
+)
+
+_queue = queue.Queue()
+_sender = None
+_sender_lock = threading.Lock()
 
 
 def send_event(event_name, metadata=None):
-    '''Send usage information to server.'''
+    '''
+    Send usage information to server. The event is queued and sent in the
+    background, this never blocks on the network.
+    '''
 
     if metadata is None:
         metadata = {
@@ -16,6 +55,126 @@ def send_event(event_name, metadata=None):
             'ftrack_connect_unity_engine_version': ftrack_connect_unity.__version__
         }
 
-    ftrack_connector_legacy.usage.send_event(
-        event_name, metadata
-    )
+    _queue.put({'name': event_name, 'metadata': metadata})
+    _ensure_sender()
+
+
+def _ensure_sender():
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = UsageSender(_queue, SPOOL_PATH)
+            _sender.start()
+            atexit.register(_sender.spool_pending)
+
+
+def _send_batch(events):
+    '''Send *events* to the server in a single call'''
+    get_shared_session().call([
+        {
+            'action': '_track_usage',
+            'data': {
+                'type': 'event',
+                'name': event['name'],
+                'metadata': event['metadata']
+            }
+        }
+        for event in events
+    ])
+
+
+class UsageSender(threading.Thread):
+    '''
+    Send the events put on *event_queue* in batches. Batches which cannot be
+    sent are written to the *spool_path* file and replayed once the server
+    can be reached again.
+    '''
+    def __init__(self, event_queue, spool_path, send=_send_batch):
+        super(UsageSender, self).__init__(name='ftrack-usage')
+        self.daemon = True
+        self._queue = event_queue
+        self._spool_path = spool_path
+        self._send = send
+        self._spool_lock = threading.Lock()
+        self._last_replay = 0.0
+
+    def run(self):
+        self._replay()
+        while True:
+            try:
+                events = [self._queue.get(timeout=RETRY_INTERVAL)]
+            except queue.Empty:
+                self._replay()
+                continue
+
+            # Give the events fired together a chance to share the call
+            deadline = time.time() + FLUSH_INTERVAL
+            while len(events) < BATCH_SIZE:
+                try:
+                    events.append(
+                        self._queue.get(timeout=max(0, deadline - time.time())))
+                except queue.Empty:
+                    break
+
+            if self._deliver(events) and time.time() - self._last_replay > RETRY_INTERVAL:
+                self._replay()
+
+    def _deliver(self, events):
+        '''Send *events*, spooling them on failure. Return whether they were sent'''
+        try:
+            self._send(events)
+        except Exception as error:
+            logger.debug('Could not send {0} usage events, spooling them: {1}'.format(
+                len(events), error))
+            self._spool(events)
+            return False
+        return True
+
+    def spool_pending(self):
+        '''Write the events still queued to the spool file'''
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            self._spool(events)
+
+    def _read_spool(self):
+        try:
+            with open(self._spool_path) as spool_file:
+                return json.load(spool_file)
+        except (IOError, OSError, ValueError):
+            return []
+
+    def _spool(self, events):
+        with self._spool_lock:
+            spooled = (self._read_spool() + events)[-MAX_SPOOLED_EVENTS:]
+            try:
+                directory = os.path.dirname(self._spool_path)
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(self._spool_path, 'w') as spool_file:
+                    json.dump(spooled, spool_file)
+            except (IOError, OSError) as error:
+                logger.debug('Could not spool usage events: {0}'.format(error))
+
+    def _replay(self):
+        '''Send the spooled events, in batches'''
+        self._last_replay = time.time()
+        with self._spool_lock:
+            spooled = self._read_spool()
+            if not spooled:
+                return
+            try:
+                os.remove(self._spool_path)
+            except OSError:
+                pass
+
+        logger.debug('Replaying {0} spooled usage events'.format(len(spooled)))
+        for start in range(0, len(spooled), BATCH_SIZE):
+            if not self._deliver(spooled[start:start + BATCH_SIZE]):
+                # Still unreachable, keep the rest for the next attempt
+                self._spool(spooled[start + BATCH_SIZE:])
+                break
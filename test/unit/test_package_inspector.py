@@ -0,0 +1,69 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2021 ftrack
+
+import io
+import tarfile
+
+import pytest
+
+from ftrack_connect_unity import package_inspector
+
+
+def _add(package, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    package.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture()
+def package_path(tmpdir):
+    '''Return the path to a package holding a single asset'''
+    path = str(tmpdir.join('scene.unitypackage'))
+    guid = 'a' * 32
+    package = tarfile.open(path, 'w:gz')
+    try:
+        _add(package, guid + '/pathname', b'Assets/model.fbx')
+        _add(package, guid + '/asset.meta', b'fileFormatVersion: 2\nguid: ' + guid.encode('ascii') + b'\n')
+        _add(package, guid + '/asset', b'content')
+    finally:
+        package.close()
+    return path
+
+
+@pytest.fixture()
+def reads(monkeypatch):
+    '''Count the calls to read_package'''
+    calls = []
+    read_package = package_inspector.read_package
+
+    def counted_read_package(path):
+        calls.append(path)
+        return read_package(path)
+
+    monkeypatch.setattr(package_inspector, 'read_package', counted_read_package)
+    return calls
+
+
+def test_inspect_caches_by_path(tmpdir, package_path, reads):
+    '''The second inspection of a package does not read it again'''
+    inspector = package_inspector.PackageInspector(str(tmpdir.join('cache')))
+    contents = inspector.inspect(package_path)
+
+    assert inspector.inspect(package_path) is contents
+    assert len(reads) == 1
+    assert [entry.pathname for entry in contents.entries] == ['Assets/model.fbx']
+
+
+def test_inspect_caches_by_given_checksum(tmpdir, package_path, reads):
+    '''Contents inspected with a checksum are found again by that checksum'''
+    cache_directory = str(tmpdir.join('cache'))
+    inspector = package_inspector.PackageInspector(cache_directory)
+    for _ in range(3):
+        inspector.inspect(package_path, 'recordchecksum')
+    assert len(reads) == 1
+
+    # A new process only has the cache directory
+    inspector = package_inspector.PackageInspector(cache_directory)
+    contents = inspector.inspect(package_path, 'recordchecksum')
+    assert len(reads) == 1
+    assert len(contents.entries) == 1